@@ -0,0 +1,375 @@
+"""Analítica de la clínica sobre una instantánea columnar en NumPy.
+
+cargar() baja solo las columnas necesarias de consulta, mascota y
+veterinario (por rangos de ID en paralelo, o desde la réplica local si está
+activa) y las guarda como arreglos: fechas en datetime64, veterinario,
+especie y diagnóstico como códigos enteros. Los cálculos son group-by
+vectorizados (unique, bincount, lexsort) sin recorrer filas en Python, así
+un millón de consultas se resume en menos de un segundo una vez cargado.
+
+    instantanea = cargar()
+    instantanea.por_semana()[-12:]
+    instantanea.top_diagnosticos(10)
+
+Las fechas se pasan a la hora local antes de agrupar por día o semana: la
+zona es ANALITICA_ZONA de .env (por ejemplo America/Santiago, o UTC) y, sin
+ella, la del sistema. Una consulta de las 22:00 locales cuenta en su día
+aunque en UTC ya sea el siguiente.
+
+NumPy es opcional (pip install numpy): sin él, disponible() es False y el
+menú lo avisa.
+"""
+import os
+import time
+from functools import lru_cache
+from datetime import datetime, timezone, timedelta
+from zoneinfo import ZoneInfo
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from supabase_client import db, CLAVES_PRIMARIAS
+import replica
+
+# Filas por página (menor o igual al max-rows del servidor) y rangos de ID que se bajan a la vez
+TAMANO_PAGINA = 500
+HILOS = 8
+
+# Zona horaria en la que se cuentan días y semanas ("" = la del sistema)
+ZONA = os.getenv("ANALITICA_ZONA", "")
+
+# Columnas que usa la analítica de cada tabla
+COLUMNAS = {
+    "consulta": ("id_consulta", "fecha_consulta", "id_mascota", "id_veterinario", "diagnostico"),
+    "mascota": ("id_mascota", "especie"),
+    "veterinario": ("id_veterinario", "nombre")
+}
+
+SIN_ESPECIE = "Sin especie"
+SIN_DIAGNOSTICO = "Sin diagnóstico"
+
+def disponible():
+    """True si NumPy está instalado"""
+    return np is not None
+
+# ========== CARGA ==========
+def _extremos(cliente, tabla):
+    """(menor, mayor) clave primaria de la tabla, o None si está vacía"""
+    clave = CLAVES_PRIMARIAS[tabla]
+    menor = cliente.table(tabla).select(clave).order(clave).limit(1).execute().data
+    if not menor:
+        return None
+    mayor = cliente.table(tabla).select(clave).order(clave, desc=True).limit(1).execute().data
+    return menor[0][clave], mayor[0][clave]
+
+def _columnas_rango(cliente, tabla, desde, hasta, tamano_pagina):
+    """Columnas de las filas con desde <= clave <= hasta, como listas (keyset dentro del rango)"""
+    clave = CLAVES_PRIMARIAS[tabla]
+    nombres = COLUMNAS[tabla]
+    columnas = {nombre: [] for nombre in nombres}
+    ultimo = None
+    while True:
+        consulta = cliente.table(tabla).select(", ".join(nombres)).lte(clave, hasta)
+        consulta = consulta.gt(clave, ultimo) if ultimo is not None else consulta.gte(clave, desde)
+        filas = consulta.order(clave).limit(tamano_pagina).execute().data
+        for nombre in nombres:
+            columnas[nombre].extend([fila[nombre] for fila in filas])
+        if len(filas) < tamano_pagina:
+            return columnas
+        ultimo = filas[-1][clave]
+
+def _columnas_servidor(cliente, tabla, hilos, tamano_pagina):
+    """Columnas de toda la tabla, bajando hilos rangos de ID a la vez"""
+    extremos = _extremos(cliente, tabla)
+    if extremos is None:
+        return {nombre: [] for nombre in COLUMNAS[tabla]}
+    menor, mayor = extremos
+    # Más rangos que hilos para repartir bien los huecos de IDs
+    cantidad = max(1, min(hilos * 4, (mayor - menor + 1) // tamano_pagina))
+    paso = (mayor - menor + cantidad) // cantidad
+    rangos = [(desde, min(desde + paso - 1, mayor)) for desde in range(menor, mayor + 1, paso)]
+    with ThreadPoolExecutor(max_workers=hilos) as ejecutor:
+        partes = list(ejecutor.map(lambda r: _columnas_rango(cliente, tabla, r[0], r[1], tamano_pagina), rangos))
+    return {nombre: [valor for parte in partes for valor in parte[nombre]] for nombre in COLUMNAS[tabla]}
+
+def _columnas_replica(local, tabla):
+    """Columnas de la tabla tomadas de la réplica local, en orden de ID"""
+    estado = local.tablas[tabla]
+    filas = [estado.filas[i] for i in sorted(estado.filas)]
+    return {nombre: [fila.get(nombre) for fila in filas] for nombre in COLUMNAS[tabla]}
+
+def _codificar(valores, vacio):
+    """Códigos enteros y categorías (en orden de aparición) de una columna de texto"""
+    categorias = {}
+    codigos = np.fromiter((categorias.setdefault((v or "").strip() or vacio, len(categorias)) for v in valores),
+                          dtype=np.int32, count=len(valores))
+    return codigos, list(categorias)
+
+def _zona(nombre):
+    """tzinfo de una zona IANA, o None para la zona del sistema"""
+    if not nombre:
+        return None
+    try:
+        return ZoneInfo(nombre)
+    except (KeyError, ValueError):
+        raise ValueError(f"Zona horaria desconocida en ANALITICA_ZONA: {nombre}")
+
+@lru_cache(maxsize=None)
+def _desfase_texto(sufijo):
+    """Segundos al este de UTC del final de una fecha ISO ('+00:00', '-03', 'Z'; sin zona es UTC)"""
+    sufijo = sufijo.lstrip(".0123456789")
+    if sufijo in ("", "Z"):
+        return 0
+    digitos = sufijo[1:].replace(":", "")
+    segundos = int(digitos[:2]) * 3600 + int(digitos[2:4] or 0) * 60
+    return -segundos if sufijo[0] == "-" else segundos
+
+def _desfases_locales(segundos_utc, zona):
+    """Desfase local (s) de cada instante UTC. Los cambios de horario caen en cuartos de hora:
+    se calcula una vez por cuarto de hora distinto, no por consulta"""
+    if not len(segundos_utc):
+        return np.zeros(0, dtype=np.int64)
+    cuartos, posicion = np.unique(segundos_utc // 900, return_inverse=True)
+    desfases = np.fromiter(
+        (datetime.fromtimestamp(int(c) * 900, timezone.utc).astimezone(zona).utcoffset() // timedelta(seconds=1)
+         for c in cuartos), dtype=np.int64, count=len(cuartos))
+    return desfases[posicion]
+
+def _fechas(textos, zona=None):
+    """Fechas ISO de PostgREST como datetime64[s] en la hora local de zona (None: la del sistema)"""
+    sin_zona = np.array([texto[:19] for texto in textos], dtype="datetime64[s]").view(np.int64)
+    utc = sin_zona - np.fromiter((_desfase_texto(texto[19:]) for texto in textos),
+                                 dtype=np.int64, count=len(textos))
+    return (utc + _desfases_locales(utc, zona)).view("datetime64[s]")
+
+def _ahora(zona=None):
+    """Ahora en la hora local de zona, como datetime64[s]"""
+    return np.datetime64(datetime.now(timezone.utc).astimezone(zona).replace(tzinfo=None), "s")
+
+def _ids(valores):
+    """Columna de IDs como int64, con -1 en lugar de None"""
+    return np.fromiter((-1 if v is None else v for v in valores), dtype=np.int64, count=len(valores))
+
+def _posiciones(ordenados, valores):
+    """Posición de cada valor en el arreglo ordenado, o -1 si no está"""
+    if not len(ordenados):
+        return np.full(len(valores), -1, dtype=np.int64)
+    posicion = np.minimum(np.searchsorted(ordenados, valores), len(ordenados) - 1)
+    return np.where(ordenados[posicion] == valores, posicion, -1)
+
+def _contar(valores):
+    """(valores distintos, veces que aparece cada uno), ordenados; np.sort y bordes es
+    bastante más rápido que np.unique(return_counts=True) con millones de filas"""
+    ordenados = np.sort(valores)
+    if not len(ordenados):
+        return ordenados, np.zeros(0, dtype=np.int64)
+    inicios = np.flatnonzero(np.r_[True, ordenados[1:] != ordenados[:-1]])
+    return ordenados[inicios], np.diff(np.r_[inicios, len(ordenados)])
+
+def _orden_por_grupo(grupos, fecha):
+    """Orden por grupo y, dentro de cada grupo, por fecha: un solo argsort sobre una clave int64"""
+    segundos = fecha.view(np.int64)
+    if len(segundos):
+        segundos = segundos - segundos.min()
+    return np.argsort(((grupos.astype(np.int64) + 1) << 32) | segundos)
+
+def cargar(obtener_cliente=lambda: db.client, hilos=HILOS, tamano_pagina=TAMANO_PAGINA, zona=ZONA):
+    """Armar la instantánea desde la réplica local (REPLICA=1) o desde el servidor.
+
+    zona: nombre IANA en el que se cuentan días y semanas ("" = la del sistema)"""
+    if not disponible():
+        raise RuntimeError("La analítica necesita NumPy: pip install numpy")
+    inicio = time.perf_counter()
+    local = replica.obtener()
+    if local is not None:
+        local.sincronizar(list(COLUMNAS))
+        columnas = {tabla: _columnas_replica(local, tabla) for tabla in COLUMNAS}
+        origen = "réplica local"
+    else:
+        cliente = obtener_cliente()
+        columnas = {tabla: _columnas_servidor(cliente, tabla, hilos, tamano_pagina) for tabla in COLUMNAS}
+        origen = "servidor"
+    instantanea = Instantanea(columnas["consulta"], columnas["mascota"], columnas["veterinario"], zona)
+    instantanea.carga_ms = (time.perf_counter() - inicio) * 1000
+    print(f"📈 Instantánea desde {origen}: {len(instantanea.fecha):,} consultas, "
+          f"{len(instantanea.mascota_id):,} mascotas en {instantanea.carga_ms:.0f} ms")
+    return instantanea
+
+# ========== INSTANTÁNEA ==========
+class Instantanea:
+    """Consultas, mascotas y veterinarios como arreglos de NumPy.
+
+    Consultas (una posición por consulta): fecha (datetime64[s], hora local de zona), mascota
+    (id), veterinario (código, -1 sin asignar), especie (código de la
+    especie de la mascota) y diagnostico (código)."""
+
+    def __init__(self, consultas, mascotas, veterinarios, zona=ZONA):
+        # Mascotas en orden de ID, para ubicar la especie de cada consulta con searchsorted
+        self.mascota_id = _ids(mascotas["id_mascota"])
+        orden = np.argsort(self.mascota_id, kind="stable")
+        self.mascota_id = self.mascota_id[orden]
+        especie, self.especies = _codificar(mascotas["especie"], SIN_ESPECIE)
+        self.mascota_especie = especie[orden]
+
+        self.veterinarios = dict(zip(veterinarios["id_veterinario"], veterinarios["nombre"]))
+        self.veterinario_ids = np.array(sorted(self.veterinarios), dtype=np.int64)
+
+        self.zona = _zona(zona)
+        self.fecha = _fechas(consultas["fecha_consulta"], self.zona)
+        self.mascota = _ids(consultas["id_mascota"])
+        self.veterinario = _posiciones(self.veterinario_ids, _ids(consultas["id_veterinario"])).astype(np.int32)
+        self.diagnostico, self.diagnosticos = _codificar(consultas["diagnostico"], SIN_DIAGNOSTICO)
+
+        posicion = _posiciones(self.mascota_id, self.mascota)
+        encontrada = posicion >= 0
+        self.especie = np.full(len(posicion), -1, dtype=np.int32)
+        self.especie[encontrada] = self.mascota_especie[posicion[encontrada]]
+        self.carga_ms = 0.0
+
+    def __len__(self):
+        return len(self.fecha)
+
+    def por_dia(self):
+        """[(fecha 'AAAA-MM-DD', consultas)] de los días con consultas, en orden"""
+        dias, conteos = _contar(self.fecha.astype("datetime64[D]"))
+        return [(str(d), int(c)) for d, c in zip(dias, conteos)]
+
+    def por_semana(self):
+        """[(lunes 'AAAA-MM-DD', consultas)] por semana (lunes a domingo), en orden"""
+        dias = self.fecha.astype("datetime64[D]")
+        # 1970-01-01 fue jueves: (días + 3) % 7 es el día de la semana con lunes = 0
+        lunes = dias - ((dias.astype(np.int64) + 3) % 7).astype("timedelta64[D]")
+        semanas, conteos = _contar(lunes)
+        return [(str(s), int(c)) for s, c in zip(semanas, conteos)]
+
+    def carga_veterinarios(self, dias=30, referencia=None):
+        """Por veterinario: consultas, mascotas distintas, consultas de los últimos dias y última consulta.
+
+        referencia es el fin del período (por defecto ahora, en la hora local de la instantánea). Ordenado
+        de mayor a menor cantidad de consultas; las consultas sin veterinario
+        van aparte como id_veterinario None."""
+        cantidad = len(self.veterinario_ids)
+        codigo = np.where(self.veterinario < 0, cantidad, self.veterinario)
+        totales = np.bincount(codigo, minlength=cantidad + 1)
+
+        referencia = np.datetime64(referencia, "s") if referencia else _ahora(self.zona)
+        recientes = np.bincount(codigo[self.fecha >= referencia - np.timedelta64(dias, "D")], minlength=cantidad + 1)
+
+        # Pares (veterinario, mascota) distintos, contados por veterinario
+        base = int(self.mascota.max(initial=0)) + 2
+        pares, _ = _contar(codigo.astype(np.int64) * base + (self.mascota + 1))
+        mascotas = np.bincount(pares // base, minlength=cantidad + 1)
+
+        # Última consulta: máximo por grupo sin ordenar (NaT es el menor int64)
+        ultima = np.full(cantidad + 1, np.datetime64("NaT"), dtype="datetime64[s]")
+        np.maximum.at(ultima.view(np.int64), codigo, self.fecha.view(np.int64))
+
+        resultado = []
+        for i in np.argsort(-totales[:cantidad], kind="stable"):
+            id_veterinario = int(self.veterinario_ids[i])
+            resultado.append(self._fila_veterinario(id_veterinario, self.veterinarios.get(id_veterinario),
+                                                    totales[i], mascotas[i], recientes[i], ultima[i], dias))
+        if totales[cantidad]:
+            resultado.append(self._fila_veterinario(None, "Sin asignar", totales[cantidad], mascotas[cantidad],
+                                                    recientes[cantidad], ultima[cantidad], dias))
+        return resultado
+
+    @staticmethod
+    def _fila_veterinario(id_veterinario, nombre, total, mascotas, recientes, ultima, dias):
+        return {
+            "id_veterinario": id_veterinario,
+            "nombre": nombre,
+            "consultas": int(total),
+            "mascotas": int(mascotas),
+            f"ultimos_{dias}_dias": int(recientes),
+            "ultima_consulta": None if np.isnat(ultima) else str(ultima)
+        }
+
+    def especies_mezcla(self):
+        """Por especie: mascotas, consultas y porcentaje de cada uno, de más a menos consultas"""
+        cantidad = len(self.especies)
+        mascotas = np.bincount(self.mascota_especie, minlength=cantidad)
+        consultas = np.bincount(self.especie[self.especie >= 0], minlength=cantidad)
+        total_mascotas, total_consultas = max(int(mascotas.sum()), 1), max(int(consultas.sum()), 1)
+        return [
+            {
+                "especie": self.especies[i],
+                "mascotas": int(mascotas[i]),
+                "pct_mascotas": round(float(100 * mascotas[i] / total_mascotas), 1),
+                "consultas": int(consultas[i]),
+                "pct_consultas": round(float(100 * consultas[i] / total_consultas), 1),
+                "consultas_por_mascota": round(float(consultas[i] / mascotas[i]), 2) if mascotas[i] else 0.0
+            }
+            for i in np.lexsort((-mascotas, -consultas))
+        ]
+
+    def intervalos(self):
+        """Días entre consultas seguidas de una misma mascota: resumen general y por especie"""
+        orden = _orden_por_grupo(self.mascota, self.fecha)
+        mascota = self.mascota[orden]
+        misma = mascota[1:] == mascota[:-1]
+        dias = ((self.fecha[orden][1:] - self.fecha[orden][:-1])[misma] / np.timedelta64(1, "D"))
+        especie = self.especie[orden][1:][misma]
+        # Ya ordenadas por mascota, cada cambio de mascota empieza un grupo nuevo
+        numero = np.cumsum(np.r_[True, ~misma]) - 1
+        grupo = numero[1:][misma]
+        sumas = np.bincount(grupo, weights=dias, minlength=len(mascota))
+        cuentas = np.bincount(grupo, minlength=len(mascota))
+        con_intervalos = cuentas > 0
+
+        resultado = {
+            "intervalos": int(len(dias)),
+            "mascotas_con_una_consulta": int(numero[-1] + 1 - np.count_nonzero(con_intervalos)) if len(mascota) else 0,
+            "mediana_dias": None,
+            "p90_dias": None,
+            "promedio_dias": None,
+            "mediana_promedio_por_mascota": None,
+            "por_especie": []
+        }
+        if not len(dias):
+            return resultado
+
+        promedio_mascota = sumas[con_intervalos] / cuentas[con_intervalos]
+        resultado.update({
+            "mediana_dias": round(float(np.median(dias)), 1),
+            "p90_dias": round(float(np.percentile(dias, 90)), 1),
+            "promedio_dias": round(float(dias.mean()), 1),
+            "mediana_promedio_por_mascota": round(float(np.median(promedio_mascota)), 1)
+        })
+        # Pocas especies: una máscara por especie sale más barata que ordenar
+        por_especie = np.bincount(especie + 1)
+        for codigo in np.flatnonzero(por_especie) - 1:
+            resultado["por_especie"].append({
+                "especie": self.especies[codigo] if codigo >= 0 else SIN_ESPECIE,
+                "intervalos": int(por_especie[codigo + 1]),
+                "mediana_dias": round(float(np.median(dias[especie == codigo])), 1)
+            })
+        resultado["por_especie"].sort(key=lambda e: -e["intervalos"])
+        return resultado
+
+    def top_diagnosticos(self, cantidad=10):
+        """[(diagnóstico, consultas)] de los más frecuentes"""
+        conteos = np.bincount(self.diagnostico, minlength=len(self.diagnosticos))
+        mejores = np.argsort(-conteos, kind="stable")[:cantidad]
+        return [(self.diagnosticos[i], int(conteos[i])) for i in mejores if conteos[i]]
+
+    def resumen(self, dias_carga=30, top=10):
+        """Todos los indicadores juntos, con el tiempo de cálculo"""
+        inicio = time.perf_counter()
+        resultado = {
+            "consultas": len(self),
+            "mascotas": int(len(self.mascota_id)),
+            "veterinarios": int(len(self.veterinario_ids)),
+            "por_dia": self.por_dia(),
+            "por_semana": self.por_semana(),
+            "carga_veterinarios": self.carga_veterinarios(dias_carga),
+            "especies": self.especies_mezcla(),
+            "intervalos": self.intervalos(),
+            "top_diagnosticos": self.top_diagnosticos(top)
+        }
+        resultado["calculo_ms"] = round((time.perf_counter() - inicio) * 1000, 1)
+        resultado["carga_ms"] = round(self.carga_ms, 1)
+        return resultado
@@ -0,0 +1,549 @@
+"""Backend local en SQLite con la misma interfaz encadenable que el cliente de Supabase.
+
+ConexionBD lo usa cuando .env tiene BD_BACKEND=sqlite; la ruta del archivo se
+toma de SQLITE_RUTA (":memory:" para una base temporal). Implementa la parte
+de PostgREST que usa este proyecto:
+
+    cliente.table("mascota").select("*, dueno(nombre, telefono)").eq("id_dueno", 3).order("id_mascota").limit(50).execute()
+
+- select con columnas, recursos embebidos (muchos-a-uno y uno-a-muchos),
+  conteos embebidos "consulta(count)" y el agregado "count()"
+- count="exact", filtros eq/neq/gt/gte/lt/lte/like/ilike/is_/in_ y not_
+- filtros lógicos or=(...) y and=(...) anidados, con valores entre comillas
+- order/limit con foreign_table, offset y range
+- insert, upsert, update y delete devolviendo las filas afectadas
+
+Los embebidos se resuelven con una consulta IN por relación, nunca fila a fila.
+"""
+import re
+import sqlite3
+import threading
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS dueno (
+    id_dueno INTEGER PRIMARY KEY AUTOINCREMENT,
+    nombre TEXT NOT NULL,
+    direccion TEXT,
+    telefono TEXT,
+    email TEXT
+);
+CREATE TABLE IF NOT EXISTS mascota (
+    id_mascota INTEGER PRIMARY KEY AUTOINCREMENT,
+    nombre TEXT NOT NULL,
+    especie TEXT,
+    raza TEXT,
+    fecha_nacimiento TEXT,
+    id_dueno INTEGER REFERENCES dueno(id_dueno) ON DELETE CASCADE
+);
+CREATE TABLE IF NOT EXISTS veterinario (
+    id_veterinario INTEGER PRIMARY KEY AUTOINCREMENT,
+    nombre TEXT NOT NULL,
+    especialidad TEXT,
+    telefono TEXT,
+    email TEXT
+);
+CREATE TABLE IF NOT EXISTS consulta (
+    id_consulta INTEGER PRIMARY KEY AUTOINCREMENT,
+    fecha_consulta TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now')),
+    motivo TEXT NOT NULL,
+    diagnostico TEXT,
+    tratamiento TEXT,
+    observaciones TEXT,
+    id_mascota INTEGER REFERENCES mascota(id_mascota) ON DELETE CASCADE,
+    id_veterinario INTEGER REFERENCES veterinario(id_veterinario) ON DELETE SET NULL
+);
+CREATE INDEX IF NOT EXISTS idx_mascota_id_dueno ON mascota(id_dueno);
+CREATE INDEX IF NOT EXISTS idx_consulta_id_mascota ON consulta(id_mascota, fecha_consulta DESC);
+CREATE INDEX IF NOT EXISTS idx_consulta_id_veterinario ON consulta(id_veterinario);
+CREATE INDEX IF NOT EXISTS idx_consulta_fecha ON consulta(fecha_consulta DESC, id_consulta DESC);
+"""
+
+CLAVES = {
+    "dueno": "id_dueno",
+    "mascota": "id_mascota",
+    "veterinario": "id_veterinario",
+    "consulta": "id_consulta"
+}
+
+# (tabla, recurso embebido) -> (columna que los une, cardinalidad del embebido)
+RELACIONES = {
+    ("mascota", "dueno"): ("id_dueno", "uno"),
+    ("consulta", "mascota"): ("id_mascota", "uno"),
+    ("consulta", "veterinario"): ("id_veterinario", "uno"),
+    ("dueno", "mascota"): ("id_dueno", "muchos"),
+    ("mascota", "consulta"): ("id_mascota", "muchos"),
+    ("veterinario", "consulta"): ("id_veterinario", "muchos")
+}
+
+OPERADORES = {
+    "eq": "=",
+    "neq": "<>",
+    "gt": ">",
+    "gte": ">=",
+    "lt": "<",
+    "lte": "<="
+}
+
+# SQLite limita la cantidad de parámetros por sentencia
+MAX_PARAMETROS_IN = 900
+
+_IDENTIFICADOR = re.compile(r"^[a-z_][a-z0-9_]*$")
+
+class ErrorSQLite(Exception):
+    """Error con la forma de los APIError de PostgREST (tiene .message)"""
+
+    def __init__(self, message):
+        super().__init__(message)
+        self.message = message
+
+def _identificador(nombre):
+    nombre = nombre.strip()
+    if not _IDENTIFICADOR.match(nombre):
+        raise ErrorSQLite(f"Identificador no válido: {nombre!r}")
+    return nombre
+
+def _dividir(texto):
+    """Separar por comas de primer nivel (respetando paréntesis y comillas)"""
+    partes, nivel, actual, comillas = [], 0, "", False
+    for caracter in texto:
+        if caracter == "," and nivel == 0 and not comillas:
+            partes.append(actual.strip())
+            actual = ""
+            continue
+        if caracter == '"':
+            comillas = not comillas
+        elif not comillas:
+            nivel += caracter == "("
+            nivel -= caracter == ")"
+        actual += caracter
+    if actual.strip():
+        partes.append(actual.strip())
+    return partes
+
+def _parsear_select(texto):
+    """Devolver (columnas, embebidos {tabla: subselect}, hay_count_agregado)"""
+    columnas, embebidos, agregado = [], {}, False
+    for parte in _dividir(texto or "*"):
+        if parte == "count()":
+            agregado = True
+        elif parte.endswith(")") and "(" in parte:
+            nombre, interior = parte.split("(", 1)
+            embebidos[_identificador(nombre)] = interior[:-1]
+        elif parte == "*":
+            columnas.append("*")
+        elif ":" in parte:
+            # Renombrado alias:columna
+            alias, columna = parte.split(":", 1)
+            columnas.append(f"{_identificador(columna)} AS {_identificador(alias)}")
+        else:
+            columnas.append(_identificador(parte))
+    return columnas, embebidos, agregado
+
+def _convertir_valor(valor):
+    """Los valores de filter() llegan como texto de URL: se devuelven ints cuando corresponde"""
+    if isinstance(valor, str) and re.fullmatch(r"-?\d+", valor):
+        return int(valor)
+    return valor
+
+def _sin_comillas(valor):
+    if len(valor) >= 2 and valor[0] == valor[-1] == '"':
+        return valor[1:-1]
+    return valor
+
+def _comparacion(termino):
+    """SQL y parámetros de un término columna.operador.valor de un filtro lógico"""
+    columna, _, resto = termino.partition(".")
+    operador, _, criterio = resto.partition(".")
+    negar = operador == "not"
+    if negar:
+        operador, _, criterio = criterio.partition(".")
+    columna = _identificador(columna)
+    if operador in OPERADORES:
+        sql, parametros = f"{columna} {OPERADORES[operador]} ?", [_convertir_valor(_sin_comillas(criterio))]
+    elif operador in ("like", "ilike"):
+        patron = _sin_comillas(criterio).replace("*", "%")
+        sql = f"{columna} LIKE ?" if operador == "like" else f"minusculas({columna}) LIKE minusculas(?)"
+        parametros = [patron]
+    elif operador == "is" and criterio in ("null", "true", "false"):
+        sql, parametros = f"{columna} IS {criterio.upper()}", []
+    elif operador == "in":
+        valores = [_convertir_valor(_sin_comillas(v)) for v in _dividir(criterio.strip("()"))]
+        sql, parametros = (f"{columna} IN ({','.join('?' * len(valores))})", valores) if valores else ("0", [])
+    else:
+        raise ErrorSQLite(f"Operador no soportado: {operador}")
+    return (f"NOT ({sql})" if negar else sql), parametros
+
+def _filtro_logico(conector, texto):
+    """SQL y parámetros de or=(...)/and=(...): términos separados por comas, anidables"""
+    condiciones, parametros = [], []
+    for termino in _dividir(texto):
+        negar = termino.startswith("not.")
+        if negar:
+            termino = termino[4:]
+        if termino.startswith(("and(", "or(")) and termino.endswith(")"):
+            interno, _, resto = termino[:-1].partition("(")
+            sql, valores = _filtro_logico(interno, resto)
+        else:
+            sql, valores = _comparacion(termino)
+        condiciones.append(f"NOT ({sql})" if negar else f"({sql})")
+        parametros.extend(valores)
+    if not condiciones:
+        raise ErrorSQLite(f"Filtro {conector} vacío")
+    return f" {conector.upper()} ".join(condiciones), parametros
+
+class RespuestaSQLite:
+    """Respuesta con la misma forma que APIResponse (data y count)"""
+
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+class ConsultaSQLite:
+    """Constructor encadenable de una petición sobre una tabla"""
+
+    def __init__(self, cliente, tabla):
+        if tabla not in CLAVES:
+            raise ErrorSQLite(f'relation "public.{tabla}" does not exist')
+        self._cliente = cliente
+        self._tabla = tabla
+        self._operacion = "select"
+        self._campos = "*"
+        self._datos = None
+        self._conflicto = None
+        self._contar = False
+        self._condiciones = []
+        self._negar = False
+        self._orden = []
+        self._limite = None
+        self._desplazamiento = None
+        self._orden_embebido = {}
+        self._limite_embebido = {}
+
+    # ---------- operaciones ----------
+    def select(self, *columnas, count=None):
+        self._operacion = "select"
+        self._campos = ",".join(columnas) if columnas else None
+        self._contar = count is not None
+        return self
+
+    def insert(self, datos, count=None, returning=None, upsert=False):
+        self._operacion = "insert"
+        self._datos = datos if isinstance(datos, list) else [datos]
+        self._contar = count is not None
+        return self
+
+    def upsert(self, datos, count=None, returning=None, ignore_duplicates=False, on_conflict=""):
+        self.insert(datos, count)
+        self._conflicto = _identificador(on_conflict) if on_conflict else CLAVES[self._tabla]
+        return self
+
+    def update(self, datos, count=None, returning=None):
+        self._operacion = "update"
+        self._datos = datos
+        self._contar = count is not None
+        return self
+
+    def delete(self, count=None, returning=None):
+        self._operacion = "delete"
+        self._contar = count is not None
+        return self
+
+    # ---------- filtros ----------
+    @property
+    def not_(self):
+        self._negar = True
+        return self
+
+    def _agregar(self, sql, parametros=()):
+        if self._negar:
+            sql = f"NOT ({sql})"
+            self._negar = False
+        self._condiciones.append((sql, tuple(parametros)))
+        return self
+
+    def filter(self, columna, operador, criterio):
+        if columna in ("or", "and"):
+            # or=(a.eq.1,b.lt.2) llega partido en el primer punto, como cualquier filtro
+            arbol = f"{operador}.{criterio}".strip()
+            if not (arbol.startswith("(") and arbol.endswith(")")):
+                raise ErrorSQLite(f"Filtro {columna} mal formado: {arbol}")
+            return self._agregar(*_filtro_logico(columna, arbol[1:-1]))
+        negar = operador.startswith("not.")
+        if negar:
+            self._negar = True
+            operador = operador[4:]
+        if operador == "in":
+            valores = [v.strip().strip('"') for v in criterio.strip("()").split(",") if v.strip()]
+            return self.in_(columna, [_convertir_valor(v) for v in valores])
+        if operador == "is":
+            return self.is_(columna, criterio)
+        if operador in ("like", "ilike"):
+            return getattr(self, operador)(columna, criterio.replace("*", "%"))
+        if operador not in OPERADORES:
+            raise ErrorSQLite(f"Operador no soportado: {operador}")
+        return self._agregar(f"{_identificador(columna)} {OPERADORES[operador]} ?", [_convertir_valor(criterio)])
+
+    def eq(self, columna, valor):
+        return self._agregar(f"{_identificador(columna)} = ?", [valor])
+
+    def neq(self, columna, valor):
+        return self._agregar(f"{_identificador(columna)} <> ?", [valor])
+
+    def gt(self, columna, valor):
+        return self._agregar(f"{_identificador(columna)} > ?", [valor])
+
+    def gte(self, columna, valor):
+        return self._agregar(f"{_identificador(columna)} >= ?", [valor])
+
+    def lt(self, columna, valor):
+        return self._agregar(f"{_identificador(columna)} < ?", [valor])
+
+    def lte(self, columna, valor):
+        return self._agregar(f"{_identificador(columna)} <= ?", [valor])
+
+    def like(self, columna, patron):
+        return self._agregar(f"{_identificador(columna)} LIKE ?", [patron])
+
+    def ilike(self, columna, patron):
+        return self._agregar(f"minusculas({_identificador(columna)}) LIKE minusculas(?)", [patron])
+
+    def is_(self, columna, valor):
+        literal = {None: "NULL", "null": "NULL", True: "TRUE", "true": "TRUE",
+                   False: "FALSE", "false": "FALSE"}.get(valor)
+        if literal is None:
+            raise ErrorSQLite(f"Valor no soportado en is: {valor!r}")
+        return self._agregar(f"{_identificador(columna)} IS {literal}")
+
+    def in_(self, columna, valores):
+        valores = list(valores)
+        if not valores:
+            return self._agregar("0")
+        marcas = ",".join("?" * len(valores))
+        return self._agregar(f"{_identificador(columna)} IN ({marcas})", valores)
+
+    def match(self, consulta):
+        for columna, valor in consulta.items():
+            self.eq(columna, valor)
+        return self
+
+    # ---------- orden y paginación ----------
+    def order(self, columna, *, desc=False, nullsfirst=False, foreign_table=None):
+        # Igual que PostgreSQL: sin nullsfirst, los nulos van al final en ASC y al inicio en DESC
+        termino = (f"{_identificador(columna)} {'DESC' if desc else 'ASC'} "
+                   f"NULLS {'FIRST' if nullsfirst or desc else 'LAST'}")
+        if foreign_table:
+            self._orden_embebido.setdefault(foreign_table, []).append(termino)
+        else:
+            self._orden.append(termino)
+        return self
+
+    def limit(self, cantidad, *, foreign_table=None):
+        if foreign_table:
+            self._limite_embebido[foreign_table] = int(cantidad)
+        else:
+            self._limite = int(cantidad)
+        return self
+
+    def offset(self, cantidad):
+        self._desplazamiento = int(cantidad)
+        return self
+
+    def range(self, inicio, fin):
+        self._desplazamiento = int(inicio)
+        self._limite = int(fin) - int(inicio)
+        return self
+
+    # ---------- ejecución ----------
+    def _where(self):
+        if not self._condiciones:
+            return "", ()
+        sql = " WHERE " + " AND ".join(c for c, _ in self._condiciones)
+        parametros = tuple(p for _, ps in self._condiciones for p in ps)
+        return sql, parametros
+
+    def _filas(self, extra=()):
+        """Ejecutar el SELECT (con embebidos) incluyendo las columnas extra pedidas"""
+        columnas, embebidos, agregado = _parsear_select(self._campos)
+        clave = CLAVES[self._tabla]
+
+        # Columnas necesarias para enlazar los embebidos aunque no se hayan pedido
+        ocultas = set(extra)
+        for embebido in embebidos:
+            relacion = RELACIONES.get((self._tabla, embebido))
+            if not relacion:
+                raise ErrorSQLite(f"Could not find a relationship between '{self._tabla}' and '{embebido}'")
+            columna, cardinalidad = relacion
+            ocultas.add(columna if cardinalidad == "uno" else clave)
+
+        if agregado:
+            grupo = ", ".join(columnas)
+            sql_columnas = f"{grupo}, COUNT(*) AS count" if grupo else "COUNT(*) AS count"
+        elif "*" in columnas:
+            sql_columnas = "*"
+            ocultas = set()
+        else:
+            pedidas = list(dict.fromkeys(columnas))
+            ocultas -= set(pedidas)
+            sql_columnas = ", ".join(pedidas + sorted(ocultas)) or "*"
+
+        where, parametros = self._where()
+        sql = f"SELECT {sql_columnas} FROM {self._tabla}{where}"
+        if agregado and columnas:
+            sql += f" GROUP BY {', '.join(columnas)}"
+        if self._orden:
+            sql += " ORDER BY " + ", ".join(self._orden)
+        if self._limite is not None or self._desplazamiento is not None:
+            sql += f" LIMIT {self._limite if self._limite is not None else -1}"
+            if self._desplazamiento:
+                sql += f" OFFSET {self._desplazamiento}"
+
+        filas = self._cliente._consultar(sql, parametros)
+
+        for embebido, subselect in embebidos.items():
+            self._embeber(filas, embebido, subselect)
+
+        for columna in ocultas - set(extra):
+            for fila in filas:
+                fila.pop(columna, None)
+        return filas
+
+    def _embeber(self, filas, embebido, subselect):
+        """Completar las filas con un recurso embebido usando consultas IN"""
+        columna, cardinalidad = RELACIONES[(self._tabla, embebido)]
+        clave_padre = CLAVES[self._tabla]
+        origen = columna if cardinalidad == "uno" else clave_padre
+        destino = CLAVES[embebido] if cardinalidad == "uno" else columna
+        valores = sorted({f[origen] for f in filas if f.get(origen) is not None})
+
+        agrupadas = {}
+        solo_conteo = subselect.strip() == "count"
+        for inicio in range(0, len(valores), MAX_PARAMETROS_IN):
+            tramo = valores[inicio:inicio + MAX_PARAMETROS_IN]
+            if solo_conteo:
+                marcas = ",".join("?" * len(tramo))
+                sql = (f"SELECT {destino}, COUNT(*) AS count FROM {embebido} "
+                       f"WHERE {destino} IN ({marcas}) GROUP BY {destino}")
+                for fila in self._cliente._consultar(sql, tramo):
+                    agrupadas[fila[destino]] = fila['count']
+                continue
+            sub = ConsultaSQLite(self._cliente, embebido).select(subselect).in_(destino, tramo)
+            sub._orden = list(self._orden_embebido.get(embebido, []))
+            for fila in sub._filas(extra=(destino,)):
+                agrupadas.setdefault(fila[destino], []).append(fila)
+
+        pedidas, _, _ = _parsear_select(subselect)
+        quitar_destino = not solo_conteo and "*" not in pedidas and destino not in pedidas
+        limite = self._limite_embebido.get(embebido)
+        for fila in filas:
+            relacionadas = agrupadas.get(fila.get(origen), 0 if solo_conteo else [])
+            if solo_conteo:
+                fila[embebido] = [{"count": relacionadas}]
+                continue
+            if quitar_destino:
+                relacionadas = [{k: v for k, v in r.items() if k != destino} for r in relacionadas]
+            if cardinalidad == "uno":
+                fila[embebido] = relacionadas[0] if relacionadas else None
+            else:
+                fila[embebido] = relacionadas[:limite] if limite is not None else relacionadas
+
+    def _contar_filas(self):
+        where, parametros = self._where()
+        sql = f"SELECT COUNT(*) AS count FROM {self._tabla}{where}"
+        return self._cliente._consultar(sql, parametros)[0]['count']
+
+    def _escribir(self):
+        where, parametros = self._where()
+        if self._operacion == "insert":
+            filas = []
+            with self._cliente._transaccion() as cursor:
+                for datos in self._datos:
+                    columnas = [_identificador(c) for c in datos]
+                    marcas = ",".join("?" * len(columnas))
+                    sql = f"INSERT INTO {self._tabla} ({', '.join(columnas)}) VALUES ({marcas})"
+                    if self._conflicto:
+                        asignaciones = ", ".join(f"{c} = excluded.{c}" for c in columnas if c != self._conflicto)
+                        sql += (f" ON CONFLICT({self._conflicto}) DO UPDATE SET {asignaciones}"
+                                if asignaciones else f" ON CONFLICT({self._conflicto}) DO NOTHING")
+                    cursor.execute(sql + " RETURNING *", [datos[c] for c in datos])
+                    filas.extend(dict(f) for f in cursor.fetchall())
+            return filas
+        if self._operacion == "update":
+            columnas = [_identificador(c) for c in self._datos]
+            asignaciones = ", ".join(f"{c} = ?" for c in columnas)
+            sql = f"UPDATE {self._tabla} SET {asignaciones}{where} RETURNING *"
+            return self._cliente._modificar(sql, [self._datos[c] for c in self._datos] + list(parametros))
+        sql = f"DELETE FROM {self._tabla}{where} RETURNING *"
+        return self._cliente._modificar(sql, parametros)
+
+    def execute(self):
+        try:
+            if self._operacion != "select":
+                filas = self._escribir()
+                return RespuestaSQLite(filas, len(filas) if self._contar else None)
+            total = self._contar_filas() if self._contar else None
+            if self._campos is None or self._limite == 0:
+                # Petición HEAD o limit 0: solo interesa el conteo
+                return RespuestaSQLite([], total)
+            return RespuestaSQLite(self._filas(), total)
+        except sqlite3.Error as e:
+            raise ErrorSQLite(str(e)) from e
+
+class _Transaccion:
+    def __init__(self, cliente):
+        self._cliente = cliente
+
+    def __enter__(self):
+        self._cliente._bloqueo.acquire()
+        return self._cliente._conexion.cursor()
+
+    def __exit__(self, tipo, valor, traza):
+        try:
+            if tipo is None:
+                self._cliente._conexion.commit()
+            else:
+                self._cliente._conexion.rollback()
+        finally:
+            self._cliente._bloqueo.release()
+        return False
+
+class ClienteSQLite:
+    """Cliente local con la interfaz table(...) del cliente de Supabase"""
+
+    def __init__(self, ruta=":memory:"):
+        self.ruta = ruta
+        # Una sola conexión compartida y serializada con un lock: sirve también para ":memory:"
+        self._conexion = sqlite3.connect(ruta, check_same_thread=False)
+        self._conexion.row_factory = sqlite3.Row
+        self._conexion.create_function("minusculas", 1, lambda v: v.lower() if isinstance(v, str) else v,
+                                       deterministic=True)
+        self._bloqueo = threading.RLock()
+        with self._bloqueo:
+            self._conexion.execute("PRAGMA foreign_keys = ON")
+            self._conexion.execute("PRAGMA case_sensitive_like = ON")
+            if ruta != ":memory:":
+                self._conexion.execute("PRAGMA journal_mode = WAL")
+                self._conexion.execute("PRAGMA synchronous = NORMAL")
+            self._conexion.executescript(ESQUEMA)
+            self._conexion.commit()
+
+    def table(self, tabla):
+        return ConsultaSQLite(self, tabla)
+
+    def from_(self, tabla):
+        return self.table(tabla)
+
+    def _transaccion(self):
+        return _Transaccion(self)
+
+    def _consultar(self, sql, parametros=()):
+        with self._bloqueo:
+            return [dict(fila) for fila in self._conexion.execute(sql, parametros)]
+
+    def _modificar(self, sql, parametros=()):
+        with self._transaccion() as cursor:
+            cursor.execute(sql, parametros)
+            return [dict(fila) for fila in cursor.fetchall()]
+
+    def cerrar(self):
+        with self._bloqueo:
+            self._conexion.close()
@@ -0,0 +1,284 @@
+"""Benchmark de las operaciones contra un PostgREST falso local.
+
+Uso:
+    python benchmark.py                              # tamaños 1000 y 10000
+    python benchmark.py --tamanos 1000 10000 100000 --latencia 20
+    python benchmark.py --comparar resultados_benchmark/anterior.json
+
+Para cada tamaño se siembra la base con N dueños, N mascotas y N consultas,
+y cada operación se mide por separado: latencias p50/p95/p99, peticiones
+HTTP, bytes transferidos y memoria máxima. Además se mide el tamaño de una
+página de cada tabla con cada perfil de proyección (PERFILES en
+supabase_client) y cuántas conexiones TCP abren --hilos hilos haciendo
+peticiones a la vez con el pool compartido (pool_http) y con un cliente
+nuevo por petición, y la memoria que retienen los listados completos como
+dicts y como registros con __slots__ (modelos). El resultado se guarda en JSON
+(resultados_benchmark/<commit>-<fecha>.json) para comparar entre commits.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import gc
+import tracemalloc
+import subprocess
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from servidor_postgrest import ServidorPostgrest, sembrar, CLAVE_FALSA
+from backend_sqlite import ClienteSQLite
+
+def percentil(valores, p):
+    """Percentil por interpolación lineal (valores no vacíos)"""
+    ordenados = sorted(valores)
+    posicion = (len(ordenados) - 1) * p / 100
+    inferior = int(posicion)
+    superior = min(inferior + 1, len(ordenados) - 1)
+    return ordenados[inferior] + (ordenados[superior] - ordenados[inferior]) * (posicion - inferior)
+
+def commit_actual():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "desconocido"
+
+def definir_operaciones(ops, tamano):
+    """(nombre, función sin argumentos, es_listado_completo)"""
+    azar = random.Random(7)
+    id_al_azar = lambda: azar.randint(1, tamano)
+    return [
+        ("obtener_duenos", ops.obtener_duenos, True),
+        ("obtener_mascotas", ops.obtener_mascotas, True),
+        ("obtener_veterinarios", ops.obtener_veterinarios, False),
+        ("obtener_todas_consultas", ops.obtener_todas_consultas, True),
+        ("obtener_mascotas_por_dueno", lambda: ops.obtener_mascotas_por_dueno(id_al_azar()), False),
+        ("obtener_consultas_por_mascota", lambda: ops.obtener_consultas_por_mascota(id_al_azar()), False),
+        ("buscar_dueno_por_nombre", lambda: ops.buscar_dueno_por_nombre("muñoz"), False),
+        ("buscar_mascota_por_nombre", lambda: ops.buscar_mascota_por_nombre("luna"), False),
+        ("reporte_historial_completo", lambda: ops.reporte_historial_completo(id_al_azar()), False),
+        ("estadisticas_veterinaria", ops.estadisticas_veterinaria, False),
+        ("estadisticas_agrupadas", lambda: ops.estadisticas_veterinaria(agrupados=True), False)
+    ]
+
+def medir(servidor, nombre, funcion, repeticiones):
+    """Medir una operación: tiempos sin tracemalloc y una pasada extra para la memoria"""
+    tiempos = []
+    servidor.estadisticas.reiniciar()
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    trafico = servidor.estadisticas.resumen()
+
+    tracemalloc.start()
+    funcion()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "operacion": nombre,
+        "repeticiones": repeticiones,
+        "p50_ms": round(percentil(tiempos, 50), 3),
+        "p95_ms": round(percentil(tiempos, 95), 3),
+        "p99_ms": round(percentil(tiempos, 99), 3),
+        "peticiones_por_llamada": round(trafico["peticiones"] / repeticiones, 2),
+        "bytes_por_llamada": round(trafico["bytes_enviados"] / repeticiones),
+        "memoria_pico_kb": round(pico / 1024, 1)
+    }
+
+def medir_perfiles(servidor, db, perfiles, filas_pagina):
+    """Bytes de una página de cada tabla con cada perfil de proyección"""
+    medidas = []
+    for tabla, por_perfil in perfiles.items():
+        for perfil in por_perfil:
+            servidor.estadisticas.reiniciar()
+            filas = db.seleccionar(tabla, perfil=perfil, limite=filas_pagina)
+            enviados = servidor.estadisticas.resumen()["bytes_enviados"]
+            medidas.append({
+                "tabla": tabla,
+                "perfil": perfil,
+                "filas": len(filas),
+                "bytes_pagina": enviados,
+                "bytes_por_fila": round(enviados / len(filas), 1) if filas else 0
+            })
+    return medidas
+
+def imprimir_perfiles(medidas):
+    print(f"\n{'tabla':14} {'perfil':10} {'filas':>6} {'bytes página':>13} {'bytes/fila':>11}")
+    print("-" * 58)
+    for m in medidas:
+        print(f"{m['tabla']:14} {m['perfil']:10} {m['filas']:6} {m['bytes_pagina']:13,} {m['bytes_por_fila']:11.1f}")
+
+def medir_conexiones(servidor, db, hilos, peticiones):
+    """Conexiones abiertas por peticiones concurrentes: pool compartido contra un cliente por petición"""
+    from supabase import create_client
+
+    def con_pool(i):
+        db.client.table("dueno").select("id_dueno, nombre").eq("id_dueno", i % 100 + 1).execute()
+
+    def cliente_por_peticion(i):
+        cliente = create_client(servidor.url, CLAVE_FALSA)
+        try:
+            cliente.table("dueno").select("id_dueno, nombre").eq("id_dueno", i % 100 + 1).execute()
+        finally:
+            cliente.postgrest.session.close()
+
+    medidas = []
+    for modo, funcion in (("pool compartido", con_pool), ("cliente por petición", cliente_por_peticion)):
+        servidor.estadisticas.reiniciar()
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=hilos) as ejecutor:
+            list(ejecutor.map(funcion, range(peticiones)))
+        transcurrido = time.perf_counter() - inicio
+        trafico = servidor.estadisticas.resumen()
+        medidas.append({
+            "modo": modo,
+            "hilos": hilos,
+            "peticiones": trafico["peticiones"],
+            "conexiones": trafico["conexiones"],
+            "total_ms": round(transcurrido * 1000, 1),
+            "peticiones_por_s": round(trafico["peticiones"] / transcurrido, 1)
+        })
+    return medidas
+
+def imprimir_conexiones(medidas):
+    print(f"\n{'conexiones':22} {'hilos':>6} {'req':>6} {'conex.':>7} {'ms':>9} {'req/s':>8}")
+    print("-" * 62)
+    for m in medidas:
+        print(f"{m['modo']:22} {m['hilos']:6} {m['peticiones']:6} {m['conexiones']:7} "
+              f"{m['total_ms']:9.1f} {m['peticiones_por_s']:8.1f}")
+
+def medir_memoria_filas(ops, modelos):
+    """Memoria retenida por los listados completos como dicts y como registros (modelos)"""
+    activos = modelos.ACTIVOS
+    medidas = []
+    try:
+        for tabla, iterar in (("mascota", ops.iterar_mascotas), ("consulta", ops.iterar_todas_consultas)):
+            for modo in ("dict", "modelos"):
+                modelos.ACTIVOS = modo == "modelos"
+                gc.collect()
+                tracemalloc.start()
+                filas = list(iterar(perfil="detalle"))
+                retenida, pico = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                medidas.append({
+                    "tabla": tabla,
+                    "modo": modo,
+                    "filas": len(filas),
+                    "retenida_kb": round(retenida / 1024, 1),
+                    "pico_kb": round(pico / 1024, 1),
+                    "bytes_por_fila": round(retenida / len(filas), 1) if filas else 0
+                })
+                del filas
+    finally:
+        modelos.ACTIVOS = activos
+    return medidas
+
+def imprimir_memoria_filas(medidas):
+    print(f"\n{'memoria':10} {'modo':8} {'filas':>8} {'retenida KB':>12} {'pico KB':>10} {'bytes/fila':>11}")
+    print("-" * 64)
+    for m in medidas:
+        print(f"{m['tabla']:10} {m['modo']:8} {m['filas']:8} {m['retenida_kb']:12,.1f} {m['pico_kb']:10,.1f} "
+              f"{m['bytes_por_fila']:11.1f}")
+
+def imprimir_tabla(tamano, filas):
+    print(f"\n📊 Tamaño {tamano:,}")
+    print(f"{'operación':32} {'p50':>9} {'p95':>9} {'p99':>9} {'req':>6} {'bytes':>11} {'mem KB':>9}")
+    print("-" * 91)
+    for f in filas:
+        print(f"{f['operacion']:32} {f['p50_ms']:9.2f} {f['p95_ms']:9.2f} {f['p99_ms']:9.2f} "
+              f"{f['peticiones_por_llamada']:6.1f} {f['bytes_por_llamada']:11,} {f['memoria_pico_kb']:9.1f}")
+
+def comparar(actual, ruta_anterior):
+    """Mostrar la variación de p50 respecto de un resultado anterior"""
+    with open(ruta_anterior, encoding="utf-8") as f:
+        anterior = json.load(f)
+    previos = {(r["tamano"], r["operacion"]): r for r in anterior["resultados"]}
+    print(f"\n🔁 Comparación con {anterior['commit']} ({ruta_anterior})")
+    for r in actual["resultados"]:
+        previo = previos.get((r["tamano"], r["operacion"]))
+        if previo and previo["p50_ms"]:
+            cambio = (r["p50_ms"] - previo["p50_ms"]) / previo["p50_ms"] * 100
+            marca = "⚠️ " if cambio > 10 else "  "
+            print(f"{marca}{r['tamano']:>8,} {r['operacion']:32} p50 {previo['p50_ms']:9.2f} -> "
+                  f"{r['p50_ms']:9.2f} ms ({cambio:+.1f}%)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de operaciones contra PostgREST falso")
+    parser.add_argument("--tamanos", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--repeticiones", type=int, default=30,
+                        help="llamadas por operación (los listados completos usan un décimo)")
+    parser.add_argument("--latencia", type=float, default=5.0, help="ms añadidos a cada petición")
+    parser.add_argument("--jitter", type=float, default=0.0, help="ms aleatorios extra por petición")
+    parser.add_argument("--hilos", type=int, default=8, help="hilos de la medición de conexiones")
+    parser.add_argument("--concurrentes", type=int, default=400,
+                        help="peticiones de la medición de conexiones")
+    parser.add_argument("--salida", default="resultados_benchmark")
+    parser.add_argument("--comparar", help="JSON de un benchmark anterior")
+    args = parser.parse_args()
+
+    servidor = ServidorPostgrest(latencia_ms=args.latencia, jitter_ms=args.jitter).iniciar()
+
+    # El cliente lee estas variables al conectarse por primera vez; la caché se
+    # desactiva para medir las peticiones reales
+    os.environ.update({"SUPABASE_URL": servidor.url, "SUPABASE_KEY": CLAVE_FALSA, "BD_BACKEND": "supabase"})
+    for tabla in ("DUENO", "MASCOTA", "VETERINARIO", "CONSULTA"):
+        os.environ[f"CACHE_TTL_{tabla}"] = "0"
+    import operaciones as ops
+    from supabase_client import PERFILES
+    import pool_http
+    import modelos
+
+    resultado = {
+        "commit": commit_actual(),
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "latencia_ms": args.latencia,
+        "jitter_ms": args.jitter,
+        "pool_http": pool_http.configuracion(),
+        "resultados": [],
+        "perfiles": [],
+        "conexiones": [],
+        "memoria_filas": []
+    }
+
+    for tamano in args.tamanos:
+        print(f"\n🌱 Sembrando {tamano:,} dueños, mascotas y consultas...")
+        servidor.cliente = ClienteSQLite(":memory:")
+        sembrar(servidor.cliente, tamano)
+
+        filas = []
+        for nombre, funcion, listado in definir_operaciones(ops, tamano):
+            repeticiones = max(1, args.repeticiones // 10) if listado else args.repeticiones
+            filas.append({"tamano": tamano, **medir(servidor, nombre, funcion, repeticiones)})
+        imprimir_tabla(tamano, filas)
+        resultado["resultados"].extend(filas)
+
+        perfiles = medir_perfiles(servidor, ops.db, PERFILES, ops.TAMANO_PAGINA)
+        imprimir_perfiles(perfiles)
+        resultado["perfiles"].extend({"tamano": tamano, **m} for m in perfiles)
+
+        conexiones = medir_conexiones(servidor, ops.db, args.hilos, args.concurrentes)
+        imprimir_conexiones(conexiones)
+        resultado["conexiones"].extend({"tamano": tamano, **m} for m in conexiones)
+
+        memoria = medir_memoria_filas(ops, modelos)
+        imprimir_memoria_filas(memoria)
+        resultado["memoria_filas"].extend({"tamano": tamano, **m} for m in memoria)
+
+    servidor.detener()
+
+    os.makedirs(args.salida, exist_ok=True)
+    ruta = os.path.join(args.salida, f"{resultado['commit']}-{datetime.now():%Y%m%d-%H%M%S}.json")
+    with open(ruta, "w", encoding="utf-8") as f:
+        json.dump(resultado, f, ensure_ascii=False, indent=2)
+    print(f"\n💾 Resultados guardados en {ruta}")
+
+    if args.comparar:
+        comparar(resultado, args.comparar)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Segundos que vive una lectura según la tabla de la que depende.
+# Se pueden ajustar con CACHE_TTL_<TABLA> en .env (0 desactiva la caché para esa tabla)
+TTL_POR_TABLA = {
+    "dueno": 300,
+    "veterinario": 600,
+    "mascota": 60,
+    "consulta": 15
+}
+
+# Tablas cuyas filas pueden desaparecer en cascada al eliminar un registro
+DEPENDIENTES_EN_CASCADA = {
+    "dueno": ["mascota", "consulta"],
+    "mascota": ["consulta"]
+}
+
+def _copia(valor):
+    """Copia del contenedor guardado, para que quien lo reciba no modifique la caché"""
+    if isinstance(valor, (list, dict)):
+        return valor.copy()
+    return valor
+
+class CacheLecturas:
+    """Caché read-through para las lecturas de operaciones.
+
+    Cada entrada declara de qué tablas depende como pares (tabla, clave):
+    clave None significa "cualquier fila de la tabla" y una tupla (campo, valor)
+    limita la dependencia a las filas con ese valor. Los listados sin parámetros
+    se guardan aparte; las búsquedas parametrizadas van a un LRU acotado.
+
+    Cada tabla lleva un número de generación que invalidar() incrementa: una
+    carga que empezó antes de una escritura en sus tablas entrega su resultado
+    pero no lo guarda. Quien lee recibe una copia de la lista (o dict) guardada;
+    las filas son compartidas y se tratan como de solo lectura.
+    """
+
+    def __init__(self, ttl_por_tabla=None, max_entradas=256):
+        self.ttl_por_tabla = dict(TTL_POR_TABLA)
+        for tabla in self.ttl_por_tabla:
+            valor = os.getenv(f"CACHE_TTL_{tabla.upper()}")
+            if valor:
+                self.ttl_por_tabla[tabla] = float(valor)
+        if ttl_por_tabla:
+            self.ttl_por_tabla.update(ttl_por_tabla)
+
+        self.max_entradas = int(os.getenv("CACHE_MAX_ENTRADAS", max_entradas))
+        self._listados = {}
+        self._lru = OrderedDict()
+        self._lock = threading.RLock()
+        self._generaciones = {}
+        self.aciertos = 0
+        self.fallos = 0
+        self.invalidaciones = 0
+        # Funciones avisadas de cada escritura (por ejemplo, la réplica local)
+        self._suscriptores = []
+
+    def suscribir(self, funcion):
+        """Llamar a funcion(tabla, claves, cascada, solo_altas) en cada invalidación"""
+        self._suscriptores.append(funcion)
+
+    def _ttl(self, dependencias):
+        return min(self.ttl_por_tabla.get(tabla, 0) for tabla, _ in dependencias)
+
+    def leer(self, clave, dependencias, cargar, parametrizada=False):
+        """Devolver la entrada vigente o cargarla con cargar() y guardarla"""
+        almacen = self._lru if parametrizada else self._listados
+        ahora = time.monotonic()
+
+        with self._lock:
+            entrada = almacen.get(clave)
+            if entrada and entrada[0] > ahora:
+                self.aciertos += 1
+                if parametrizada:
+                    self._lru.move_to_end(clave)
+                return _copia(entrada[1])
+            self.fallos += 1
+            generaciones = self._generacion(dependencias)
+
+        # La carga va fuera del lock para no serializar lecturas distintas
+        valor = cargar()
+
+        ttl = self._ttl(dependencias)
+        if ttl > 0:
+            with self._lock:
+                # Una escritura durante la carga: el valor puede ser anterior a ella
+                if self._generacion(dependencias) != generaciones:
+                    return valor
+                almacen[clave] = (time.monotonic() + ttl, valor, tuple(dependencias))
+                if parametrizada:
+                    self._lru.move_to_end(clave)
+                    while len(self._lru) > self.max_entradas:
+                        self._lru.popitem(last=False)
+                return _copia(valor)
+        return valor
+
+    def _generacion(self, dependencias):
+        # Se llama con el lock tomado
+        return tuple(self._generaciones.get(tabla, 0) for tabla, _ in dependencias)
+
+    def invalidar(self, tabla, claves=None, cascada=False, solo_altas=False):
+        """Descartar las entradas afectadas por una escritura en tabla.
+
+        claves describe la fila escrita ({campo: valor}); sin claves se descarta
+        todo lo que dependa de la tabla. solo_altas indica que la escritura solo
+        agregó filas (no cambia nada aquí, pero sí para los suscriptores).
+        """
+        for funcion in self._suscriptores:
+            funcion(tabla, claves, cascada, solo_altas)
+        tablas = [tabla] + (DEPENDIENTES_EN_CASCADA.get(tabla, []) if cascada else [])
+
+        def afectada(dependencias):
+            for dep_tabla, dep_clave in dependencias:
+                if dep_tabla not in tablas:
+                    continue
+                if dep_tabla != tabla or claves is None or dep_clave is None:
+                    return True
+                campo, valor = dep_clave
+                if campo in claves and claves[campo] == valor:
+                    return True
+            return False
+
+        with self._lock:
+            for afectada_tabla in tablas:
+                self._generaciones[afectada_tabla] = self._generaciones.get(afectada_tabla, 0) + 1
+            for almacen in (self._listados, self._lru):
+                for clave in [c for c, e in almacen.items() if afectada(e[2])]:
+                    del almacen[clave]
+                    self.invalidaciones += 1
+
+    def limpiar(self):
+        """Vaciar la caché completa"""
+        with self._lock:
+            for tabla in list(self._generaciones) + list(self.ttl_por_tabla):
+                self._generaciones[tabla] = self._generaciones.get(tabla, 0) + 1
+            self._listados.clear()
+            self._lru.clear()
+
+    def estadisticas(self):
+        """Contadores de aciertos, fallos e invalidaciones"""
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "tasa_aciertos": self.aciertos / consultas if consultas else 0.0,
+                "invalidaciones": self.invalidaciones,
+                "entradas": len(self._listados) + len(self._lru)
+            }
+
+# Instancia compartida por operaciones y ConexionBD
+cache_lecturas = CacheLecturas()
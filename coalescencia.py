@@ -0,0 +1,165 @@
+"""Lecturas idénticas simultáneas comparten una sola petición (single-flight).
+
+Cuando operaciones se usa desde un servicio con varios hilos o tareas,
+muchos llamadores piden lo mismo a la vez (obtener_veterinarios(), el mismo
+obtener_consultas_por_mascota(id)...) y cada uno pagaba su viaje a Supabase.
+ClienteInstrumentado y operaciones_async pasan cada lectura por aquí: la
+primera con una clave dada hace la petición y las que llegan mientras está
+en vuelo esperan su respuesta en lugar de repetirla.
+
+La clave es la petición HTTP completa: tabla, ruta, parámetros (proyección,
+filtros, orden, límite) y las cabeceras que cambian la respuesta (conteo,
+rango). Solo se comparten lecturas (GET/HEAD); las escrituras y el backend
+SQLite van directo. Cada llamador recibe su propia copia de las filas, así
+nadie ve lo que otro modifique, y si la petición falla todos reciben el
+mismo error.
+
+Una escritura (invalidación del caché) deja de compartir las lecturas que ya
+estaban en vuelo: quien llegue después hace su propia petición.
+
+Variables de .env:
+    COALESCER=0     desactivar (cada lectura hace su petición)
+"""
+import os
+import copy
+import asyncio
+import threading
+from dotenv import load_dotenv
+from cache import cache_lecturas
+
+load_dotenv()
+
+# Cabeceras que cambian la respuesta de una misma URL
+CABECERAS = ("prefer", "range", "range-unit", "accept")
+
+def clave_de(tabla, consulta):
+    """Clave de una lectura de postgrest (None si no se puede compartir)"""
+    metodo = getattr(consulta, "http_method", None)
+    if metodo not in ("GET", "HEAD"):
+        return None
+    cabeceras = tuple((nombre, consulta.headers.get(nombre)) for nombre in CABECERAS)
+    return (tabla, metodo, str(consulta.path), tuple(sorted(consulta.params.multi_items())), cabeceras)
+
+def _copiar(respuesta):
+    """Respuesta con sus propias filas (la original queda intacta para los demás)"""
+    copia = copy.copy(respuesta)
+    copia.data = copy.deepcopy(respuesta.data)
+    return copia
+
+class _Vuelo:
+    __slots__ = ("listo", "respuesta", "error", "seguidores")
+
+    def __init__(self):
+        self.listo = threading.Event()
+        self.respuesta = None
+        self.error = None
+        self.seguidores = 0
+
+class VueloUnico:
+    """Lecturas en vuelo por clave y contadores de cuántas se compartieron"""
+
+    def __init__(self):
+        self.activo = os.getenv("COALESCER", "1") == "1"
+        self._bloqueo = threading.Lock()
+        self._vuelos = {}
+        self._tareas = {}
+        self.reiniciar()
+
+    def reiniciar(self):
+        with self._bloqueo:
+            # ejecutadas: peticiones reales; coalescidas: lecturas que esperaron una ajena
+            self.contadores = {"ejecutadas": 0, "coalescidas": 0}
+            self.por_tabla = {}
+
+    def resumen(self):
+        with self._bloqueo:
+            return {**self.contadores, "por_tabla": dict(self.por_tabla)}
+
+    def _contar(self, tabla, lider):
+        # Se llama con el bloqueo tomado
+        if lider:
+            self.contadores["ejecutadas"] += 1
+        else:
+            self.contadores["coalescidas"] += 1
+            self.por_tabla[tabla] = self.por_tabla.get(tabla, 0) + 1
+
+    def olvidar(self, *_):
+        """Que las lecturas en vuelo no se compartan con nadie más (sus seguidores actuales igual reciben la respuesta)"""
+        with self._bloqueo:
+            self._vuelos.clear()
+            self._tareas.clear()
+
+    def ejecutar(self, clave, tabla, funcion):
+        """Devolver (respuesta, compartida): funcion() o la respuesta de una igual ya en vuelo"""
+        if not self.activo or clave is None:
+            return funcion(), False
+        with self._bloqueo:
+            vuelo = self._vuelos.get(clave)
+            lider = vuelo is None
+            if lider:
+                vuelo = self._vuelos[clave] = _Vuelo()
+            else:
+                vuelo.seguidores += 1
+            self._contar(tabla, lider)
+
+        if not lider:
+            vuelo.listo.wait()
+            if vuelo.error is not None:
+                raise vuelo.error
+            return _copiar(vuelo.respuesta), True
+
+        try:
+            vuelo.respuesta = funcion()
+        except BaseException as e:
+            vuelo.error = e
+            raise
+        finally:
+            with self._bloqueo:
+                if self._vuelos.get(clave) is vuelo:
+                    del self._vuelos[clave]
+                seguidores = vuelo.seguidores
+            vuelo.listo.set()
+        # Los seguidores copian la original: el líder se queda con una copia si hubo alguno
+        return (_copiar(vuelo.respuesta) if seguidores else vuelo.respuesta), False
+
+    async def ejecutar_async(self, clave, tabla, funcion):
+        """Versión asyncio: await funcion() o la respuesta de una igual ya en vuelo en el mismo bucle"""
+        if not self.activo or clave is None:
+            return await funcion()
+        bucle = asyncio.get_running_loop()
+        clave = (bucle, clave)
+        with self._bloqueo:
+            vuelo = self._tareas.get(clave)
+            lider = vuelo is None
+            if lider:
+                vuelo = self._tareas[clave] = [bucle.create_future(), 0]
+            else:
+                vuelo[1] += 1
+            self._contar(tabla, lider)
+        futuro = vuelo[0]
+
+        if not lider:
+            return _copiar(await asyncio.shield(futuro))
+
+        try:
+            respuesta = await funcion()
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                futuro.cancel()
+            else:
+                futuro.set_exception(e)
+                # Sin seguidores nadie la lee: que asyncio no avise "exception was never retrieved"
+                futuro.exception()
+            raise
+        else:
+            futuro.set_result(respuesta)
+        finally:
+            with self._bloqueo:
+                if self._tareas.get(clave) is vuelo:
+                    del self._tareas[clave]
+                seguidores = vuelo[1]
+        return _copiar(respuesta) if seguidores else respuesta
+
+lecturas_en_vuelo = VueloUnico()
+# Lo que esté en vuelo puede ser anterior a la escritura
+cache_lecturas.suscribir(lecturas_en_vuelo.olvidar)
@@ -0,0 +1,319 @@
+"""Diario local de altas (write-ahead) para registrar sin esperar a la red.
+
+Con DIARIO=1 en .env (o diario.activar()), crear_dueno, crear_mascota,
+crear_veterinario y crear_consulta no esperan a Supabase: el registro se
+escribe en un SQLite local (DIARIO_RUTA, diario.db por defecto) y la llamada
+devuelve al instante un ID temporal negativo. Un hilo en segundo plano envía
+lo pendiente en inserciones multi-fila: una por tabla, primero dueños y
+veterinarios, después mascotas y consultas, y dentro de cada tabla en el
+orden en que se registró.
+
+Los IDs temporales sirven como claves foráneas: una mascota registrada con
+id_dueno=-3 se envía con el ID que el servidor le dio al dueño -3, porque los
+dueños se envían antes. Las equivalencias temporal -> servidor
+quedan guardadas, así un ID temporal sigue sirviendo después del envío:
+las lecturas y modificaciones por ID de operaciones lo traducen con
+resolver_id(), que rechaza con IDPendiente los que todavía no se enviaron.
+
+El diario sobrevive a reinicios: lo que no se alcanzó a enviar se envía al
+volver a abrirlo. Si el servidor rechaza un registro (por ejemplo, una clave
+foránea inexistente) queda marcado con el error, junto con los que dependen
+de él, y el resto sigue su curso. Si el proceso muere justo después de que el
+servidor confirme un lote y antes de anotarlo aquí, ese lote se reenvía al
+reiniciar (entrega al menos una vez).
+
+Variables de .env:
+    DIARIO=1                 activar el diario
+    DIARIO_RUTA=diario.db
+    DIARIO_INTERVALO_S=2     cada cuánto se revisa si hay pendientes (además de al registrar)
+    DIARIO_LOTE=200          registros por pasada
+"""
+import os
+import json
+import time
+import atexit
+import sqlite3
+import threading
+from dotenv import load_dotenv
+
+from supabase_client import db, CLAVES_PRIMARIAS, CLAVES_FORANEAS
+from cache import cache_lecturas
+import indice_busqueda
+from resiliencia import es_transitorio, BaseNoDisponible
+
+load_dotenv()
+
+ACTIVO = os.getenv("DIARIO") == "1"
+RUTA = os.getenv("DIARIO_RUTA", "diario.db")
+INTERVALO_S = float(os.getenv("DIARIO_INTERVALO_S", "2"))
+TAMANO_LOTE = int(os.getenv("DIARIO_LOTE", "200"))
+
+# Una tabla se envía después de las que referencia
+ORDEN_ENVIO = ["dueno", "veterinario", "mascota", "consulta"]
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS entrada (
+    secuencia INTEGER PRIMARY KEY AUTOINCREMENT,
+    tabla TEXT NOT NULL,
+    datos TEXT NOT NULL,
+    creada REAL NOT NULL,
+    intentos INTEGER NOT NULL DEFAULT 0,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS equivalencia (
+    id_temporal INTEGER PRIMARY KEY,
+    tabla TEXT NOT NULL,
+    id_servidor INTEGER NOT NULL
+);
+"""
+
+class _Rechazo(Exception):
+    """El servidor rechazó el registro: reintentarlo no sirve"""
+
+class IDPendiente(ValueError):
+    """ID temporal de un alta que el diario todavía no envió: el servidor aún no lo conoce"""
+
+class Diario:
+    """Registros pendientes de enviar y equivalencias de IDs temporales"""
+
+    def __init__(self, ruta=RUTA, obtener_cliente=lambda: db.client,
+                 intervalo_s=INTERVALO_S, tamano_lote=TAMANO_LOTE):
+        self.ruta = ruta
+        self._obtener_cliente = obtener_cliente
+        self.intervalo_s = intervalo_s
+        self.tamano_lote = tamano_lote
+        self._bloqueo = threading.RLock()
+        # Un solo envío a la vez: el hilo de fondo y vaciar() no se pisan
+        self._enviando = threading.Lock()
+        self._despertar = threading.Event()
+        self._detener = threading.Event()
+        self._hilo = None
+        self._conexion = sqlite3.connect(ruta, check_same_thread=False)
+        with self._bloqueo:
+            self._conexion.execute("PRAGMA journal_mode = WAL")
+            # Un registro confirmado al usuario tiene que sobrevivir a un corte de luz
+            self._conexion.execute("PRAGMA synchronous = FULL")
+            self._conexion.executescript(ESQUEMA)
+            self._conexion.commit()
+
+    # ---------- registro ----------
+    def registrar(self, tabla, datos):
+        """Guardar un alta y devolver su ID temporal (negativo)"""
+        datos = dict(datos)
+        for columna in CLAVES_FORANEAS.get(tabla, {}):
+            datos[columna] = self.resolver(datos.get(columna))
+        with self._bloqueo:
+            cursor = self._conexion.execute(
+                "INSERT INTO entrada (tabla, datos, creada) VALUES (?, ?, ?)",
+                (tabla, json.dumps(datos, ensure_ascii=False, default=str), time.time()))
+            self._conexion.commit()
+        self._despertar.set()
+        return -cursor.lastrowid
+
+    def resolver(self, id_valor):
+        """ID del servidor para un ID temporal ya enviado; cualquier otro valor queda igual"""
+        if not isinstance(id_valor, int) or id_valor >= 0:
+            return id_valor
+        with self._bloqueo:
+            fila = self._conexion.execute(
+                "SELECT id_servidor FROM equivalencia WHERE id_temporal = ?", (id_valor,)).fetchone()
+        return fila[0] if fila else id_valor
+
+    def conoce(self, tabla, id_temporal):
+        """True si el ID temporal es de un alta de la tabla pendiente o ya enviada"""
+        with self._bloqueo:
+            return self._conexion.execute(
+                "SELECT 1 FROM entrada WHERE secuencia = ? AND tabla = ? AND error IS NULL "
+                "UNION ALL SELECT 1 FROM equivalencia WHERE id_temporal = ? AND tabla = ?",
+                (-id_temporal, tabla, id_temporal, tabla)).fetchone() is not None
+
+    def pendientes(self, tabla=None):
+        """Cantidad de altas sin enviar (sin contar las rechazadas)"""
+        sql = "SELECT COUNT(*) FROM entrada WHERE error IS NULL"
+        with self._bloqueo:
+            if tabla:
+                return self._conexion.execute(sql + " AND tabla = ?", (tabla,)).fetchone()[0]
+            return self._conexion.execute(sql).fetchone()[0]
+
+    def rechazadas(self):
+        """Altas que el servidor rechazó: [{id_temporal, tabla, datos, error}]"""
+        with self._bloqueo:
+            filas = self._conexion.execute(
+                "SELECT secuencia, tabla, datos, error FROM entrada WHERE error IS NOT NULL ORDER BY secuencia").fetchall()
+        return [{"id_temporal": -s, "tabla": t, "datos": json.loads(d), "error": e} for s, t, d, e in filas]
+
+    # ---------- envío ----------
+    def vaciar(self):
+        """Enviar todo lo pendiente; devuelve {enviadas, rechazadas, peticiones, ms}.
+
+        Un error transitorio (red, servidor caído) corta el envío: lo
+        pendiente queda para la próxima pasada y el error se propaga."""
+        resumen = {"enviadas": 0, "rechazadas": 0, "peticiones": 0, "ms": 0.0}
+        inicio = time.perf_counter()
+        with self._enviando:
+            while True:
+                with self._bloqueo:
+                    lote = self._conexion.execute(
+                        "SELECT secuencia, tabla, datos FROM entrada WHERE error IS NULL "
+                        "ORDER BY secuencia LIMIT ?", (self.tamano_lote,)).fetchall()
+                if not lote:
+                    break
+                self._enviar_lote(lote, resumen)
+        resumen["ms"] = round((time.perf_counter() - inicio) * 1000, 1)
+        return resumen
+
+    def _enviar_lote(self, lote, resumen):
+        """Enviar un lote con una inserción por tabla, las referenciadas primero"""
+        por_tabla = {}
+        for entrada in lote:
+            por_tabla.setdefault(entrada[1], []).append(entrada)
+        for tabla in sorted(por_tabla, key=lambda t: ORDEN_ENVIO.index(t) if t in ORDEN_ENVIO else len(ORDEN_ENVIO)):
+            self._enviar_tramo(por_tabla[tabla], resumen)
+
+    def _enviar_tramo(self, tramo, resumen):
+        tabla = tramo[0][1]
+        secuencias, filas = [], []
+        for secuencia, _, datos in tramo:
+            try:
+                filas.append(self._resolver_foraneas(tabla, json.loads(datos)))
+                secuencias.append(secuencia)
+            except _Rechazo as e:
+                self._marcar_error(secuencia, str(e))
+                resumen["rechazadas"] += 1
+        if not secuencias:
+            return
+
+        try:
+            self._insertar(tabla, secuencias, filas, resumen)
+        except _Rechazo as e:
+            if len(secuencias) == 1:
+                self._marcar_error(secuencias[0], str(e))
+                resumen["rechazadas"] += 1
+                return
+            # Se reenvían de a una para rechazar solo las que fallan
+            for secuencia, fila in zip(secuencias, filas):
+                try:
+                    self._insertar(tabla, [secuencia], [fila], resumen)
+                except _Rechazo as e:
+                    self._marcar_error(secuencia, str(e))
+                    resumen["rechazadas"] += 1
+
+    def _resolver_foraneas(self, tabla, datos):
+        for columna, tabla_foranea in CLAVES_FORANEAS.get(tabla, {}).items():
+            valor = datos.get(columna)
+            if isinstance(valor, int) and valor < 0:
+                resuelto = self.resolver(valor)
+                if resuelto < 0:
+                    # El alta de la que depende fue rechazada (su tabla se envía antes)
+                    raise _Rechazo(f"{columna}={valor}: el registro de {tabla_foranea} del que depende fue rechazado")
+                datos[columna] = resuelto
+        return datos
+
+    def _insertar(self, tabla, secuencias, filas, resumen):
+        """Insertar y anotar las equivalencias en una sola transacción local"""
+        cliente = self._obtener_cliente()
+        if cliente is None:
+            raise BaseNoDisponible("No hay conexión a la base de datos")
+        try:
+            resumen["peticiones"] += 1
+            insertadas = cliente.table(tabla).insert(filas).execute().data
+        except Exception as e:
+            if isinstance(e, BaseNoDisponible) or es_transitorio(e):
+                with self._bloqueo:
+                    self._conexion.executemany("UPDATE entrada SET intentos = intentos + 1 WHERE secuencia = ?",
+                                               [(s,) for s in secuencias])
+                    self._conexion.commit()
+                raise
+            raise _Rechazo(str(e)) from e
+
+        clave = CLAVES_PRIMARIAS[tabla]
+        # PostgREST devuelve las filas insertadas en el orden enviado
+        with self._bloqueo:
+            self._conexion.executemany(
+                "INSERT OR REPLACE INTO equivalencia (id_temporal, tabla, id_servidor) VALUES (?, ?, ?)",
+                [(-s, tabla, fila[clave]) for s, fila in zip(secuencias, insertadas)])
+            self._conexion.executemany("DELETE FROM entrada WHERE secuencia = ?", [(s,) for s in secuencias])
+            self._conexion.commit()
+        resumen["enviadas"] += len(secuencias)
+        cache_lecturas.invalidar(tabla, solo_altas=True)
+        indice_busqueda.desactualizar(tabla)
+
+    def _marcar_error(self, secuencia, error):
+        print(f"❌ Registro {-secuencia} rechazado por el servidor: {error}")
+        with self._bloqueo:
+            self._conexion.execute("UPDATE entrada SET error = ? WHERE secuencia = ?", (error, secuencia))
+            self._conexion.commit()
+
+    # ---------- hilo de fondo ----------
+    def iniciar(self):
+        """Arrancar el envío en segundo plano (envía también lo que quedó de otra sesión)"""
+        if self._hilo is None:
+            self._hilo = threading.Thread(target=self._trabajar, name="diario", daemon=True)
+            self._hilo.start()
+        return self
+
+    def _trabajar(self):
+        espera = self.intervalo_s
+        self._despertar.set()
+        while not self._detener.is_set():
+            self._despertar.wait(espera)
+            self._despertar.clear()
+            if self._detener.is_set():
+                return
+            try:
+                self.vaciar()
+                espera = self.intervalo_s
+            except Exception as e:
+                # Sin red: se reintenta con espera creciente hasta 60 s
+                espera = min(60.0, max(espera, self.intervalo_s) * 2)
+                print(f"⚠️ Diario: {self.pendientes()} registros sin enviar ({e}); reintento en {espera:.0f}s")
+
+    def detener(self, vaciar=True):
+        """Parar el hilo de fondo, intentando antes un último envío"""
+        self._detener.set()
+        self._despertar.set()
+        if self._hilo is not None:
+            self._hilo.join(timeout=5)
+            self._hilo = None
+        if vaciar:
+            try:
+                self.vaciar()
+            except Exception as e:
+                print(f"⚠️ Diario: quedan {self.pendientes()} registros sin enviar ({e}); se enviarán al volver a abrir")
+        with self._bloqueo:
+            self._conexion.close()
+
+_diario = None
+_bloqueo_global = threading.Lock()
+
+def activar(ruta=None):
+    """Abrir el diario y arrancar su envío en segundo plano"""
+    global _diario
+    with _bloqueo_global:
+        if _diario is None:
+            _diario = Diario(ruta or RUTA).iniciar()
+            atexit.register(_diario.detener)
+            pendientes = _diario.pendientes()
+            print(f"📒 Diario local activo ({_diario.ruta})" +
+                  (f": {pendientes} registros pendientes de otra sesión" if pendientes else ""))
+    return _diario
+
+def obtener():
+    """El diario si está activo (DIARIO=1 lo abre en el primer uso), si no None"""
+    if _diario is None and ACTIVO:
+        return activar()
+    return _diario
+
+def resolver_id(tabla, id_valor):
+    """ID del servidor para usar en una lectura o modificación por clave.
+
+    Los IDs temporales ya enviados se traducen; uno que sigue pendiente lanza
+    IDPendiente (el servidor todavía no lo tiene). Los demás valores quedan igual."""
+    if not isinstance(id_valor, int) or id_valor >= 0 or _diario is None and not ACTIVO:
+        return id_valor
+    local = obtener()
+    resuelto = local.resolver(id_valor)
+    if resuelto == id_valor and local.conoce(tabla, id_valor):
+        raise IDPendiente(f"{tabla} con ID temporal {id_valor} todavía no se envió al servidor "
+                          f"({local.pendientes()} altas pendientes en el diario); intente en unos segundos")
+    return resuelto
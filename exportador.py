@@ -0,0 +1,235 @@
+"""Exportación de los historiales clínicos de todas las mascotas.
+
+Uso:
+    python exportador.py                                  # JSONL en exportacion/
+    python exportador.py --formato csv --por-archivo 5000
+    python exportador.py --formato texto --procesos 8     # texto listo para imprimir/PDF
+
+Las mascotas se recorren por ID en páginas (cada página trae dueño, consultas
+y veterinario en una sola petición) y se agrupan en partes de --por-archivo
+mascotas. Este proceso solo descarga; el formateo y la escritura de cada
+parte se hacen en un pool de procesos. Como mucho hay dos partes por proceso
+en memoria, así el consumo no depende del tamaño de la clínica.
+
+Cada parte se escribe en un archivo propio (historiales-00000.jsonl, ...)
+y se confirma en orden en exportacion.checkpoint.json; si la exportación se
+corta, volver a ejecutar el mismo comando continúa desde la última parte
+completa.
+"""
+import os
+import io
+import sys
+import csv
+import json
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from operaciones import pagina_historiales, TAMANO_LOTE_REPORTES
+import modelos
+
+EXTENSIONES = {"jsonl": "jsonl", "csv": "csv", "texto": "txt"}
+
+COLUMNAS_CSV = (
+    "id_mascota", "mascota", "especie", "raza", "fecha_nacimiento",
+    "id_dueno", "dueno", "telefono_dueno", "email_dueno",
+    "id_consulta", "fecha_consulta", "veterinario", "especialidad",
+    "motivo", "diagnostico", "tratamiento", "observaciones"
+)
+
+# ========== FORMATOS ==========
+def _formatear_jsonl(reportes, salida):
+    for reporte in reportes:
+        salida.write(json.dumps(reporte, ensure_ascii=False, default=modelos.a_json) + "\n")
+
+def _formatear_csv(reportes, salida):
+    """Una fila por consulta; las mascotas sin consultas ocupan una fila sin datos de consulta"""
+    escritor = csv.DictWriter(salida, fieldnames=COLUMNAS_CSV)
+    escritor.writeheader()
+    for reporte in reportes:
+        mascota = reporte['mascota']
+        dueno = reporte['dueno'] or {}
+        base = {
+            "id_mascota": mascota['id_mascota'],
+            "mascota": mascota['nombre'],
+            "especie": mascota.get('especie'),
+            "raza": mascota.get('raza'),
+            "fecha_nacimiento": mascota.get('fecha_nacimiento'),
+            "id_dueno": dueno.get('id_dueno'),
+            "dueno": dueno.get('nombre'),
+            "telefono_dueno": dueno.get('telefono'),
+            "email_dueno": dueno.get('email')
+        }
+        if not reporte['consultas']:
+            escritor.writerow(base)
+        for c in reporte['consultas']:
+            veterinario = c.get('veterinario') or {}
+            escritor.writerow({
+                **base,
+                "id_consulta": c['id_consulta'],
+                "fecha_consulta": c['fecha_consulta'],
+                "veterinario": veterinario.get('nombre'),
+                "especialidad": veterinario.get('especialidad'),
+                "motivo": c['motivo'],
+                "diagnostico": c['diagnostico'],
+                "tratamiento": c['tratamiento'],
+                "observaciones": c['observaciones']
+            })
+
+def _formatear_texto(reportes, salida):
+    """El mismo formato del reporte del menú, una mascota por página (salto de página)"""
+    for reporte in reportes:
+        mascota = reporte['mascota']
+        dueno = reporte['dueno'] or {}
+        consultas = reporte['consultas']
+        salida.write("HISTORIAL CLÍNICO COMPLETO\n")
+        salida.write(f"Mascota: {mascota['nombre']} (ID: {mascota['id_mascota']})\n")
+        salida.write(f"Especie/Raza: {mascota.get('especie')} / {mascota.get('raza')}\n")
+        salida.write(f"F. Nacimiento: {mascota.get('fecha_nacimiento')}\n")
+        salida.write(f"Dueño: {dueno.get('nombre')} | {dueno.get('telefono')}\n")
+        salida.write(f"\nCONSULTAS REGISTRADAS: {len(consultas)}\n")
+        for i, c in enumerate(consultas, 1):
+            vet_nombre = c['veterinario']['nombre'] if c.get('veterinario') else "No asignado"
+            salida.write(f"\n  {i}. {c['fecha_consulta']} | {vet_nombre}\n")
+            salida.write(f"      Motivo: {c['motivo']}\n")
+            salida.write(f"      Diagnóstico: {c['diagnostico']}\n")
+            salida.write(f"      Tratamiento: {c['tratamiento']}\n")
+            salida.write(f"      Observaciones: {c['observaciones']}\n")
+        salida.write("\f\n")
+
+FORMATOS = {
+    "jsonl": _formatear_jsonl,
+    "csv": _formatear_csv,
+    "texto": _formatear_texto
+}
+
+def escribir_parte(formato, reportes, ruta):
+    """Formatear y escribir una parte (se ejecuta en el pool de procesos).
+
+    Devuelve (ruta, mascotas, consultas, bytes)."""
+    buffer = io.StringIO()
+    FORMATOS[formato](reportes, buffer)
+    datos = buffer.getvalue().encode("utf-8")
+    # Escritura atómica: una parte a medias nunca queda con su nombre final
+    temporal = f"{ruta}.tmp"
+    with open(temporal, "wb") as f:
+        f.write(datos)
+    os.replace(temporal, ruta)
+    return ruta, len(reportes), sum(len(r['consultas']) for r in reportes), len(datos)
+
+# ========== EXPORTACIÓN ==========
+def cargar_checkpoint(ruta, formato, por_archivo):
+    if os.path.exists(ruta):
+        with open(ruta, encoding="utf-8") as f:
+            checkpoint = json.load(f)
+        if (checkpoint["formato"], checkpoint["por_archivo"]) != (formato, por_archivo):
+            raise ValueError(f"El checkpoint {ruta} es de una exportación {checkpoint['formato']} "
+                             f"de {checkpoint['por_archivo']} mascotas por archivo")
+        return checkpoint
+    return {"formato": formato, "por_archivo": por_archivo, "partes": 0,
+            "ultimo_id": None, "mascotas": 0, "consultas": 0, "bytes": 0}
+
+def guardar_checkpoint(ruta, checkpoint):
+    temporal = f"{ruta}.tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f)
+    os.replace(temporal, ruta)
+
+def leer_parte(despues_de, por_archivo, tamano_pagina):
+    """Descargar las por_archivo mascotas siguientes a despues_de, página a página"""
+    reportes = []
+    while len(reportes) < por_archivo:
+        pagina = pagina_historiales(despues_de, min(tamano_pagina, por_archivo - len(reportes)))
+        reportes.extend(pagina)
+        if len(pagina) < tamano_pagina:
+            break
+        despues_de = pagina[-1]['mascota']['id_mascota']
+    return reportes
+
+def exportar(formato="jsonl", destino="exportacion", por_archivo=1000,
+             tamano_pagina=TAMANO_LOTE_REPORTES, procesos=None, desde_cero=False):
+    """Exportar todos los historiales; devuelve el checkpoint final"""
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato desconocido: {formato}")
+    os.makedirs(destino, exist_ok=True)
+    ruta_checkpoint = os.path.join(destino, "exportacion.checkpoint.json")
+    if desde_cero and os.path.exists(ruta_checkpoint):
+        os.remove(ruta_checkpoint)
+    checkpoint = cargar_checkpoint(ruta_checkpoint, formato, por_archivo)
+    if checkpoint["partes"]:
+        print(f"⏩ Reanudando desde la parte {checkpoint['partes']} (mascota ID > {checkpoint['ultimo_id']})")
+
+    procesos = procesos or os.cpu_count() or 1
+    inicio = time.perf_counter()
+    exportadas = 0
+
+    def confirmar(pendiente):
+        """Registrar una parte escrita y avanzar el checkpoint"""
+        nonlocal exportadas
+        futuro, ultimo_id = pendiente
+        ruta, mascotas, consultas, bytes_escritos = futuro.result()
+        checkpoint["partes"] += 1
+        checkpoint["ultimo_id"] = ultimo_id
+        checkpoint["mascotas"] += mascotas
+        checkpoint["consultas"] += consultas
+        checkpoint["bytes"] += bytes_escritos
+        guardar_checkpoint(ruta_checkpoint, checkpoint)
+
+        exportadas += mascotas
+        transcurrido = time.perf_counter() - inicio
+        print(f"   📄 {os.path.basename(ruta)} | {checkpoint['mascotas']} mascotas | "
+              f"{exportadas / transcurrido:,.0f} mascotas/s")
+
+    # Las partes se formatean en paralelo pero se confirman en orden, así el
+    # checkpoint siempre marca un prefijo de mascotas completamente exportado
+    en_vuelo = deque()
+    numero = checkpoint["partes"]
+    ultimo_id = checkpoint["ultimo_id"]
+    try:
+        with ProcessPoolExecutor(max_workers=procesos) as pool:
+            while True:
+                reportes = leer_parte(ultimo_id, por_archivo, tamano_pagina)
+                if not reportes:
+                    break
+                ultimo_id = reportes[-1]['mascota']['id_mascota']
+                ruta = os.path.join(destino, f"historiales-{numero:05d}.{EXTENSIONES[formato]}")
+                en_vuelo.append((pool.submit(escribir_parte, formato, reportes, ruta), ultimo_id))
+                numero += 1
+                while len(en_vuelo) >= procesos * 2:
+                    confirmar(en_vuelo.popleft())
+                if len(reportes) < por_archivo:
+                    break
+    finally:
+        # Al cerrar el pool todas las partes enviadas terminaron: se confirman
+        # las escritas, también si la descarga falló, para reanudar desde ahí
+        while en_vuelo and en_vuelo[0][0].exception() is None:
+            confirmar(en_vuelo.popleft())
+    if en_vuelo:
+        en_vuelo[0][0].result()
+
+    transcurrido = time.perf_counter() - inicio
+    print(f"\n✅ Exportación terminada en {transcurrido:.1f}s "
+          f"({exportadas / transcurrido if transcurrido else 0:,.0f} mascotas/s)")
+    print(f"   Partes: {checkpoint['partes']} | Mascotas: {checkpoint['mascotas']} | "
+          f"Consultas: {checkpoint['consultas']} | {checkpoint['bytes'] / 1024 / 1024:.1f} MB")
+    return checkpoint
+
+def main():
+    parser = argparse.ArgumentParser(description="Exportar historiales clínicos a JSONL/CSV/texto")
+    parser.add_argument("--formato", choices=sorted(FORMATOS), default="jsonl")
+    parser.add_argument("--destino", default="exportacion", help="carpeta de salida")
+    parser.add_argument("--por-archivo", type=int, default=1000, help="mascotas por archivo")
+    parser.add_argument("--pagina", type=int, default=TAMANO_LOTE_REPORTES, help="mascotas por petición")
+    parser.add_argument("--procesos", type=int, help="procesos de formateo (por defecto, uno por núcleo)")
+    parser.add_argument("--desde-cero", action="store_true", help="ignorar el checkpoint anterior")
+    args = parser.parse_args()
+
+    try:
+        exportar(args.formato, args.destino, args.por_archivo, args.pagina, args.procesos, args.desde_cero)
+    except (OSError, ValueError) as e:
+        print(f"❌ Error en la exportación: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+"""Importador de datos de clínicas desde archivos CSV o JSONL.
+
+Uso:
+    python importador.py dueno duenos.csv
+    python importador.py mascota mascotas.jsonl --lote 1000 --hilos 8
+
+Cada archivo se lee en streaming (memoria constante) y se carga en lotes
+multi-fila enviados en paralelo. Las filas pueden traer una clave natural
+"ref" propia de la clínica de origen; las claves foráneas se indican con
+ref_dueno, ref_mascota y ref_veterinario y se resuelven con el mapa de
+claves guardado por las importaciones anteriores. Si la carga se
+interrumpe, volver a ejecutar el mismo comando continúa desde el último
+lote confirmado.
+
+Las filas inválidas (incluidas las líneas JSONL mal formadas o que no son un
+objeto) no detienen la carga: se anotan con su número de fila o de línea en
+<archivo>.rechazados.jsonl.
+
+Cada lote se inserta antes de escribir el checkpoint que lo confirma: si el
+proceso se corta entre el insert y esa escritura, al reanudar el lote se
+vuelve a insertar y sus filas quedan duplicadas. Conviene revisar los
+últimos registros de la tabla (o los IDs del mapa de claves) tras un corte.
+"""
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+from collections import deque
+from datetime import date, datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+
+from supabase_client import db, TAMANO_LOTE, en_lotes
+from operaciones import COLUMNAS, OBLIGATORIAS
+
+# Columnas adicionales que solo tienen sentido al migrar datos históricos
+COLUMNAS_IMPORTACION = {
+    **COLUMNAS,
+    "consulta": COLUMNAS["consulta"] + ("fecha_consulta",)
+}
+
+# Nombres alternativos habituales en las exportaciones de otras clínicas
+ALIAS = {
+    "name": "nombre",
+    "nombre_completo": "nombre",
+    "address": "direccion",
+    "dirección": "direccion",
+    "phone": "telefono",
+    "teléfono": "telefono",
+    "correo": "email",
+    "species": "especie",
+    "breed": "raza",
+    "birth_date": "fecha_nacimiento",
+    "specialty": "especialidad",
+    "reason": "motivo",
+    "diagnóstico": "diagnostico",
+    "treatment": "tratamiento",
+    "notes": "observaciones",
+    "fecha": "fecha_consulta"
+}
+
+# Columna de clave natural foránea -> (columna destino, tabla referenciada)
+REFERENCIAS = {
+    "mascota": {"ref_dueno": ("id_dueno", "dueno")},
+    "consulta": {
+        "ref_mascota": ("id_mascota", "mascota"),
+        "ref_veterinario": ("id_veterinario", "veterinario")
+    }
+}
+
+COLUMNAS_ENTERAS = ("id_dueno", "id_mascota", "id_veterinario")
+
+class ErrorValidacion(ValueError):
+    """Fila que no cumple el esquema de destino"""
+
+class LineaIlegible:
+    """Línea JSONL que no se pudo convertir en fila (se rechaza sin cortar la carga)"""
+    __slots__ = ("linea", "error", "texto")
+
+    def __init__(self, linea, error, texto):
+        self.linea = linea
+        self.error = error
+        self.texto = texto
+
+def leer_filas(archivo):
+    """Recorrer un CSV o JSONL fila a fila (las líneas JSONL inválidas salen como LineaIlegible)"""
+    if archivo.lower().endswith((".jsonl", ".ndjson")):
+        with open(archivo, encoding="utf-8") as f:
+            for numero, linea in enumerate(f, start=1):
+                if not linea.strip():
+                    continue
+                try:
+                    fila = json.loads(linea)
+                except ValueError as e:
+                    yield LineaIlegible(numero, f"JSON mal formado: {e}", linea.rstrip("\n"))
+                    continue
+                if isinstance(fila, dict):
+                    yield fila
+                else:
+                    yield LineaIlegible(numero, "La línea no es un objeto JSON", linea.rstrip("\n"))
+    else:
+        with open(archivo, encoding="utf-8-sig", newline="") as f:
+            yield from csv.DictReader(f)
+
+def normalizar_columna(nombre):
+    nombre = nombre.strip().lower().replace(" ", "_")
+    return ALIAS.get(nombre, nombre)
+
+def mapear_fila(tabla, fila, mapa_claves):
+    """Convertir una fila de origen al esquema de la tabla, resolviendo referencias"""
+    origen = {normalizar_columna(k): (v.strip() if isinstance(v, str) else v)
+              for k, v in fila.items() if k}
+    origen = {k: (None if v == "" else v) for k, v in origen.items()}
+
+    for columna_ref, (columna, tabla_ref) in REFERENCIAS.get(tabla, {}).items():
+        ref = origen.get(columna_ref)
+        if ref is not None and origen.get(columna) is None:
+            id_resuelto = mapa_claves.get(tabla_ref, {}).get(str(ref))
+            if id_resuelto is None:
+                raise ErrorValidacion(f"{columna_ref} '{ref}' no fue importado en {tabla_ref}")
+            origen[columna] = id_resuelto
+
+    registro = {c: origen.get(c) for c in COLUMNAS_IMPORTACION[tabla]}
+
+    faltantes = [c for c in OBLIGATORIAS[tabla] if registro[c] is None]
+    if faltantes:
+        raise ErrorValidacion(f"Faltan campos obligatorios: {', '.join(faltantes)}")
+    for columna in COLUMNAS_ENTERAS:
+        if registro.get(columna) is not None:
+            try:
+                registro[columna] = int(registro[columna])
+            except (TypeError, ValueError):
+                raise ErrorValidacion(f"{columna} debe ser un número")
+    if tabla == "consulta" and registro["fecha_consulta"] is None:
+        # En un insert multi-fila un null explícito no toma el default de la columna
+        registro["fecha_consulta"] = datetime.now(timezone.utc).isoformat()
+    if registro.get("fecha_nacimiento"):
+        try:
+            date.fromisoformat(str(registro["fecha_nacimiento"]))
+        except ValueError:
+            raise ErrorValidacion("fecha_nacimiento debe tener formato YYYY-MM-DD")
+
+    return registro, (str(origen["ref"]) if origen.get("ref") is not None else None)
+
+def cargar_json(ruta, por_defecto):
+    if os.path.exists(ruta):
+        with open(ruta, encoding="utf-8") as f:
+            return json.load(f)
+    return por_defecto
+
+def cargar_mapa_claves(ruta):
+    """Leer el mapa de claves naturales (una línea JSON por lote confirmado)"""
+    mapa = {}
+    if os.path.exists(ruta):
+        with open(ruta, encoding="utf-8") as f:
+            for linea in f:
+                if linea.strip():
+                    entrada = json.loads(linea)
+                    mapa.setdefault(entrada["tabla"], {}).update(entrada["ids"])
+    return mapa
+
+def guardar_json(ruta, datos):
+    # Escritura atómica: un corte a mitad de escritura no corrompe el checkpoint
+    temporal = f"{ruta}.tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump(datos, f, ensure_ascii=False)
+    os.replace(temporal, ruta)
+
+def importar(tabla, archivo, tamano_lote=TAMANO_LOTE, hilos=4,
+             ruta_checkpoint=None, ruta_mapa="mapa_claves.jsonl"):
+    """Importar un archivo en la tabla indicada; devuelve un resumen de la carga"""
+    if tabla not in COLUMNAS_IMPORTACION:
+        raise ValueError(f"Tabla desconocida: {tabla}")
+
+    ruta_checkpoint = ruta_checkpoint or f"{archivo}.checkpoint.json"
+    checkpoint = cargar_json(ruta_checkpoint, {"tabla": tabla, "filas_confirmadas": 0,
+                                               "insertadas": 0, "rechazadas": 0})
+    if checkpoint["tabla"] != tabla:
+        raise ValueError(f"El checkpoint {ruta_checkpoint} corresponde a la tabla {checkpoint['tabla']}")
+    mapa_claves = cargar_mapa_claves(ruta_mapa)
+    mapa_tabla = mapa_claves.setdefault(tabla, {})
+    # El mapa se amplía solo con anexos, así cada lote cuesta lo mismo de persistir
+    archivo_mapa = open(ruta_mapa, "a", encoding="utf-8")
+    saltar = checkpoint["filas_confirmadas"]
+    if saltar:
+        print(f"⏩ Reanudando {archivo} desde la fila {saltar}")
+
+    rechazados = open(f"{archivo}.rechazados.jsonl", "a", encoding="utf-8")
+    inicio = time.perf_counter()
+    procesadas = 0
+
+    def preparar(lote, desde):
+        """Validar un lote; devuelve (registros, refs, filas rechazadas)"""
+        registros, refs, rechazos = [], [], []
+        for i, fila in enumerate(lote):
+            if isinstance(fila, LineaIlegible):
+                rechazos.append({"fila": desde + i, "linea": fila.linea, "error": fila.error, "datos": fila.texto})
+                continue
+            try:
+                registro, ref = mapear_fila(tabla, fila, mapa_claves)
+                registros.append(registro)
+                refs.append(ref)
+            except ErrorValidacion as e:
+                rechazos.append({"fila": desde + i, "error": str(e), "datos": fila})
+        return registros, refs, rechazos
+
+    def confirmar(pendiente):
+        """Registrar un lote terminado y avanzar el checkpoint"""
+        nonlocal procesadas
+        futuro, refs, rechazos, desde, tamano = pendiente
+        resultado = futuro.result()
+
+        nuevos = {ref: id_fila for ref, id_fila in zip(refs, resultado["ids"])
+                  if ref is not None and id_fila is not None}
+        if nuevos:
+            mapa_tabla.update(nuevos)
+            archivo_mapa.write(json.dumps({"tabla": tabla, "ids": nuevos}) + "\n")
+            archivo_mapa.flush()
+            os.fsync(archivo_mapa.fileno())
+
+        for error in resultado["errores"]:
+            rechazos.append({"lote_desde_fila": desde, "cantidad": error["cantidad"], "error": error["error"]})
+        for rechazo in rechazos:
+            rechazados.write(json.dumps(rechazo, ensure_ascii=False, default=str) + "\n")
+        rechazados.flush()
+
+        insertadas = sum(1 for id_fila in resultado["ids"] if id_fila is not None)
+        checkpoint["filas_confirmadas"] += tamano
+        checkpoint["insertadas"] += insertadas
+        checkpoint["rechazadas"] += tamano - insertadas
+        guardar_json(ruta_checkpoint, checkpoint)
+
+        procesadas += tamano
+        transcurrido = time.perf_counter() - inicio
+        print(f"   📦 {checkpoint['filas_confirmadas']} filas | "
+              f"{procesadas / transcurrido:,.0f} filas/s")
+
+    filas = leer_filas(archivo)
+    for _ in range(saltar):
+        next(filas, None)
+
+    # Los lotes se envían en paralelo pero se confirman en orden de archivo,
+    # así el checkpoint siempre marca un prefijo completamente cargado
+    en_vuelo = deque()
+    desde = saltar
+    try:
+        with ThreadPoolExecutor(max_workers=hilos) as ejecutor:
+            for lote in en_lotes(filas, tamano_lote):
+                registros, refs, rechazos = preparar(lote, desde)
+                futuro = ejecutor.submit(db.insertar_lote, tabla, registros, len(registros) or 1)
+                en_vuelo.append((futuro, refs, rechazos, desde, len(lote)))
+                desde += len(lote)
+                # Como mucho 2 lotes por hilo en memoria a la vez
+                while len(en_vuelo) >= hilos * 2:
+                    confirmar(en_vuelo.popleft())
+            while en_vuelo:
+                confirmar(en_vuelo.popleft())
+    finally:
+        rechazados.close()
+        archivo_mapa.close()
+
+    transcurrido = time.perf_counter() - inicio
+    print(f"\n✅ Importación de {tabla} terminada en {transcurrido:.1f}s "
+          f"({procesadas / transcurrido if transcurrido else 0:,.0f} filas/s)")
+    print(f"   Insertadas: {checkpoint['insertadas']} | Rechazadas: {checkpoint['rechazadas']}")
+    return checkpoint
+
+def main():
+    parser = argparse.ArgumentParser(description="Importar datos de clínicas desde CSV/JSONL")
+    parser.add_argument("tabla", choices=sorted(COLUMNAS_IMPORTACION))
+    parser.add_argument("archivo")
+    parser.add_argument("--lote", type=int, default=TAMANO_LOTE, help="filas por inserción")
+    parser.add_argument("--hilos", type=int, default=4, help="lotes enviados en paralelo")
+    parser.add_argument("--checkpoint", help="ruta del checkpoint (por defecto <archivo>.checkpoint.json)")
+    parser.add_argument("--mapa", default="mapa_claves.jsonl", help="mapa de claves naturales a IDs")
+    args = parser.parse_args()
+
+    try:
+        importar(args.tabla, args.archivo, args.lote, args.hilos, args.checkpoint, args.mapa)
+    except (OSError, ValueError) as e:
+        print(f"❌ Error en la importación: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""Índice local de búsqueda por nombre para dueños y mascotas.
+
+Los nombres se normalizan (minúsculas y sin tildes: "Muñoz" -> "munoz") y se
+descomponen en trigramas por palabra, como pg_trgm. Cada trigrama apunta a
+los IDs que lo contienen, así una búsqueda solo mira los registros que
+comparten algún trigrama con el texto y tolera errores de tipeo ("Maks"
+encuentra "Max").
+
+El índice se carga de una sola pasada con los iteradores paginados de
+operaciones y después se mantiene con las escrituras hechas desde este
+proceso. Las escrituras que no traen la fila (db.actualizar, db.eliminar,
+cargas masivas) lo marcan como desactualizado y se recarga en la siguiente
+búsqueda; también se recarga cuando pasan INDICE_BUSQUEDA_TTL segundos
+(300 por defecto) para ver lo que escriben otros clientes.
+"""
+import os
+import time
+import threading
+import unicodedata
+from collections import defaultdict, Counter
+from dotenv import load_dotenv
+
+import modelos
+
+load_dotenv()
+
+TTL_INDICE = float(os.getenv("INDICE_BUSQUEDA_TTL", 300))
+
+# Fracción mínima de los trigramas del texto buscado que debe tener un nombre
+UMBRAL_SIMILITUD = 0.3
+
+def normalizar(texto):
+    """Minúsculas, sin tildes ni espacios repetidos"""
+    descompuesto = unicodedata.normalize("NFKD", texto or "")
+    sin_tildes = "".join(c for c in descompuesto if not unicodedata.combining(c))
+    return " ".join(sin_tildes.casefold().split())
+
+def trigramas(texto):
+    """Trigramas de cada palabra, con dos espacios delante y uno detrás"""
+    resultado = set()
+    for palabra in normalizar(texto).split():
+        relleno = f"  {palabra} "
+        resultado.update(relleno[i:i + 3] for i in range(len(relleno) - 2))
+    return resultado
+
+class IndiceNombres:
+    """Trigramas -> nombres -> IDs para una tabla con columna nombre.
+
+    Los trigramas apuntan a nombres normalizados distintos y cada nombre a
+    sus IDs: los nombres se repiten mucho ("Luna", "Max"), así una búsqueda
+    puntúa cada nombre una sola vez."""
+
+    def __init__(self, tabla, clave, cargar, ttl=TTL_INDICE):
+        self.tabla = tabla
+        self.clave = clave
+        self._cargar = cargar
+        self.ttl = ttl
+        self._bloqueo = threading.RLock()
+        self._filas = {}
+        self._nombres = {}
+        self._postings = defaultdict(set)
+        self._cargado_en = None
+
+    def __len__(self):
+        return len(self._filas)
+
+    @property
+    def vigente(self):
+        return self._cargado_en is not None and time.monotonic() - self._cargado_en < self.ttl
+
+    def calentar(self):
+        """Reconstruir el índice recorriendo la tabla página a página.
+
+        Se arma aparte y se reemplaza al final: mientras tanto las búsquedas
+        siguen usando el índice anterior."""
+        inicio = time.perf_counter()
+        filas, nombres, postings = {}, {}, defaultdict(set)
+        for fila in self._cargar():
+            self._indexar(fila, filas, nombres, postings)
+        with self._bloqueo:
+            self._filas, self._nombres, self._postings = filas, nombres, postings
+            self._cargado_en = time.monotonic()
+        print(f"🔎 Índice de {self.tabla}: {len(filas)} filas, {len(nombres)} nombres distintos "
+              f"en {(time.perf_counter() - inicio) * 1000:.0f} ms")
+
+    def _indexar(self, fila, filas, nombres, postings):
+        # Las filas agregadas o actualizadas a mano quedan del mismo tipo que las cargadas
+        fila = modelos.registro(self.tabla, fila)
+        id_valor = fila[self.clave]
+        nombre = normalizar(fila.get("nombre"))
+        filas[id_valor] = (fila, nombre)
+        if nombre not in nombres:
+            grams = trigramas(nombre)
+            nombres[nombre] = (grams, set())
+            for gram in grams:
+                postings[gram].add(nombre)
+        nombres[nombre][1].add(id_valor)
+
+    def desactualizar(self):
+        """Forzar la recarga en la próxima búsqueda"""
+        self._cargado_en = None
+
+    def agregar(self, fila):
+        """Agregar o reemplazar una fila"""
+        with self._bloqueo:
+            if self._cargado_en is None:
+                return
+            self._quitar(fila[self.clave])
+            self._indexar(fila, self._filas, self._nombres, self._postings)
+
+    def obtener(self, id_valor):
+        """Fila indexada con ese ID, o None"""
+        registro = self._filas.get(id_valor)
+        return registro[0] if registro else None
+
+    def actualizar(self, id_valor, cambios):
+        """Aplicar cambios a una fila ya indexada"""
+        with self._bloqueo:
+            if id_valor in self._filas:
+                self.agregar({**self._filas[id_valor][0], **cambios})
+
+    def quitar(self, id_valor):
+        with self._bloqueo:
+            self._quitar(id_valor)
+
+    def _quitar(self, id_valor):
+        anterior = self._filas.pop(id_valor, None)
+        if not anterior:
+            return
+        nombre = anterior[1]
+        grams, ids = self._nombres[nombre]
+        ids.discard(id_valor)
+        if not ids:
+            del self._nombres[nombre]
+            for gram in grams:
+                self._postings[gram].discard(nombre)
+                if not self._postings[gram]:
+                    del self._postings[gram]
+
+    def filas(self):
+        """Filas indexadas (para recorrerlas, por ejemplo al propagar cambios)"""
+        with self._bloqueo:
+            return [registro[0] for registro in self._filas.values()]
+
+    def buscar(self, texto, limite=20, umbral=UMBRAL_SIMILITUD):
+        """Filas ordenadas de mejor a peor coincidencia con texto"""
+        if not self.vigente:
+            self.calentar()
+        consulta = normalizar(texto)
+        grams = trigramas(consulta)
+        if not grams:
+            return []
+
+        with self._bloqueo:
+            coincidencias = Counter()
+            for gram in grams:
+                coincidencias.update(self._postings.get(gram, ()))
+
+            puntuados = []
+            for nombre, comunes in coincidencias.items():
+                cobertura = comunes / len(grams)
+                contiene = consulta in nombre
+                if cobertura < umbral and not contiene:
+                    continue
+                # Primero los que contienen el texto tal cual, luego por cobertura
+                # y, a igual cobertura, los nombres más parecidos en largo
+                grams_nombre = self._nombres[nombre][0]
+                similitud = comunes / (len(grams) + len(grams_nombre) - comunes)
+                puntuados.append((not contiene, -cobertura, -similitud, nombre))
+            puntuados.sort()
+
+            resultado = []
+            for *_, nombre in puntuados:
+                for id_valor in sorted(self._nombres[nombre][1]):
+                    resultado.append(modelos.copia(self._filas[id_valor][0]))
+                    if len(resultado) == limite:
+                        return resultado
+            return resultado
+
+# Índices registrados por tabla (operaciones los crea con su función de carga)
+INDICES = {}
+
+# Tablas cuyos nombres aparecen embebidos en las filas de otro índice
+EMBEBIDA_EN = {"dueno": ["mascota"]}
+
+def registrar(indice):
+    INDICES[indice.tabla] = indice
+    return indice
+
+def desactualizar(tabla):
+    """Marcar para recarga el índice de la tabla y los que la embeben"""
+    for nombre in [tabla] + EMBEBIDA_EN.get(tabla, []):
+        indice = INDICES.get(nombre)
+        if indice:
+            indice.desactualizar()
@@ -0,0 +1,281 @@
+"""Instrumentación de las peticiones hechas con el cliente de la base de datos.
+
+ConexionBD envuelve su cliente con ClienteInstrumentado, así toda petición de
+operaciones y de supabase_client pasa por aquí (y por la política de plazos,
+reintentos y cortacircuitos de resiliencia.py, y por coalescencia.py, que
+hace que lecturas idénticas simultáneas compartan una petición). Con la instrumentación activa
+(METRICAS=1 en .env, main.py --metricas o metricas.activar()) cada execute()
+genera un evento con tabla, operación, filtros, filas, bytes y milisegundos
+que se acumula por tabla y por acción del menú y se entrega a los hooks
+registrados con metricas.agregar_hook(). Los bytes son los del cuerpo de las
+respuestas HTTP recibidas (Content-Length, o el largo del cuerpo si no
+viene), reintentos incluidos; con el backend SQLite no hay HTTP y valen 0.
+
+Variables de .env:
+    METRICAS=1                  activar al iniciar
+    CONSULTA_LENTA_MS=300       imprimir las peticiones más lentas que el umbral
+    METRICAS_ARCHIVO=ruta.json  volcar los histogramas al salir (por defecto metricas.json)
+"""
+import os
+import json
+import time
+import atexit
+import threading
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+from resiliencia import politica
+from coalescencia import lecturas_en_vuelo, clave_de
+
+load_dotenv()
+
+# Límites superiores (ms) de los tramos del histograma de latencias
+TRAMOS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+OPERACIONES = {"select", "insert", "upsert", "update", "delete"}
+FILTROS = {"eq", "neq", "gt", "gte", "lt", "lte", "like", "ilike", "is_", "in_", "filter", "match"}
+
+def _nuevo_acumulado():
+    return {
+        "peticiones": 0,
+        "errores": 0,
+        "filas": 0,
+        "bytes": 0,
+        "total_ms": 0.0,
+        "max_ms": 0.0,
+        "histograma": [0] * (len(TRAMOS_MS) + 1)
+    }
+
+def _acumular(acumulado, evento):
+    acumulado["peticiones"] += 1
+    acumulado["errores"] += evento["error"] is not None
+    acumulado["filas"] += evento["filas"]
+    acumulado["bytes"] += evento["bytes"]
+    acumulado["total_ms"] += evento["ms"]
+    acumulado["max_ms"] = max(acumulado["max_ms"], evento["ms"])
+    tramo = next((i for i, limite in enumerate(TRAMOS_MS) if evento["ms"] <= limite), len(TRAMOS_MS))
+    acumulado["histograma"][tramo] += 1
+
+class RegistroMetricas:
+    """Acumula los eventos de cada petición por tabla/operación y por acción"""
+
+    def __init__(self):
+        self.activo = os.getenv("METRICAS") == "1"
+        umbral = os.getenv("CONSULTA_LENTA_MS")
+        self.umbral_lento_ms = float(umbral) if umbral else None
+        self.archivo = os.getenv("METRICAS_ARCHIVO", "metricas.json")
+        self._hooks = []
+        self._bloqueo = threading.Lock()
+        # El menú es de un solo usuario: la acción en curso es global y la
+        # heredan también los hilos que lance esa acción
+        self._accion = None
+        self._exportar_al_salir = False
+        self.reiniciar()
+        if self.activo:
+            self.activar()
+
+    def activar(self, archivo=None):
+        """Empezar a registrar eventos (y exportarlos al salir)"""
+        self.activo = True
+        if archivo:
+            self.archivo = archivo
+        if not self._exportar_al_salir:
+            atexit.register(self.exportar)
+            self._exportar_al_salir = True
+
+    def desactivar(self):
+        self.activo = False
+
+    def reiniciar(self):
+        with self._bloqueo:
+            self.por_consulta = {}
+            self.por_accion = {}
+
+    def agregar_hook(self, funcion):
+        """Registrar funcion(evento), llamada después de cada petición"""
+        self._hooks.append(funcion)
+
+    @contextmanager
+    def accion(self, nombre):
+        """Atribuir a nombre las peticiones hechas dentro del bloque"""
+        anterior, self._accion = self._accion, nombre
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._accion = anterior
+            if self.activo:
+                with self._bloqueo:
+                    totales = self.por_accion.setdefault(nombre, {"ejecuciones": 0, "pared_ms": 0.0})
+                    totales["ejecuciones"] += 1
+                    totales["pared_ms"] += (time.perf_counter() - inicio) * 1000
+
+    def registrar(self, evento):
+        evento["accion"] = self._accion
+        with self._bloqueo:
+            clave = f"{evento['operacion']} {evento['tabla']}"
+            _acumular(self.por_consulta.setdefault(clave, _nuevo_acumulado()), evento)
+            if self._accion:
+                totales = self.por_accion.setdefault(self._accion, {"ejecuciones": 0, "pared_ms": 0.0})
+                _acumular(totales.setdefault("consultas", _nuevo_acumulado()), evento)
+
+        if self.umbral_lento_ms is not None and evento["ms"] >= self.umbral_lento_ms:
+            filtros = " ".join(evento["filtros"])
+            print(f"🐢 Consulta lenta ({evento['ms']:.0f} ms): {evento['operacion']} {evento['tabla']} {filtros}")
+
+        for hook in self._hooks:
+            try:
+                hook(evento)
+            except Exception as e:
+                print(f"❌ Error en hook de métricas: {e}")
+
+    def resumen(self):
+        """Copia de los acumulados actuales"""
+        with self._bloqueo:
+            return {
+                "tramos_ms": list(TRAMOS_MS),
+                "por_consulta": json.loads(json.dumps(self.por_consulta)),
+                "por_accion": json.loads(json.dumps(self.por_accion))
+            }
+
+    def exportar(self, archivo=None):
+        """Guardar los histogramas en JSON"""
+        archivo = archivo or self.archivo
+        datos = self.resumen()
+        if not datos["por_consulta"]:
+            return None
+        try:
+            with open(archivo, "w", encoding="utf-8") as f:
+                json.dump(datos, f, ensure_ascii=False, indent=2)
+            print(f"📈 Métricas guardadas en {archivo}")
+            return archivo
+        except OSError as e:
+            print(f"❌ No se pudieron guardar las métricas: {e}")
+            return None
+
+    def imprimir_resumen(self):
+        """Totales por acción del menú"""
+        datos = self.resumen()
+        if not datos["por_accion"]:
+            print("No hay métricas registradas")
+            return
+        print(f"{'acción':32} {'veces':>6} {'req':>6} {'ms red':>10} {'ms total':>10} {'bytes':>11}")
+        for nombre, totales in datos["por_accion"].items():
+            consultas = totales.get("consultas", _nuevo_acumulado())
+            print(f"{nombre:32} {totales['ejecuciones']:6} {consultas['peticiones']:6} "
+                  f"{consultas['total_ms']:10.1f} {totales['pared_ms']:10.1f} {consultas['bytes']:11,}")
+
+metricas = RegistroMetricas()
+
+# Bytes recibidos por el hilo que hace cada intento (None si no está midiendo)
+_recibidos = threading.local()
+
+def _contar_bytes(respuesta):
+    """Hook de respuesta de httpx: sumar el tamaño del cuerpo al hilo que está midiendo"""
+    if getattr(_recibidos, "bytes", None) is None:
+        return
+    largo = respuesta.headers.get("content-length")
+    if largo is None:
+        # Respuesta chunked: se lee aquí y httpx ya no la vuelve a leer
+        respuesta.read()
+        largo = len(respuesta.content)
+    _recibidos.bytes += int(largo)
+
+def _medido(funcion, medidas):
+    """funcion() anotando en medidas los bytes recibidos en el hilo que la ejecute"""
+    def medir():
+        _recibidos.bytes = 0
+        try:
+            return funcion()
+        finally:
+            medidas.append(_recibidos.bytes)
+            _recibidos.bytes = None
+    return medir
+
+class ConsultaInstrumentada:
+    """Envuelve un constructor de peticiones y mide su execute()"""
+
+    def __init__(self, consulta, tabla):
+        self._consulta = consulta
+        self._tabla = tabla
+        self._operacion = "select"
+        self._filtros = []
+        self._compartida = False
+
+    def __getattr__(self, nombre):
+        atributo = getattr(self._consulta, nombre)
+        if not callable(atributo):
+            # Propiedades encadenables como not_
+            if hasattr(atributo, "execute"):
+                self._consulta = atributo
+                if nombre == "not_":
+                    self._filtros.append("not")
+                return self
+            return atributo
+
+        def encadenar(*args, **kwargs):
+            resultado = atributo(*args, **kwargs)
+            if nombre in OPERACIONES:
+                self._operacion = nombre
+            elif nombre in FILTROS:
+                self._filtros.append(f"{nombre}({', '.join(map(str, args))})")
+            if hasattr(resultado, "execute"):
+                self._consulta = resultado
+                return self
+            return resultado
+        return encadenar
+
+    def _ejecutar(self, medidas=None):
+        # Las lecturas se intentan en hilos de resiliencia: cada intento anota sus bytes en medidas
+        enviar = self._consulta.execute if medidas is None else _medido(self._consulta.execute, medidas)
+        respuesta, self._compartida = lecturas_en_vuelo.ejecutar(
+            clave_de(self._tabla, self._consulta), self._tabla,
+            lambda: politica.ejecutar(enviar, self._tabla, self._operacion))
+        return respuesta
+
+    def execute(self):
+        if not metricas.activo:
+            return self._ejecutar()
+
+        inicio = time.perf_counter()
+        error = None
+        respuesta = None
+        medidas = []
+        try:
+            respuesta = self._ejecutar(medidas)
+            return respuesta
+        except Exception as e:
+            error = str(e)
+            raise
+        finally:
+            # Una lectura que esperó la respuesta de otra igual no es una petición más
+            if not self._compartida:
+                datos = getattr(respuesta, "data", None)
+                metricas.registrar({
+                    "tabla": self._tabla,
+                    "operacion": self._operacion,
+                    "filtros": list(self._filtros),
+                    "filas": len(datos) if isinstance(datos, list) else int(datos is not None),
+                    "bytes": sum(medidas),
+                    "ms": (time.perf_counter() - inicio) * 1000,
+                    "error": error
+                })
+
+class ClienteInstrumentado:
+    """Cliente con la misma interfaz que el original cuyas peticiones se miden"""
+
+    def __init__(self, cliente):
+        self._cliente = cliente
+        # Los bytes se toman de las respuestas HTTP, sin volver a serializar las filas
+        sesion = getattr(getattr(cliente, "postgrest", None), "session", None)
+        if sesion is not None:
+            sesion.event_hooks["response"].append(_contar_bytes)
+
+    def table(self, tabla):
+        return ConsultaInstrumentada(self._cliente.table(tabla), tabla)
+
+    def from_(self, tabla):
+        return self.table(tabla)
+
+    def __getattr__(self, nombre):
+        return getattr(self._cliente, nombre)
@@ -1,5 +1,13 @@
-from supabase_client import test_conexion
+import os
+import sys
+from supabase_client import test_conexion, CLAVES_PRIMARIAS
 from operaciones import *
+from instrumentacion import metricas
+from resiliencia import BaseNoDisponible
+import diario
+import replica
+import analitica
+from precarga import segundo_plano
 
 def mostrar_menu():
     print("\n" + "="*50)
@@ -13,7 +21,8 @@ def mostrar_menu():
     print("6. Reporte de Historial Clínico")
     print("7. Ver Estadísticas")
     print("8. Listar Todos los Registros")
-    print("9. Salir")
+    print("9. Analítica")
+    print("10. Salir")
     print("="*50)
 
 def registrar_dueno_interactivo():
@@ -29,12 +38,62 @@ def registrar_dueno_interactivo():
     
     crear_dueno(nombre, direccion, telefono, email)
 
+def elegir_id_interactivo(tabla, titulo, formatear, opcional=False):
+    """Pedir un ID: se escribe directo o se busca por nombre, página a página"""
+    clave = CLAVES_PRIMARIAS[tabla]
+    omitir = "enter para omitir" if opcional else "enter para cancelar"
+    while True:
+        texto = input(f"\nID {titulo} (parte del nombre para buscar, * para ver todos, {omitir}): ").strip()
+        if not texto:
+            return None
+        if texto.lstrip("-").isdigit():
+            # Si está en la primera página precargada no hace falta preguntar
+            precargada = segundo_plano.ver(pagina_por_nombre, tabla)
+            if precargada and any(fila[clave] == int(texto) for fila in precargada[0]):
+                return int(texto)
+            # Un solo conteo con in.(id), sin descargar la tabla (los negativos son IDs temporales del diario)
+            encontrado = existe(tabla, int(texto))
+            if encontrado:
+                return int(texto)
+            if encontrado is None:
+                # El error ya se informó: el ID puede ser válido, solo no se pudo comprobar
+                print(f"No se pudo verificar el ID {titulo}; intente de nuevo")
+            else:
+                print(f"ID {titulo} no válido")
+            continue
+        
+        busqueda = "" if texto == "*" else texto
+        ultimo = None
+        while True:
+            if not busqueda and ultimo is None:
+                # La primera página de "ver todos" se precarga al elegir la opción del menú
+                filas, hay_mas = segundo_plano.tomar(pagina_por_nombre, tabla)
+            else:
+                filas, hay_mas = pagina_por_nombre(tabla, busqueda, despues_de=ultimo)
+            if not filas:
+                print("  No se encontraron coincidencias")
+                break
+            for fila in filas:
+                print(f"  {formatear(fila)}")
+            if not hay_mas or input("Enter para ver más, cualquier texto para terminar: ").strip():
+                break
+            ultimo = filas[-1][clave]
+
+def _formatear_dueno(d):
+    return f"ID: {d['id_dueno']} - {d['nombre']}"
+
+def _formatear_mascota(m):
+    dueño_nombre = m['dueno']['nombre'] if m['dueno'] else "N/A"
+    return f"ID: {m['id_mascota']} - {m['nombre']} (Dueño: {dueño_nombre})"
+
+def _formatear_veterinario(v):
+    return f"ID: {v['id_veterinario']} - {v['nombre']}"
+
 def registrar_mascota_interactivo():
     print("\n--- REGISTRAR NUEVA MASCOTA ---")
     
     # Verificar que hay dueños registrados
-    dueños = obtener_duenos()
-    if not dueños:
+    if not segundo_plano.tomar(hay_registros, "dueno"):
         print("No hay dueños registrados. Registra un dueño primero.")
         return
     
@@ -47,23 +106,12 @@ def registrar_mascota_interactivo():
     raza = input("Raza: ").strip() or None
     fecha_nacimiento = input("Fecha nacimiento (YYYY-MM-DD): ").strip() or None
     
-    # Mostrar dueños disponibles
-    print("\nDueños disponibles:")
-    for d in dueños:
-        print(f"  ID: {d['id_dueno']} - {d['nombre']}")
+    id_dueno = elegir_id_interactivo("dueno", "del dueño", _formatear_dueno)
+    if id_dueno is None:
+        print("Registro cancelado")
+        return
     
-    try:
-        id_dueno = int(input("\nID del dueño: ").strip())
-        
-        # Verificar que el dueño existe
-        dueño_existe = any(d['id_dueno'] == id_dueno for d in dueños)
-        if not dueño_existe:
-            print("ID de dueño no válido")
-            return
-            
-        crear_mascota(nombre, especie, raza, fecha_nacimiento, id_dueno)
-    except ValueError:
-        print("El ID debe ser un número")
+    crear_mascota(nombre, especie, raza, fecha_nacimiento, id_dueno)
 
 def registrar_veterinario_interactivo():
     print("\n--- REGISTRAR NUEVO VETERINARIO ---")
@@ -82,8 +130,7 @@ def registrar_consulta_interactivo():
     print("\n--- REGISTRAR CONSULTA MÉDICA ---")
     
     # Verificar que hay mascotas registradas
-    mascotas = obtener_mascotas()
-    if not mascotas:
+    if not segundo_plano.tomar(hay_registros, "mascota"):
         print("No hay mascotas registradas. Registra una mascota primero.")
         return
     
@@ -96,30 +143,15 @@ def registrar_consulta_interactivo():
     tratamiento = input("Tratamiento: ").strip() or None
     observaciones = input("Observaciones: ").strip() or None
     
-    # Mostrar mascotas disponibles
-    print("\nMascotas disponibles:")
-    for m in mascotas:
-        dueño_nombre = m['dueno']['nombre'] if m['dueno'] else "N/A"
-        print(f"  ID: {m['id_mascota']} - {m['nombre']} (Dueño: {dueño_nombre})")
+    id_mascota = elegir_id_interactivo("mascota", "de la mascota", _formatear_mascota)
+    if id_mascota is None:
+        print("Registro cancelado")
+        return
     
-    try:
-        id_mascota = int(input("\nID de la mascota: ").strip())
-        
-        # Verificar veterinarios disponibles
-        veterinarios = obtener_veterinarios()
-        id_veterinario = None
-        if veterinarios:
-            print("\nVeterinarios disponibles (opcional):")
-            for v in veterinarios:
-                print(f"  ID: {v['id_veterinario']} - {v['nombre']}")
-            
-            vet_input = input("ID del veterinario (enter para omitir): ").strip()
-            if vet_input:
-                id_veterinario = int(vet_input)
-        
-        crear_consulta(motivo, diagnostico, tratamiento, observaciones, id_mascota, id_veterinario)
-    except ValueError:
-        print("Los IDs deben ser números")
+    # El veterinario es opcional, pero si se indica debe existir
+    id_veterinario = elegir_id_interactivo("veterinario", "del veterinario", _formatear_veterinario, opcional=True)
+    
+    crear_consulta(motivo, diagnostico, tratamiento, observaciones, id_mascota, id_veterinario)
 
 def buscar_por_nombre_interactivo():
     print("\n--- BÚSQUEDA POR NOMBRE ---")
@@ -129,7 +161,8 @@ def buscar_por_nombre_interactivo():
         return
     
     print("\n🔍 BUSCANDO DUEÑOS...")
-    dueños = buscar_dueno_por_nombre(nombre)
+    segundo_plano.tomar(calentar_indices)
+    dueños = buscar_dueno_aproximado(nombre)
     if dueños:
         for d in dueños:
             print(f"{d['id_dueno']} | {d['nombre']} | {d['telefono']} | {d['email']}")
@@ -137,7 +170,7 @@ def buscar_por_nombre_interactivo():
         print("  No se encontraron dueños")
     
     print("\n🔍 BUSCANDO MASCOTAS...")
-    mascotas = buscar_mascota_por_nombre(nombre)
+    mascotas = buscar_mascota_aproximado(nombre)
     if mascotas:
         for m in mascotas:
             dueño_nombre = m['dueno']['nombre'] if m['dueno'] else "N/A"
@@ -148,53 +181,57 @@ def buscar_por_nombre_interactivo():
 def reporte_historial_interactivo():
     print("\n--- REPORTE DE HISTORIAL CLÍNICO ---")
     
-    mascotas = obtener_mascotas()
-    if not mascotas:
+    if not segundo_plano.tomar(hay_registros, "mascota"):
         print("No hay mascotas registradas")
         return
     
-    print("Mascotas disponibles:")
-    for m in mascotas:
-        dueño_nombre = m['dueno']['nombre'] if m['dueno'] else "N/A"
-        print(f"  ID: {m['id_mascota']} - {m['nombre']} (Dueño: {dueño_nombre})")
+    id_mascota = elegir_id_interactivo("mascota", "de la mascota", _formatear_mascota)
+    if id_mascota is None:
+        return
     
-    try:
-        id_mascota = int(input("\nID de la mascota: ").strip())
-        reporte = reporte_historial_completo(id_mascota)
+    reporte = reporte_historial_completo(id_mascota)
+    
+    if reporte:
+        mascota = reporte['mascota']
+        dueno = reporte['dueno']
+        consultas = reporte['consultas']
         
-        if reporte:
-            mascota = reporte['mascota']
-            dueno = reporte['dueno']
-            consultas = reporte['consultas']
-            
-            print(f"\nHISTORIAL CLÍNICO COMPLETO")
-            print(f"Mascota: {mascota['nombre']} (ID: {mascota['id_mascota']})")
-            print(f"Especie/Raza: {mascota['especie']} / {mascota['raza']}")
-            print(f"F. Nacimiento: {mascota['fecha_nacimiento']}")
-            print(f"Dueño: {dueno['nombre']} | {dueno['telefono']}")
-            
-            print(f"\nCONSULTAS REGISTRADAS: {len(consultas)}")
-            for i, c in enumerate(consultas, 1):
-                vet_nombre = c['veterinario']['nombre'] if c['veterinario'] else "No asignado"
-                print(f"\n  {i}. {c['fecha_consulta']} | {vet_nombre}")
-                print(f"      Motivo: {c['motivo']}")
-                print(f"      Diagnóstico: {c['diagnostico']}")
-                print(f"      Tratamiento: {c['tratamiento']}")
-                print(f"      Observaciones: {c['observaciones']}")
-        else:
-            print("No se pudo generar el reporte")
-    except ValueError:
-        print("El ID debe ser un número")
+        print(f"\nHISTORIAL CLÍNICO COMPLETO")
+        print(f"Mascota: {mascota['nombre']} (ID: {mascota['id_mascota']})")
+        print(f"Especie/Raza: {mascota['especie']} / {mascota['raza']}")
+        print(f"F. Nacimiento: {mascota['fecha_nacimiento']}")
+        print(f"Dueño: {dueno['nombre']} | {dueno['telefono']}")
+        
+        print(f"\nCONSULTAS REGISTRADAS: {len(consultas)}")
+        for i, c in enumerate(consultas, 1):
+            vet_nombre = c['veterinario']['nombre'] if c['veterinario'] else "No asignado"
+            print(f"\n  {i}. {c['fecha_consulta']} | {vet_nombre}")
+            print(f"      Motivo: {c['motivo']}")
+            print(f"      Diagnóstico: {c['diagnostico']}")
+            print(f"      Tratamiento: {c['tratamiento']}")
+            print(f"      Observaciones: {c['observaciones']}")
+    else:
+        print("No se pudo generar el reporte")
 
 def ver_estadisticas_interactivo():
     print("\n--- ESTADÍSTICAS DEL SISTEMA ---")
-    stats = estadisticas_veterinaria()
+    stats = estadisticas_veterinaria(agrupados=True)
     
     if stats:
         print(f"Total Dueños: {stats['total_dueños']}")
         print(f"Total Mascotas: {stats['total_mascotas']}")
         print(f"Total Veterinarios: {stats['total_veterinarios']}")
         print(f"Total Consultas: {stats['total_consultas']}")
+        
+        if stats['mascotas_por_especie']:
+            print("\nMascotas por especie:")
+            for especie, total in stats['mascotas_por_especie'].items():
+                print(f"  {especie}: {total}")
+        
+        if stats['consultas_por_veterinario']:
+            print("\nConsultas por veterinario:")
+            for v in stats['consultas_por_veterinario']:
+                print(f"  {v['id_veterinario']} | {v['nombre']}: {v['total_consultas']}")
     else:
         print("No se pudieron obtener las estadísticas")
 
@@ -207,62 +244,159 @@ def listar_registros_interactivo():
     
     opcion = input("Seleccione: ").strip()
     
-    if opcion == "1":
-        dueños = obtener_duenos()
-        print(f"\n DUEÑOS ({len(dueños)}):")
-        for d in dueños:
-            print(f"  🆔 {d['id_dueno']} | {d['nombre']} | {d['telefono']} | {d['email']}")
+    # Las filas se imprimen a medida que llega cada página
+    total = 0
+    try:
+        if opcion == "1":
+            print("\n DUEÑOS:")
+            for d in iterar_duenos(perfil="lista"):
+                print(f"  🆔 {d['id_dueno']} | {d['nombre']} | {d['telefono']} | {d['email']}")
+                total += 1
+        
+        elif opcion == "2":
+            print("\n MASCOTAS:")
+            for m in iterar_mascotas(perfil="lista"):
+                dueño_nombre = m['dueno']['nombre'] if m['dueno'] else "N/A"
+                print(f"  {m['id_mascota']} |  {m['nombre']} |  {m['especie']} |  Dueño: {dueño_nombre}")
+                total += 1
+        
+        elif opcion == "3":
+            print("\n VETERINARIOS:")
+            for v in iterar_veterinarios(perfil="lista"):
+                print(f"  {v['id_veterinario']} | {v['nombre']} | {v['especialidad']} | {v['telefono']}")
+                total += 1
+        
+        elif opcion == "4":
+            print("\n CONSULTAS:")
+            for c in iterar_todas_consultas(perfil="lista"):
+                mascota_nombre = c['mascota']['nombre'] if c['mascota'] else "N/A"
+                vet_nombre = c['veterinario']['nombre'] if c['veterinario'] else "No asignado"
+                print(f"   {c['id_consulta']} | {c['fecha_consulta']} | {mascota_nombre} | {vet_nombre}")
+                total += 1
+        else:
+            return
+    except BaseNoDisponible:
+        raise
+    except Exception as e:
+        print(f"Error listando registros: {e}")
     
-    elif opcion == "2":
-        mascotas = obtener_mascotas()
-        print(f"\n MASCOTAS ({len(mascotas)}):")
-        for m in mascotas:
-            dueño_nombre = m['dueno']['nombre'] if m['dueno'] else "N/A"
-            print(f"  {m['id_mascota']} |  {m['nombre']} |  {m['especie']} |  Dueño: {dueño_nombre}")
-    
-    elif opcion == "3":
-        veterinarios = obtener_veterinarios()
-        print(f"\n VETERINARIOS ({len(veterinarios)}):")
-        for v in veterinarios:
-            print(f"  {v['id_veterinario']} | {v['nombre']} | {v['especialidad']} | {v['telefono']}")
-    
-    elif opcion == "4":
-        consultas = obtener_todas_consultas()
-        print(f"\n CONSULTAS ({len(consultas)}):")
-        for c in consultas:
-            mascota_nombre = c['mascota']['nombre'] if c['mascota'] else "N/A"
-            vet_nombre = c['veterinario']['nombre'] if c['veterinario'] else "No asignado"
-            print(f"   {c['id_consulta']} | {c['fecha_consulta']} | {mascota_nombre} | {vet_nombre}")
+    print(f"\n Total listados: {total}")
+
+def analitica_interactivo():
+    print("\n--- ANALÍTICA DE LA CLÍNICA ---")
+    if not analitica.disponible():
+        print("La analítica necesita NumPy: pip install numpy")
+        return
+    try:
+        resumen = analitica.cargar().resumen()
+    except BaseNoDisponible:
+        raise
+    except Exception as e:
+        print(f"Error calculando la analítica: {e}")
+        return
+    
+    print(f"Consultas: {resumen['consultas']} | Mascotas: {resumen['mascotas']} | "
+          f"Veterinarios: {resumen['veterinarios']} (calculado en {resumen['calculo_ms']:.0f} ms)")
+    
+    print("\nConsultas por semana (últimas 12):")
+    for lunes, total in resumen['por_semana'][-12:]:
+        print(f"  {lunes} | {total}")
+    
+    print("\nConsultas por día (últimos 14 días con consultas):")
+    for dia, total in resumen['por_dia'][-14:]:
+        print(f"  {dia} | {total}")
+    
+    print("\nCarga por veterinario:")
+    for v in resumen['carga_veterinarios'][:10]:
+        ultima = v['ultima_consulta'][:10] if v['ultima_consulta'] else "-"
+        print(f"  {v['id_veterinario'] or '-'} | {v['nombre']}: {v['consultas']} consultas, {v['mascotas']} mascotas, "
+              f"{v['ultimos_30_dias']} en 30 días, última {ultima}")
+    
+    print("\nEspecies:")
+    for e in resumen['especies']:
+        print(f"  {e['especie']}: {e['mascotas']} mascotas ({e['pct_mascotas']}%) | "
+              f"{e['consultas']} consultas ({e['pct_consultas']}%)")
+    
+    intervalos = resumen['intervalos']
+    print("\nDías entre consultas de una misma mascota:")
+    if intervalos['intervalos']:
+        print(f"  Mediana: {intervalos['mediana_dias']} | P90: {intervalos['p90_dias']} | "
+              f"Promedio: {intervalos['promedio_dias']} ({intervalos['intervalos']} intervalos)")
+        for e in intervalos['por_especie']:
+            print(f"  {e['especie']}: mediana {e['mediana_dias']} días")
+    print(f"  Mascotas con una sola consulta: {intervalos['mascotas_con_una_consulta']}")
+    
+    print("\nDiagnósticos más frecuentes:")
+    for diagnostico, total in resumen['top_diagnosticos']:
+        print(f"  {diagnostico}: {total}")
+
+# Opciones del menú: (nombre para las métricas, función)
+ACCIONES_MENU = {
+    "1": ("Registrar Dueño", registrar_dueno_interactivo),
+    "2": ("Registrar Mascota", registrar_mascota_interactivo),
+    "3": ("Registrar Veterinario", registrar_veterinario_interactivo),
+    "4": ("Registrar Consulta Médica", registrar_consulta_interactivo),
+    "5": ("Buscar por Nombre", buscar_por_nombre_interactivo),
+    "6": ("Reporte de Historial Clínico", reporte_historial_interactivo),
+    "7": ("Ver Estadísticas", ver_estadisticas_interactivo),
+    "8": ("Listar Todos los Registros", listar_registros_interactivo),
+    "9": ("Analítica", analitica_interactivo)
+}
+
+def calentar_indices():
+    """Cargar los índices de búsqueda vencidos (uno tras otro, para no mezclar sus mensajes)"""
+    for indice in (indice_duenos, indice_mascotas):
+        if not indice.vigente:
+            indice.calentar()
+
+# Lecturas que cada opción va a necesitar: se lanzan al elegirla, mientras se completa el formulario
+PRECARGAS_MENU = {
+    "2": [(hay_registros, "dueno"), (pagina_por_nombre, "dueno")],
+    "4": [(hay_registros, "mascota"), (pagina_por_nombre, "mascota"), (pagina_por_nombre, "veterinario")],
+    "5": [(calentar_indices,)],
+    "6": [(hay_registros, "mascota"), (pagina_por_nombre, "mascota")]
+}
 
 def main():
+    # Inicio rápido (--rapido o INICIO_RAPIDO=1): una sola tabla en la verificación
+    rapido = "--rapido" in sys.argv or os.getenv("INICIO_RAPIDO") == "1"
+    if "--metricas" in sys.argv:
+        metricas.activar()
+    
     # Verificar conexión
-    if not test_conexion():
+    if not test_conexion(rapido=rapido):
         print("No se pudo conectar a la base de datos. Verifica tu conexión y credenciales.")
         return
     
     print("🎉 ¡Sistema de Gestión Veterinaria conectado correctamente!")
+    # Con DIARIO=1 se empieza a enviar lo que quedó pendiente de la sesión anterior
+    diario.obtener()
+    # Con REPLICA=1 los listados se leen de la réplica local (cada tabla se carga en su primer uso)
+    replica.obtener()
     
     while True:
         mostrar_menu()
-        opcion = input("Seleccione una opción (1-9): ").strip()
+        opcion = input("Seleccione una opción (1-10): ").strip()
         
-        if opcion == "1":
-            registrar_dueno_interactivo()
-        elif opcion == "2":
-            registrar_mascota_interactivo()
-        elif opcion == "3":
-            registrar_veterinario_interactivo()
-        elif opcion == "4":
-            registrar_consulta_interactivo()
-        elif opcion == "5":
-            buscar_por_nombre_interactivo()
-        elif opcion == "6":
-            reporte_historial_interactivo()
-        elif opcion == "7":
-            ver_estadisticas_interactivo()
-        elif opcion == "8":
-            listar_registros_interactivo()
-        elif opcion == "9":
+        if opcion in ACCIONES_MENU:
+            nombre, accion = ACCIONES_MENU[opcion]
+            # Las peticiones de la opción se suman a sus totales en las métricas
+            try:
+                with metricas.accion(nombre):
+                    for funcion, *args in PRECARGAS_MENU.get(opcion, ()):
+                        segundo_plano.lanzar(funcion, *args)
+                    accion()
+            except BaseNoDisponible as e:
+                # Distinto de "no hay registros": la base no respondió
+                print(f"\n⛔ No se pudo completar '{nombre}': {e}")
+            finally:
+                # Lo precargado y no usado no sirve para la próxima opción
+                segundo_plano.descartar()
+        elif opcion == "10":
+            if metricas.activo:
+                print("\n📈 MÉTRICAS DE LA SESIÓN")
+                metricas.imprimir_resumen()
+            segundo_plano.cerrar()
             print("\n ¡Gracias por usar el Sistema de Gestión Veterinaria!")
             break
         else:
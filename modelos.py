@@ -0,0 +1,191 @@
+"""Filas compactas con __slots__ para Dueno, Mascota, Veterinario y Consulta.
+
+PostgREST entrega cada fila como un dict, y los listados grandes (todas las
+consultas, la réplica local, la exportación) pasan la mayor parte de su
+memoria en el dict de cada fila y de cada relación embebida. Estas clases
+guardan las columnas conocidas en __slots__ (sin dict por instancia) y las
+desconocidas, si las hay, en un dict aparte.
+
+Se comportan como el dict que reemplazan: m['dueno']['nombre'], m.get(...),
+{**m}, dict(m), m.pop(...) y la comparación con dicts siguen funcionando, y
+además las columnas se leen como atributos (m.dueno.nombre). Una columna que
+la proyección no pidió no existe, igual que en el dict.
+
+Las páginas se convierten apenas llegan (convertir), así el dict de cada
+fila se libera enseguida. Los valores que se repiten mucho (especie, raza,
+especialidad, motivo y los nombres de mascotas y veterinarios, también los
+embebidos en cada consulta) se internan: todas las mascotas "Perro"
+comparten la misma cadena.
+
+Son opcionales: con MODELOS=1 en .env los listados devuelven registros; sin
+él (por defecto) convertir y registro devuelven los dicts de siempre. Un
+registro no es un dict (isinstance(fila, dict) es False) y json.dumps lo
+serializa solo con default=modelos.a_json:
+
+    json.dumps(operaciones.obtener_mascotas(), default=modelos.a_json)
+"""
+import os
+import sys
+from collections.abc import MutableMapping
+from dotenv import load_dotenv
+
+load_dotenv()
+
+ACTIVOS = os.getenv("MODELOS", "0") == "1"
+
+class Registro(MutableMapping):
+    """Fila de una tabla con las columnas en __slots__"""
+
+    __slots__ = ("_extra",)
+    # Columnas con slot propio, columnas que se internan y relaciones embebidas (nombre -> tabla)
+    CAMPOS = ()
+    INTERNADAS = frozenset()
+    EMBEBIDAS = {}
+
+    @classmethod
+    def desde_fila(cls, fila):
+        """Registro con las columnas de un dict de PostgREST (las relaciones también se convierten)"""
+        registro = cls.__new__(cls)
+        campos, internadas, embebidas = cls._CONJUNTO, cls.INTERNADAS, cls.EMBEBIDAS
+        for clave, valor in fila.items():
+            if clave in embebidas and valor is not None:
+                valor = _convertir_embebida(embebidas[clave], valor)
+            elif clave in internadas and type(valor) is str:
+                valor = sys.intern(valor)
+            if clave in campos:
+                object.__setattr__(registro, clave, valor)
+            else:
+                registro._extras()[clave] = valor
+        return registro
+
+    def _extras(self):
+        try:
+            return self._extra
+        except AttributeError:
+            self._extra = {}
+            return self._extra
+
+    def __getitem__(self, clave):
+        if clave in self._CONJUNTO:
+            try:
+                return getattr(self, clave)
+            except AttributeError:
+                raise KeyError(clave) from None
+        try:
+            return self._extra[clave]
+        except AttributeError:
+            raise KeyError(clave) from None
+
+    def __setitem__(self, clave, valor):
+        if clave in self.EMBEBIDAS and isinstance(valor, (dict, list)):
+            valor = _convertir_embebida(self.EMBEBIDAS[clave], valor)
+        elif clave in self.INTERNADAS and type(valor) is str:
+            valor = sys.intern(valor)
+        if clave in self._CONJUNTO:
+            object.__setattr__(self, clave, valor)
+        else:
+            self._extras()[clave] = valor
+
+    def __delitem__(self, clave):
+        if clave in self._CONJUNTO:
+            try:
+                object.__delattr__(self, clave)
+            except AttributeError:
+                raise KeyError(clave) from None
+            return
+        try:
+            del self._extra[clave]
+        except AttributeError:
+            raise KeyError(clave) from None
+
+    def __iter__(self):
+        for campo in self.CAMPOS:
+            if hasattr(self, campo):
+                yield campo
+        yield from getattr(self, "_extra", ())
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __contains__(self, clave):
+        if clave in self._CONJUNTO:
+            return hasattr(self, clave)
+        return clave in getattr(self, "_extra", ())
+
+    def __repr__(self):
+        return f"{type(self).__name__}({dict(self)!r})"
+
+    def a_dict(self):
+        """Copia como dicts anidados (para JSON o para quien necesite un dict de verdad)"""
+        return {clave: _a_dict(valor) for clave, valor in self.items()}
+
+    def __getstate__(self):
+        return dict(self)
+
+    def __setstate__(self, estado):
+        for clave, valor in estado.items():
+            self[clave] = valor
+
+class Dueno(Registro):
+    __slots__ = CAMPOS = ("id_dueno", "nombre", "direccion", "telefono", "email")
+
+class Veterinario(Registro):
+    __slots__ = CAMPOS = ("id_veterinario", "nombre", "especialidad", "telefono", "email")
+    INTERNADAS = frozenset({"nombre", "especialidad"})
+
+class Mascota(Registro):
+    __slots__ = CAMPOS = ("id_mascota", "nombre", "especie", "raza", "fecha_nacimiento", "id_dueno",
+                          "dueno", "consulta")
+    INTERNADAS = frozenset({"nombre", "especie", "raza"})
+    EMBEBIDAS = {"dueno": "dueno", "consulta": "consulta"}
+
+class Consulta(Registro):
+    __slots__ = CAMPOS = ("id_consulta", "fecha_consulta", "motivo", "diagnostico", "tratamiento",
+                          "observaciones", "id_mascota", "id_veterinario", "mascota", "veterinario")
+    INTERNADAS = frozenset({"motivo"})
+    EMBEBIDAS = {"mascota": "mascota", "veterinario": "veterinario"}
+
+for _clase in (Dueno, Veterinario, Mascota, Consulta):
+    _clase._CONJUNTO = frozenset(_clase.CAMPOS)
+
+# Clase de cada tabla
+CLASES = {"dueno": Dueno, "mascota": Mascota, "veterinario": Veterinario, "consulta": Consulta}
+
+def _convertir_embebida(tabla, valor):
+    clase = CLASES[tabla]
+    if isinstance(valor, list):
+        return [clase.desde_fila(fila) if isinstance(fila, dict) else fila for fila in valor]
+    return clase.desde_fila(valor) if isinstance(valor, dict) else valor
+
+def _a_dict(valor):
+    if isinstance(valor, Registro):
+        return valor.a_dict()
+    if isinstance(valor, list):
+        return [_a_dict(v) for v in valor]
+    return valor
+
+def convertir(tabla, filas):
+    """Lista de registros a partir de una página de PostgREST (la misma lista con MODELOS=0)"""
+    clase = CLASES.get(tabla)
+    if not ACTIVOS or clase is None:
+        return filas
+    return [clase.desde_fila(fila) for fila in filas]
+
+def registro(tabla, fila):
+    """Un registro a partir de un dict (el mismo dict con MODELOS=0 o si ya es un registro)"""
+    clase = CLASES.get(tabla)
+    if not ACTIVOS or clase is None or isinstance(fila, Registro):
+        return fila
+    return clase.desde_fila(fila)
+
+def copia(fila):
+    """Copia de una fila del mismo tipo (las relaciones embebidas se comparten)"""
+    if isinstance(fila, Registro):
+        return type(fila).desde_fila(fila)
+    return dict(fila)
+
+def a_json(valor):
+    """default= para json.dumps: registros como dicts, el resto como texto"""
+    if isinstance(valor, Registro):
+        return dict(valor)
+    return str(valor)
@@ -1,5 +1,101 @@
-from supabase_client import supabase
+from supabase_client import supabase, db, CLAVES_PRIMARIAS, OBLIGATORIAS, proyeccion, TAMANO_LOTE, en_lotes
+from cache import cache_lecturas
+from indice_busqueda import IndiceNombres, registrar
+from resiliencia import BaseNoDisponible
+import diario
+import replica
+import modelos
 from datetime import datetime
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+# Filas por página en los recorridos keyset. Debe ser menor o igual al
+# max-rows del servidor: una página incompleta indica el final de la tabla.
+TAMANO_PAGINA = 500
+
+# Columnas que se envían al insertar en cada tabla
+COLUMNAS = {
+    "dueno": ("nombre", "direccion", "telefono", "email"),
+    "mascota": ("nombre", "especie", "raza", "fecha_nacimiento", "id_dueno"),
+    "veterinario": ("nombre", "especialidad", "telefono", "email"),
+    "consulta": ("motivo", "diagnostico", "tratamiento", "observaciones", "id_mascota", "id_veterinario")
+}
+
+# ========== PAGINACIÓN KEYSET ==========
+def _paginar(tabla, campos, filtrar=None, tamano_pagina=TAMANO_PAGINA):
+    """Recorrer una tabla por clave primaria, entregando filas página a página"""
+    clave = CLAVES_PRIMARIAS[tabla]
+    ultimo = None
+    while True:
+        consulta = supabase.table(tabla).select(campos)
+        if filtrar:
+            consulta = filtrar(consulta)
+        if ultimo is not None:
+            consulta = consulta.gt(clave, ultimo)
+        filas = consulta.order(clave).limit(tamano_pagina).execute().data
+        yield from modelos.convertir(tabla, filas)
+        if len(filas) < tamano_pagina:
+            return
+        ultimo = filas[-1][clave]
+
+def _despues_de_consulta(consulta, ultima):
+    """Filtrar las consultas que siguen a ultima en el orden fecha_consulta DESC, id_consulta DESC"""
+    fecha, id_consulta = ultima['fecha_consulta'], ultima['id_consulta']
+    # or=(fecha_consulta.lt.X,and(fecha_consulta.eq.X,id_consulta.lt.Y)): tamaño fijo sin importar
+    # cuántas consultas compartan fecha. postgrest-py 0.13 no trae or_(); filter("or", ...) arma
+    # el parámetro or=<operador>.<criterio> tal cual
+    condicion = f'(fecha_consulta.lt."{fecha}",and(fecha_consulta.eq."{fecha}",id_consulta.lt.{id_consulta}))'
+    operador, _, criterio = condicion.partition(".")
+    return consulta.filter("or", operador, criterio)
+
+def _paginar_consultas(campos, filtrar=None, tamano_pagina=TAMANO_PAGINA):
+    """Recorrer consultas de la más reciente a la más antigua (keyset sobre fecha_consulta e id_consulta)"""
+    ultima = None
+    while True:
+        consulta = supabase.table("consulta").select(campos)
+        if filtrar:
+            consulta = filtrar(consulta)
+        if ultima is not None:
+            consulta = _despues_de_consulta(consulta, ultima)
+        filas = (consulta.order("fecha_consulta", desc=True)
+                 .order("id_consulta", desc=True)
+                 .limit(tamano_pagina).execute().data)
+        yield from modelos.convertir("consulta", filas)
+        if len(filas) < tamano_pagina:
+            return
+        ultima = filas[-1]
+
+# ========== DIARIO LOCAL ==========
+def _registrar_en_diario(tabla, datos, descripcion):
+    """Guardar el alta en el diario local (DIARIO=1); devuelve su ID temporal o None sin diario"""
+    local = diario.obtener()
+    if local is None:
+        return None
+    id_temporal = local.registrar(tabla, datos)
+    print(f"📒 {descripcion}: ID temporal {id_temporal} (se enviará en segundo plano)")
+    return id_temporal
+
+def _resolver_ids(tabla, ids):
+    """{id: id del servidor} sin los temporales pendientes (se avisa cuántos quedaron fuera)"""
+    resueltos = {}
+    pendientes = []
+    for id_valor in ids:
+        try:
+            resueltos[id_valor] = diario.resolver_id(tabla, id_valor)
+        except diario.IDPendiente:
+            pendientes.append(id_valor)
+    if pendientes:
+        print(f"⚠️ {len(pendientes)} IDs temporales de {tabla} todavía no se enviaron al servidor: {pendientes}")
+    return resueltos
+
+# ========== RÉPLICA LOCAL ==========
+def _leer_replica(tabla, perfil, igual=None, contiene=None):
+    """Filas desde la réplica local (REPLICA=1), o None sin réplica"""
+    local = replica.obtener()
+    if local is None:
+        return None
+    campos = proyeccion(tabla, perfil) if perfil else "*"
+    return local.consultar(tabla, campos, igual=igual, contiene=contiene)
 
 # ========== OPERACIONES PARA DUEÑOS ==========
 def crear_dueno(nombre, direccion, telefono, email):
@@ -11,29 +107,54 @@ def crear_dueno(nombre, direccion, telefono, email):
             "telefono": telefono,
             "email": email
         }
+        id_temporal = _registrar_en_diario("dueno", datos, f"Dueño '{nombre}'")
+        if id_temporal is not None:
+            indice_duenos.agregar({**datos, "id_dueno": id_temporal})
+            return id_temporal
         resultado = supabase.table("dueno").insert(datos).execute()
         if resultado.data:
+            cache_lecturas.invalidar("dueno", resultado.data[0])
+            indice_duenos.agregar(resultado.data[0])
             print(f"✅ Dueño '{nombre}' creado con ID: {resultado.data[0]['id_dueno']}")
             return resultado.data[0]['id_dueno']
         return None
+    except BaseNoDisponible:
+        raise
     except Exception as e:
         print(f"Error creando dueño: {e}")
         return None
 
-def obtener_duenos():
+def iterar_duenos(tamano_pagina=TAMANO_PAGINA, perfil="detalle"):
+    """Recorrer todos los dueños página a página"""
+    return _paginar("dueno", proyeccion("dueno", perfil), tamano_pagina=tamano_pagina)
+
+def obtener_duenos(perfil="detalle"):
     """Obtener todos los dueños"""
     try:
-        resultado = supabase.table("dueno").select("*").order("id_dueno").execute()
-        return resultado.data
+        filas = _leer_replica("dueno", perfil)
+        if filas is not None:
+            return filas
+        return cache_lecturas.leer(("duenos", perfil), [("dueno", None)], lambda: list(iterar_duenos(perfil=perfil)))
+    except BaseNoDisponible:
+        raise
     except Exception as e:
         print(f"Error obteniendo dueños: {e}")
         return []
 
-def buscar_dueno_por_nombre(nombre):
+def iterar_busqueda_dueno(nombre, tamano_pagina=TAMANO_PAGINA, perfil="detalle"):
+    """Recorrer los dueños cuyo nombre coincide, página a página"""
+    return _paginar("dueno", proyeccion("dueno", perfil), lambda c: c.ilike("nombre", f"%{nombre}%"), tamano_pagina)
+
+def buscar_dueno_por_nombre(nombre, perfil="detalle"):
     """Buscar dueños por nombre"""
     try:
-        resultado = supabase.table("dueno").select("*").ilike("nombre", f"%{nombre}%").execute()
-        return resultado.data
+        filas = _leer_replica("dueno", perfil, contiene=nombre)
+        if filas is not None:
+            return filas
+        return cache_lecturas.leer(("buscar_dueno", nombre, perfil), [("dueno", None)],
+                                   lambda: list(iterar_busqueda_dueno(nombre, perfil=perfil)), parametrizada=True)
+    except BaseNoDisponible:
+        raise
     except Exception as e:
         print(f"Error buscando dueño: {e}")
         return []
@@ -41,10 +162,15 @@ def buscar_dueno_por_nombre(nombre):
 def actualizar_dueno(id_dueno, nuevos_datos):
     """Actualizar dueño"""
     try:
+        id_dueno = diario.resolver_id("dueno", id_dueno)
         resultado = supabase.table("dueno").update(nuevos_datos).eq("id_dueno", id_dueno).execute()
+        cache_lecturas.invalidar("dueno", {"id_dueno": id_dueno})
+        _actualizar_indices_dueno(id_dueno, nuevos_datos)
         if resultado.data:
             print(f"✅ Dueño ID {id_dueno} actualizado")
         return resultado.data
+    except BaseNoDisponible:
+        raise
     except Exception as e:
         print(f"Error actualizando dueño: {e}")
         return None
@@ -60,38 +186,77 @@ def crear_mascota(nombre, especie, raza, fecha_nacimiento, id_dueno):
             "fecha_nacimiento": fecha_nacimiento,
             "id_dueno": id_dueno
         }
+        id_temporal = _registrar_en_diario("mascota", datos, f"Mascota '{nombre}'")
+        if id_temporal is not None:
+            _indexar_mascota_nueva({**datos, "id_mascota": id_temporal})
+            return id_temporal
         resultado = supabase.table("mascota").insert(datos).execute()
         if resultado.data:
+            cache_lecturas.invalidar("mascota", resultado.data[0])
+            _indexar_mascota_nueva(resultado.data[0])
             print(f"Mascota '{nombre}' creada con ID: {resultado.data[0]['id_mascota']}")
             return resultado.data[0]['id_mascota']
         return None
+    except BaseNoDisponible:
+        raise
     except Exception as e:
         print(f"Error creando mascota: {e}")
         return None
 
-def obtener_mascotas():
+def iterar_mascotas(tamano_pagina=TAMANO_PAGINA, perfil="detalle"):
+    """Recorrer todas las mascotas con info del dueño, página a página"""
+    return _paginar("mascota", proyeccion("mascota", perfil), tamano_pagina=tamano_pagina)
+
+def obtener_mascotas(perfil="detalle"):
     """Obtener todas las mascotas con info del dueño"""
     try:
-        resultado = supabase.table("mascota").select("*, dueno(nombre, telefono)").order("id_mascota").execute()
-        return resultado.data
+        filas = _leer_replica("mascota", perfil)
+        if filas is not None:
+            return filas
+        return cache_lecturas.leer(("mascotas", perfil), [("mascota", None), ("dueno", None)],
+                                   lambda: list(iterar_mascotas(perfil=perfil)))
+    except BaseNoDisponible:
+        raise
     except Exception as e:
         print(f"Error obteniendo mascotas: {e}")
         return []
 
-def obtener_mascotas_por_dueno(id_dueno):
+def iterar_mascotas_por_dueno(id_dueno, tamano_pagina=TAMANO_PAGINA, perfil=None):
+    """Recorrer las mascotas de un dueño, página a página (sin perfil, solo las columnas de mascota)"""
+    id_dueno = diario.resolver_id("dueno", id_dueno)
+    campos = proyeccion("mascota", perfil) if perfil else "*"
+    return _paginar("mascota", campos, lambda c: c.eq("id_dueno", id_dueno), tamano_pagina)
+
+def obtener_mascotas_por_dueno(id_dueno, perfil=None):
     """Obtener mascotas de un dueño específico"""
     try:
-        resultado = supabase.table("mascota").select("*").eq("id_dueno", id_dueno).execute()
-        return resultado.data
+        id_dueno = diario.resolver_id("dueno", id_dueno)
+        filas = _leer_replica("mascota", perfil, igual=("id_dueno", id_dueno))
+        if filas is not None:
+            return filas
+        dependencias = [("mascota", ("id_dueno", id_dueno))] + ([("dueno", None)] if perfil else [])
+        return cache_lecturas.leer(("mascotas_por_dueno", id_dueno, perfil), dependencias,
+                                   lambda: list(iterar_mascotas_por_dueno(id_dueno, perfil=perfil)), parametrizada=True)
+    except BaseNoDisponible:
+        raise
     except Exception as e:
         print(f"Error obteniendo mascotas del dueño: {e}")
         return []
 
-def buscar_mascota_por_nombre(nombre):
+def iterar_busqueda_mascota(nombre, tamano_pagina=TAMANO_PAGINA, perfil="detalle"):
+    """Recorrer las mascotas cuyo nombre coincide, página a página"""
+    return _paginar("mascota", proyeccion("mascota", perfil), lambda c: c.ilike("nombre", f"%{nombre}%"), tamano_pagina)
+
+def buscar_mascota_por_nombre(nombre, perfil="detalle"):
     """Buscar mascotas por nombre"""
     try:
-        resultado = supabase.table("mascota").select("*, dueno(nombre, telefono)").ilike("nombre", f"%{nombre}%").execute()
-        return resultado.data
+        filas = _leer_replica("mascota", perfil, contiene=nombre)
+        if filas is not None:
+            return filas
+        return cache_lecturas.leer(("buscar_mascota", nombre, perfil), [("mascota", None), ("dueno", None)],
+                                   lambda: list(iterar_busqueda_mascota(nombre, perfil=perfil)), parametrizada=True)
+    except BaseNoDisponible:
+        raise
     except Exception as e:
         print(f"Error buscando mascota: {e}")
         return []
@@ -106,20 +271,35 @@ def crear_veterinario(nombre, especialidad, telefono, email):
             "telefono": telefono,
             "email": email
         }
+        id_temporal = _registrar_en_diario("veterinario", datos, f"Veterinario '{nombre}'")
+        if id_temporal is not None:
+            return id_temporal
         resultado = supabase.table("veterinario").insert(datos).execute()
         if resultado.data:
+            cache_lecturas.invalidar("veterinario", resultado.data[0])
             print(f"Veterinario '{nombre}' creado con ID: {resultado.data[0]['id_veterinario']}")
             return resultado.data[0]['id_veterinario']
         return None
+    except BaseNoDisponible:
+        raise
     except Exception as e:
         print(f"Error creando veterinario: {e}")
         return None
 
-def obtener_veterinarios():
+def iterar_veterinarios(tamano_pagina=TAMANO_PAGINA, perfil="detalle"):
+    """Recorrer todos los veterinarios página a página"""
+    return _paginar("veterinario", proyeccion("veterinario", perfil), tamano_pagina=tamano_pagina)
+
+def obtener_veterinarios(perfil="detalle"):
     """Obtener todos los veterinarios"""
     try:
-        resultado = supabase.table("veterinario").select("*").order("id_veterinario").execute()
-        return resultado.data
+        filas = _leer_replica("veterinario", perfil)
+        if filas is not None:
+            return filas
+        return cache_lecturas.leer(("veterinarios", perfil), [("veterinario", None)],
+                                   lambda: list(iterar_veterinarios(perfil=perfil)))
+    except BaseNoDisponible:
+        raise
     except Exception as e:
         print(f"Error obteniendo veterinarios: {e}")
         return []
@@ -136,82 +316,390 @@ def crear_consulta(motivo, diagnostico, tratamiento, observaciones, id_mascota,
             "id_mascota": id_mascota,
             "id_veterinario": id_veterinario
         }
+        id_temporal = _registrar_en_diario("consulta", datos, "Consulta")
+        if id_temporal is not None:
+            return id_temporal
         resultado = supabase.table("consulta").insert(datos).execute()
         if resultado.data:
+            cache_lecturas.invalidar("consulta", resultado.data[0])
             print(f"✅ Consulta creada con ID: {resultado.data[0]['id_consulta']}")
             return resultado.data[0]['id_consulta']
         return None
+    except BaseNoDisponible:
+        raise
     except Exception as e:
         print(f"Error creando consulta: {e}")
         return None
 
-def obtener_consultas_por_mascota(id_mascota):
+def iterar_consultas_por_mascota(id_mascota, tamano_pagina=TAMANO_PAGINA, perfil="reporte"):
+    """Recorrer el historial de una mascota, de la consulta más reciente a la más antigua"""
+    id_mascota = diario.resolver_id("mascota", id_mascota)
+    return _paginar_consultas(proyeccion("consulta", perfil), lambda c: c.eq("id_mascota", id_mascota), tamano_pagina)
+
+def obtener_consultas_por_mascota(id_mascota, perfil="reporte"):
     """Obtener historial de consultas de una mascota"""
     try:
-        resultado = supabase.table("consulta").select("*, veterinario(nombre, especialidad)").eq("id_mascota", id_mascota).order("fecha_consulta", desc=True).execute()
-        return resultado.data
+        id_mascota = diario.resolver_id("mascota", id_mascota)
+        filas = _leer_replica("consulta", perfil, igual=("id_mascota", id_mascota))
+        if filas is not None:
+            return filas
+        return cache_lecturas.leer(("consultas_por_mascota", id_mascota, perfil),
+                                   [("consulta", ("id_mascota", id_mascota)), ("mascota", None), ("veterinario", None)],
+                                   lambda: list(iterar_consultas_por_mascota(id_mascota, perfil=perfil)), parametrizada=True)
+    except BaseNoDisponible:
+        raise
     except Exception as e:
         print(f"Error obteniendo consultas: {e}")
         return []
 
-def obtener_todas_consultas():
+def iterar_todas_consultas(tamano_pagina=TAMANO_PAGINA, perfil="detalle"):
+    """Recorrer todas las consultas con información relacionada, página a página"""
+    return _paginar_consultas(proyeccion("consulta", perfil), tamano_pagina=tamano_pagina)
+
+def obtener_todas_consultas(perfil="detalle"):
     """Obtener todas las consultas con información relacionada"""
     try:
-        resultado = supabase.table("consulta").select("*, mascota(nombre, especie), veterinario(nombre)").order("fecha_consulta", desc=True).execute()
-        return resultado.data
+        filas = _leer_replica("consulta", perfil)
+        if filas is not None:
+            return filas
+        return cache_lecturas.leer(("consultas", perfil), [("consulta", None), ("mascota", None), ("veterinario", None)],
+                                   lambda: list(iterar_todas_consultas(perfil=perfil)))
+    except BaseNoDisponible:
+        raise
     except Exception as e:
         print(f"Error obteniendo consultas: {e}")
         return []
 
+# ========== BÚSQUEDA LOCAL POR NOMBRE ==========
+# Índices de trigramas en memoria (ver indice_busqueda.py). Se cargan con la
+# primera búsqueda y se mantienen con crear_* y actualizar_dueno (también los de
+# operaciones_async).
+indice_duenos = registrar(IndiceNombres("dueno", "id_dueno", lambda: iterar_duenos(perfil="lista")))
+indice_mascotas = registrar(IndiceNombres("mascota", "id_mascota", lambda: iterar_mascotas(perfil="lista")))
+
+def _indexar_mascota_nueva(fila):
+    """Agregar una mascota recién creada con el nombre de su dueño"""
+    dueno = indice_duenos.obtener(fila['id_dueno'])
+    if dueno is None:
+        # Sin el dueño a mano no se puede armar la fila: se recarga después
+        indice_mascotas.desactualizar()
+        return
+    indice_mascotas.agregar({**fila, "dueno": {"nombre": dueno['nombre']}})
+
+def _actualizar_indices_dueno(id_dueno, nuevos_datos):
+    indice_duenos.actualizar(id_dueno, nuevos_datos)
+    if "nombre" in nuevos_datos:
+        for mascota in indice_mascotas.filas():
+            if mascota.get('id_dueno') == id_dueno:
+                indice_mascotas.actualizar(mascota['id_mascota'], {"dueno": {"nombre": nuevos_datos['nombre']}})
+
+def buscar_dueno_aproximado(nombre, limite=20):
+    """Buscar dueños en el índice local, tolerando tildes y errores de tipeo"""
+    try:
+        return indice_duenos.buscar(nombre, limite)
+    except BaseNoDisponible:
+        raise
+    except Exception as e:
+        print(f"Error en el índice de dueños, se busca en el servidor: {e}")
+        return buscar_dueno_por_nombre(nombre, perfil="lista")
+
+def buscar_mascota_aproximado(nombre, limite=20):
+    """Buscar mascotas en el índice local, tolerando tildes y errores de tipeo"""
+    try:
+        return indice_mascotas.buscar(nombre, limite)
+    except BaseNoDisponible:
+        raise
+    except Exception as e:
+        print(f"Error en el índice de mascotas, se busca en el servidor: {e}")
+        return buscar_mascota_por_nombre(nombre, perfil="lista")
+
+# ========== VALIDACIÓN Y SELECTORES ==========
+# Filas por página en los selectores interactivos
+TAMANO_SELECTOR = 20
+
+def ids_faltantes(tabla, ids):
+    """IDs que no existen en la tabla. Una petición por cada TAMANO_PAGINA IDs.
+
+    Primero se cuenta con in.(...) sin descargar filas; solo si faltan
+    se piden las claves para saber cuáles. Devuelve None si no se pudo
+    verificar (un error distinto de BaseNoDisponible): no es lo mismo que
+    una lista de faltantes."""
+    clave = CLAVES_PRIMARIAS[tabla]
+    # Los IDs temporales (negativos) del diario local se validan contra el diario
+    local = diario.obtener()
+    temporales = {i for i in ids if isinstance(i, int) and i < 0}
+    faltantes = [i for i in sorted(temporales) if not (local and local.conoce(tabla, i))]
+    try:
+        for lote in en_lotes(sorted(set(ids) - temporales), TAMANO_PAGINA):
+            resultado = supabase.table(tabla).select(clave, count="exact").in_(clave, lote).limit(0).execute()
+            if (resultado.count or 0) == len(lote):
+                continue
+            encontrados = supabase.table(tabla).select(clave).in_(clave, lote).execute().data
+            existentes = {fila[clave] for fila in encontrados}
+            faltantes.extend(i for i in lote if i not in existentes)
+        return faltantes
+    except BaseNoDisponible:
+        raise
+    except Exception as e:
+        print(f"Error validando IDs de {tabla}: {e}")
+        return None
+
+def validar_ids(tabla, ids):
+    """True si todos los IDs existen en la tabla, False si falta alguno y None si no se pudo verificar"""
+    faltantes = ids_faltantes(tabla, ids)
+    if faltantes is None:
+        return None
+    return not faltantes
+
+def existe(tabla, id_valor):
+    """True si existe el registro con esa clave primaria, False si no y None si no se pudo verificar"""
+    return validar_ids(tabla, [id_valor])
+
+def hay_registros(tabla):
+    """True si la tabla tiene al menos una fila (sin contar toda la tabla)"""
+    try:
+        local = diario.obtener()
+        if local and local.pendientes(tabla):
+            return True
+        clave = CLAVES_PRIMARIAS[tabla]
+        return bool(supabase.table(tabla).select(clave).limit(1).execute().data)
+    except BaseNoDisponible:
+        raise
+    except Exception as e:
+        print(f"Error consultando {tabla}: {e}")
+        return False
+
+def pagina_por_nombre(tabla, texto="", despues_de=None, tamano=TAMANO_SELECTOR, perfil="selector"):
+    """Una página de registros cuyo nombre contiene texto, en orden de ID.
+
+    Devuelve (filas, hay_mas); la página siguiente se pide con
+    despues_de = último ID de la anterior."""
+    clave = CLAVES_PRIMARIAS[tabla]
+    try:
+        consulta = supabase.table(tabla).select(proyeccion(tabla, perfil))
+        if texto:
+            consulta = consulta.ilike("nombre", f"%{texto}%")
+        if despues_de is not None:
+            consulta = consulta.gt(clave, despues_de)
+        # Una fila extra indica si hay más páginas
+        filas = consulta.order(clave).limit(tamano + 1).execute().data
+        return modelos.convertir(tabla, filas[:tamano]), len(filas) > tamano
+    except BaseNoDisponible:
+        raise
+    except Exception as e:
+        print(f"Error listando {tabla}: {e}")
+        return [], False
+
+# ========== CARGA MASIVA ==========
+def _crear_lote(tabla, registros, tamano_lote):
+    """Validar y enviar registros en inserciones multi-fila, lote a lote"""
+    columnas = COLUMNAS[tabla]
+    obligatorias = OBLIGATORIAS[tabla]
+    resultado = {"ids": [], "errores": []}
+    inicio = 0
+    
+    for numero, lote in enumerate(en_lotes(registros, tamano_lote)):
+        ids = [None] * len(lote)
+        validos, posiciones = [], []
+        for i, registro in enumerate(lote):
+            faltantes = [c for c in obligatorias if registro.get(c) in (None, "")]
+            if faltantes:
+                resultado["errores"].append({
+                    "registro": inicio + i,
+                    "error": f"Faltan campos obligatorios: {', '.join(faltantes)}"
+                })
+                continue
+            # Todas las filas de un lote deben llevar las mismas columnas
+            validos.append({c: registro.get(c) for c in columnas})
+            posiciones.append(i)
+        
+        if validos:
+            insercion = db.insertar_lote(tabla, validos, tamano_lote=len(validos))
+            for posicion, id_fila in zip(posiciones, insercion["ids"]):
+                ids[posicion] = id_fila
+            for error in insercion["errores"]:
+                resultado["errores"].append({**error, "lote": numero, "desde": inicio})
+        
+        resultado["ids"].extend(ids)
+        inicio += len(lote)
+    
+    insertados = sum(1 for id_fila in resultado["ids"] if id_fila is not None)
+    print(f"✅ {insertados}/{inicio} registros insertados en {tabla} ({len(resultado['errores'])} errores)")
+    return resultado
+
+def crear_duenos_lote(registros, tamano_lote=TAMANO_LOTE):
+    """Crear dueños en lotes a partir de diccionarios con los campos de crear_dueno"""
+    return _crear_lote("dueno", registros, tamano_lote)
+
+def crear_mascotas_lote(registros, tamano_lote=TAMANO_LOTE):
+    """Crear mascotas en lotes a partir de diccionarios con los campos de crear_mascota"""
+    return _crear_lote("mascota", registros, tamano_lote)
+
+def crear_veterinarios_lote(registros, tamano_lote=TAMANO_LOTE):
+    """Crear veterinarios en lotes a partir de diccionarios con los campos de crear_veterinario"""
+    return _crear_lote("veterinario", registros, tamano_lote)
+
+def crear_consultas_lote(registros, tamano_lote=TAMANO_LOTE):
+    """Crear consultas en lotes a partir de diccionarios con los campos de crear_consulta"""
+    return _crear_lote("consulta", registros, tamano_lote)
+
 # ========== REPORTES ESPECIALES ==========
+# Mascotas por petición en los reportes por lote
+TAMANO_LOTE_REPORTES = 100
+
+def _consulta_historial():
+    """Mascota con su dueño y sus consultas (con veterinario), de la más reciente a la más antigua"""
+    return (supabase.table("mascota").select(proyeccion("mascota", "reporte"))
+            .order("fecha_consulta", desc=True, foreign_table="consulta")
+            .order("id_consulta", desc=True, foreign_table="consulta"))
+
+def _armar_reporte(fila):
+    fila = modelos.registro("mascota", fila)
+    consultas = fila.pop("consulta", None) or []
+    return {
+        "mascota": fila,
+        "dueno": fila['dueno'],
+        "consultas": consultas
+    }
+
+def _dependencias_reporte(id_mascota):
+    return [("mascota", ("id_mascota", id_mascota)), ("dueno", None),
+            ("consulta", ("id_mascota", id_mascota)), ("veterinario", None)]
+
 def reporte_historial_completo(id_mascota):
-    """Generar reporte completo del historial clínico"""
+    """Generar reporte completo del historial clínico (una sola petición)"""
+    def cargar():
+        filas = _consulta_historial().eq("id_mascota", id_mascota).execute().data
+        return _armar_reporte(filas[0]) if filas else None
+    
     try:
-        # Obtener información de la mascota y dueño
-        mascota_info = supabase.table("mascota").select("*, dueno(*)").eq("id_mascota", id_mascota).execute()
-        
-        if not mascota_info.data:
+        id_mascota = diario.resolver_id("mascota", id_mascota)
+        filas = _leer_replica("mascota", "reporte", igual=("id_mascota", id_mascota))
+        if filas is not None:
+            reporte = _armar_reporte(filas[0]) if filas else None
+        else:
+            reporte = cache_lecturas.leer(("reporte", id_mascota), _dependencias_reporte(id_mascota),
+                                          cargar, parametrizada=True)
+        if reporte is None:
             print("Mascota no encontrada")
-            return None
-        
-        mascota = mascota_info.data[0]
-        dueno = mascota['dueno']
-        
-        # Obtener historial de consultas
-        consultas = obtener_consultas_por_mascota(id_mascota)
-        
-        return {
-            "mascota": mascota,
-            "dueno": dueno,
-            "consultas": consultas
-        }
+        return reporte
         
+    except BaseNoDisponible:
+        raise
     except Exception as e:
         print(f"Error generando reporte: {e}")
         return None
 
-def estadisticas_veterinaria():
+def pagina_historiales(despues_de=None, tamano=TAMANO_LOTE_REPORTES):
+    """Reportes de las tamano mascotas siguientes a despues_de, en orden de ID (keyset).
+
+    Los errores se propagan: quien exporta no debe dar por completa una página
+    que no llegó."""
+    consulta = _consulta_historial()
+    if despues_de is not None:
+        consulta = consulta.gt("id_mascota", despues_de)
+    filas = consulta.order("id_mascota").limit(tamano).execute().data
+    return [_armar_reporte(fila) for fila in filas]
+
+def reportes_historial(ids_mascota, tamano_lote=TAMANO_LOTE_REPORTES):
+    """Reportes de varias mascotas, una petición por cada tamano_lote IDs.
+
+    Devuelve {id_mascota: reporte}, en el orden recibido; los IDs que no
+    existen no aparecen (tampoco los temporales que el diario no envió aún)."""
+    ids = list(dict.fromkeys(ids_mascota))
+    encontrados = {}
+    try:
+        resueltos = _resolver_ids("mascota", ids)
+        for lote in en_lotes(list(dict.fromkeys(resueltos.values())), tamano_lote):
+            for fila in _consulta_historial().in_("id_mascota", lote).execute().data:
+                encontrados[fila['id_mascota']] = _armar_reporte(fila)
+        return {i: encontrados[resueltos[i]] for i in ids if resueltos.get(i) in encontrados}
+    except BaseNoDisponible:
+        raise
+    except Exception as e:
+        print(f"Error generando reportes: {e}")
+        return {}
+
+# ========== CONTEOS EN EL SERVIDOR ==========
+def contar_registros(tabla, filtros=None):
+    """Contar registros de una tabla sin descargar filas"""
+    try:
+        # count=exact con limit 0: PostgREST responde solo Content-Range, sin cuerpo
+        consulta = supabase.table(tabla).select(CLAVES_PRIMARIAS.get(tabla, "id"), count="exact")
+        if filtros:
+            for campo, valor in filtros.items():
+                consulta = consulta.eq(campo, valor)
+        resultado = consulta.limit(0).execute()
+        return resultado.count or 0
+    except BaseNoDisponible:
+        raise
+    except Exception as e:
+        print(f"Error contando {tabla}: {e}")
+        return None
+
+def contar_mascotas_por_especie():
+    """Cantidad de mascotas por especie"""
+    try:
+        # Agregado en el servidor (requiere agregados habilitados en PostgREST)
+        resultado = supabase.table("mascota").select("especie, count()").execute()
+        return {fila['especie'] or "Sin especie": fila['count'] for fila in resultado.data}
+    except BaseNoDisponible:
+        raise
+    except Exception:
+        pass
+    try:
+        # Sin agregados: se recorre solo la columna especie
+        filas = _paginar("mascota", "id_mascota, especie")
+        conteo = Counter(fila['especie'] or "Sin especie" for fila in filas)
+        return dict(conteo)
+    except BaseNoDisponible:
+        raise
+    except Exception as e:
+        print(f"Error contando mascotas por especie: {e}")
+        return {}
+
+def contar_consultas_por_veterinario():
+    """Cantidad de consultas atendidas por cada veterinario"""
+    try:
+        # El conteo embebido consulta(count) se resuelve en el servidor
+        resultado = supabase.table("veterinario").select("id_veterinario, nombre, consulta(count)").order("id_veterinario").execute()
+        return [
+            {
+                "id_veterinario": v['id_veterinario'],
+                "nombre": v['nombre'],
+                "total_consultas": v['consulta'][0]['count'] if v['consulta'] else 0
+            }
+            for v in resultado.data
+        ]
+    except BaseNoDisponible:
+        raise
+    except Exception as e:
+        print(f"Error contando consultas por veterinario: {e}")
+        return []
+
+def estadisticas_veterinaria(agrupados=False):
     """Estadísticas generales de la veterinaria"""
+    tablas = {
+        "total_dueños": "dueno",
+        "total_mascotas": "mascota",
+        "total_veterinarios": "veterinario",
+        "total_consultas": "consulta"
+    }
     try:
-        # Contar dueños
-        dueños_count = len(obtener_duenos())
-        
-        # Contar mascotas
-        mascotas_count = len(obtener_mascotas())
+        # Los cuatro conteos (y los agrupados) viajan en paralelo
+        with ThreadPoolExecutor(max_workers=len(tablas) + 2) as ejecutor:
+            futuros = {clave: ejecutor.submit(contar_registros, tabla) for clave, tabla in tablas.items()}
+            if agrupados:
+                futuros["mascotas_por_especie"] = ejecutor.submit(contar_mascotas_por_especie)
+                futuros["consultas_por_veterinario"] = ejecutor.submit(contar_consultas_por_veterinario)
+            estadisticas = {clave: futuro.result() for clave, futuro in futuros.items()}
         
-        # Contar veterinarios
-        veterinarios_count = len(obtener_veterinarios())
-        
-        # Contar consultas
-        consultas_count = len(obtener_todas_consultas())
-        
-        return {
-            "total_dueños": dueños_count,
-            "total_mascotas": mascotas_count,
-            "total_veterinarios": veterinarios_count,
-            "total_consultas": consultas_count
-        }
+        if any(estadisticas[clave] is None for clave in tablas):
+            return {}
+        return estadisticas
         
+    except BaseNoDisponible:
+        raise
     except Exception as e:
         print(f"Error obteniendo estadísticas: {e}")
         return {}
@@ -243,6 +731,17 @@ def ejemplos_practicos():
     # stats = estadisticas_veterinaria()
     # print(f"Estadísticas: {stats}")
     
+    # 8. Cargar muchas consultas en inserciones multi-fila
+    # resultado = crear_consultas_lote([{"motivo": "Control", "id_mascota": id_mascota}], tamano_lote=500)
+    # print(resultado["ids"], resultado["errores"])
+    
+    # 9. Estadísticas con conteos agrupados (por especie y por veterinario)
+    # stats = estadisticas_veterinaria(agrupados=True)
+    
+    # 10. Historiales de todas las mascotas de un dueño (una petición cada 100 mascotas)
+    # ids = [m['id_mascota'] for m in obtener_mascotas_por_dueno(1)]
+    # reportes = reportes_historial(ids)
+    
     pass
 
 if __name__ == "__main__":
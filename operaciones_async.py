@@ -0,0 +1,536 @@
+"""Versión asyncio de operaciones.py sobre el cliente asíncrono de Supabase.
+
+Cada función replica a su par síncrono y devuelve lo mismo. Todas las
+peticiones pasan por un semáforo, así un servicio puede lanzar decenas de
+lecturas con asyncio.gather sin abrir más de ASYNC_MAX_CONCURRENCIA
+peticiones simultáneas contra Supabase, y por la misma política de plazos,
+reintentos y cortacircuitos que las síncronas (resiliencia.py): si la base
+no responde se lanza BaseNoDisponible en lugar de devolver [] o None.
+
+    import asyncio
+    import operaciones_async as ops
+
+    async def principal():
+        reportes = await ops.reportes_historial(ids)
+"""
+import os
+import asyncio
+import weakref
+from collections import Counter
+from dotenv import load_dotenv
+from supabase._async.client import create_client
+
+import pool_http
+import modelos
+from supabase_client import CLAVES_PRIMARIAS, TAMANO_LOTE, en_lotes, proyeccion
+from cache import cache_lecturas
+from coalescencia import lecturas_en_vuelo, clave_de
+from resiliencia import politica, BaseNoDisponible
+from operaciones import (TAMANO_PAGINA, TAMANO_LOTE_REPORTES, COLUMNAS, OBLIGATORIAS, _armar_reporte,
+                         _resolver_ids, _despues_de_consulta, indice_duenos, _indexar_mascota_nueva,
+                         _actualizar_indices_dueno)
+import diario
+
+load_dotenv()
+
+MAX_CONCURRENCIA = int(os.getenv("ASYNC_MAX_CONCURRENCIA", "10"))
+
+# Cliente y semáforo de cada bucle de eventos: los objetos de asyncio (y el
+# pool de conexiones) quedan atados al bucle en que se crean, así cada
+# asyncio.run() arma los suyos. La entrada se borra y su pool se cierra al
+# terminar el bucle (el semáforo y el pool guardan referencias al bucle, así
+# que la clave débil sola no alcanza)
+_conexiones = weakref.WeakKeyDictionary()
+
+async def _crear_conexion():
+    url = os.getenv("SUPABASE_URL")
+    key = os.getenv("SUPABASE_KEY")
+    if not url or not key:
+        raise ValueError("❌ Faltan variables de entorno en .env")
+    cliente = pool_http.instalar(await create_client(url, key))
+    return cliente, asyncio.Semaphore(MAX_CONCURRENCIA)
+
+async def _cerrar_conexion(bucle):
+    """Olvidar la conexión del bucle y cerrar su pool HTTP"""
+    conexion = _conexiones.pop(bucle, None)
+    if conexion is not None:
+        try:
+            await conexion[0].postgrest.session.aclose()
+        except Exception as e:
+            print(f"⚠️ Error cerrando el pool asíncrono: {e}")
+
+def _al_terminar(bucle):
+    """Cerrar la conexión cuando asyncio.run() apague el bucle (antes de loop.close())"""
+    apagar = bucle.shutdown_default_executor
+
+    async def apagar_y_cerrar(*args, **kwargs):
+        await _cerrar_conexion(bucle)
+        await apagar(*args, **kwargs)
+    bucle.shutdown_default_executor = apagar_y_cerrar
+
+async def _conexion():
+    """(cliente, semáforo) del bucle en curso, creados una sola vez por bucle"""
+    bucle = asyncio.get_running_loop()
+    conexion = _conexiones.get(bucle)
+    if conexion is None:
+        # Si la creación falla se vuelve a intentar en la próxima llamada
+        nueva = await _crear_conexion()
+        # Otra tarea pudo crearla mientras tanto: gana la primera
+        conexion = _conexiones.get(bucle)
+        if conexion is None:
+            conexion = _conexiones[bucle] = nueva
+            _al_terminar(bucle)
+        else:
+            await nueva[0].postgrest.session.aclose()
+    return conexion
+
+async def obtener_cliente():
+    """Cliente asíncrono de Supabase del bucle en curso"""
+    cliente, _ = await _conexion()
+    return cliente
+
+async def _tabla(tabla):
+    cliente = await obtener_cliente()
+    return cliente.table(tabla)
+
+# Operación de cada método HTTP de postgrest, para la política de resiliencia
+OPERACIONES_HTTP = {"GET": "select", "HEAD": "select", "POST": "insert", "PATCH": "update", "DELETE": "delete"}
+
+async def _ejecutar(consulta):
+    """Ejecutar una consulta con plazo, reintentos y cortacircuitos (politica), respetando el
+    límite de concurrencia; las lecturas iguales en vuelo se comparten"""
+    _, semaforo = await _conexion()
+    tabla = str(consulta.path).rsplit("/", 1)[-1]
+    operacion = OPERACIONES_HTTP.get(consulta.http_method, "select")
+
+    async def intento():
+        async with semaforo:
+            return await consulta.execute()
+
+    async def ejecutar():
+        return await politica.ejecutar_async(intento, tabla, operacion)
+    return await lecturas_en_vuelo.ejecutar_async(clave_de(tabla, consulta), tabla, ejecutar)
+
+# ========== PAGINACIÓN KEYSET ==========
+async def _paginar(tabla, campos, filtrar=None, tamano_pagina=TAMANO_PAGINA):
+    """Recorrer una tabla por clave primaria, entregando filas página a página"""
+    clave = CLAVES_PRIMARIAS[tabla]
+    ultimo = None
+    while True:
+        consulta = (await _tabla(tabla)).select(campos)
+        if filtrar:
+            consulta = filtrar(consulta)
+        if ultimo is not None:
+            consulta = consulta.gt(clave, ultimo)
+        filas = (await _ejecutar(consulta.order(clave).limit(tamano_pagina))).data
+        for fila in modelos.convertir(tabla, filas):
+            yield fila
+        if len(filas) < tamano_pagina:
+            return
+        ultimo = filas[-1][clave]
+
+async def _paginar_consultas(campos, filtrar=None, tamano_pagina=TAMANO_PAGINA):
+    """Recorrer consultas de la más reciente a la más antigua (keyset sobre fecha_consulta e id_consulta)"""
+    ultima = None
+    while True:
+        consulta = (await _tabla("consulta")).select(campos)
+        if filtrar:
+            consulta = filtrar(consulta)
+        if ultima is not None:
+            consulta = _despues_de_consulta(consulta, ultima)
+        consulta = (consulta.order("fecha_consulta", desc=True)
+                    .order("id_consulta", desc=True)
+                    .limit(tamano_pagina))
+        filas = (await _ejecutar(consulta)).data
+        for fila in modelos.convertir("consulta", filas):
+            yield fila
+        if len(filas) < tamano_pagina:
+            return
+        ultima = filas[-1]
+
+async def _listar(crear_iterador, mensaje):
+    """Lista con las filas de crear_iterador() (también sus errores, como un ID temporal pendiente, se informan aquí)"""
+    try:
+        return [fila async for fila in crear_iterador()]
+    except BaseNoDisponible:
+        raise
+    except Exception as e:
+        print(f"{mensaje}: {e}")
+        return []
+
+async def _insertar(tabla, datos):
+    """Insertar una fila y devolverla tal como quedó en la base"""
+    resultado = await _ejecutar((await _tabla(tabla)).insert(datos))
+    if resultado.data:
+        cache_lecturas.invalidar(tabla, resultado.data[0])
+        return resultado.data[0]
+    return None
+
+# ========== OPERACIONES PARA DUEÑOS ==========
+async def crear_dueno(nombre, direccion, telefono, email):
+    """Crear nuevo dueño"""
+    try:
+        datos = {
+            "nombre": nombre,
+            "direccion": direccion,
+            "telefono": telefono,
+            "email": email
+        }
+        fila = await _insertar("dueno", datos)
+        if fila:
+            # Los índices de búsqueda son los mismos que mantiene operaciones
+            indice_duenos.agregar(fila)
+            print(f"✅ Dueño '{nombre}' creado con ID: {fila['id_dueno']}")
+            return fila['id_dueno']
+        return None
+    except BaseNoDisponible:
+        raise
+    except Exception as e:
+        print(f"Error creando dueño: {e}")
+        return None
+
+def iterar_duenos(tamano_pagina=TAMANO_PAGINA, perfil="detalle"):
+    """Recorrer todos los dueños página a página"""
+    return _paginar("dueno", proyeccion("dueno", perfil), tamano_pagina=tamano_pagina)
+
+async def obtener_duenos(perfil="detalle"):
+    """Obtener todos los dueños"""
+    return await _listar(lambda: iterar_duenos(perfil=perfil), "Error obteniendo dueños")
+
+def iterar_busqueda_dueno(nombre, tamano_pagina=TAMANO_PAGINA, perfil="detalle"):
+    """Recorrer los dueños cuyo nombre coincide, página a página"""
+    return _paginar("dueno", proyeccion("dueno", perfil), lambda c: c.ilike("nombre", f"%{nombre}%"), tamano_pagina)
+
+async def buscar_dueno_por_nombre(nombre, perfil="detalle"):
+    """Buscar dueños por nombre"""
+    return await _listar(lambda: iterar_busqueda_dueno(nombre, perfil=perfil), "Error buscando dueño")
+
+async def actualizar_dueno(id_dueno, nuevos_datos):
+    """Actualizar dueño"""
+    try:
+        id_dueno = diario.resolver_id("dueno", id_dueno)
+        consulta = (await _tabla("dueno")).update(nuevos_datos).eq("id_dueno", id_dueno)
+        resultado = await _ejecutar(consulta)
+        cache_lecturas.invalidar("dueno", {"id_dueno": id_dueno})
+        _actualizar_indices_dueno(id_dueno, nuevos_datos)
+        if resultado.data:
+            print(f"✅ Dueño ID {id_dueno} actualizado")
+        return resultado.data
+    except BaseNoDisponible:
+        raise
+    except Exception as e:
+        print(f"Error actualizando dueño: {e}")
+        return None
+
+# ========== OPERACIONES PARA MASCOTAS ==========
+async def crear_mascota(nombre, especie, raza, fecha_nacimiento, id_dueno):
+    """Crear nueva mascota"""
+    try:
+        datos = {
+            "nombre": nombre,
+            "especie": especie,
+            "raza": raza,
+            "fecha_nacimiento": fecha_nacimiento,
+            "id_dueno": id_dueno
+        }
+        fila = await _insertar("mascota", datos)
+        if fila:
+            _indexar_mascota_nueva(fila)
+            print(f"Mascota '{nombre}' creada con ID: {fila['id_mascota']}")
+            return fila['id_mascota']
+        return None
+    except BaseNoDisponible:
+        raise
+    except Exception as e:
+        print(f"Error creando mascota: {e}")
+        return None
+
+def iterar_mascotas(tamano_pagina=TAMANO_PAGINA, perfil="detalle"):
+    """Recorrer todas las mascotas con info del dueño, página a página"""
+    return _paginar("mascota", proyeccion("mascota", perfil), tamano_pagina=tamano_pagina)
+
+async def obtener_mascotas(perfil="detalle"):
+    """Obtener todas las mascotas con info del dueño"""
+    return await _listar(lambda: iterar_mascotas(perfil=perfil), "Error obteniendo mascotas")
+
+def iterar_mascotas_por_dueno(id_dueno, tamano_pagina=TAMANO_PAGINA, perfil=None):
+    """Recorrer las mascotas de un dueño, página a página (sin perfil, solo las columnas de mascota)"""
+    id_dueno = diario.resolver_id("dueno", id_dueno)
+    campos = proyeccion("mascota", perfil) if perfil else "*"
+    return _paginar("mascota", campos, lambda c: c.eq("id_dueno", id_dueno), tamano_pagina)
+
+async def obtener_mascotas_por_dueno(id_dueno, perfil=None):
+    """Obtener mascotas de un dueño específico"""
+    return await _listar(lambda: iterar_mascotas_por_dueno(id_dueno, perfil=perfil), "Error obteniendo mascotas del dueño")
+
+def iterar_busqueda_mascota(nombre, tamano_pagina=TAMANO_PAGINA, perfil="detalle"):
+    """Recorrer las mascotas cuyo nombre coincide, página a página"""
+    return _paginar("mascota", proyeccion("mascota", perfil), lambda c: c.ilike("nombre", f"%{nombre}%"), tamano_pagina)
+
+async def buscar_mascota_por_nombre(nombre, perfil="detalle"):
+    """Buscar mascotas por nombre"""
+    return await _listar(lambda: iterar_busqueda_mascota(nombre, perfil=perfil), "Error buscando mascota")
+
+# ========== OPERACIONES PARA VETERINARIOS ==========
+async def crear_veterinario(nombre, especialidad, telefono, email):
+    """Crear nuevo veterinario"""
+    try:
+        datos = {
+            "nombre": nombre,
+            "especialidad": especialidad,
+            "telefono": telefono,
+            "email": email
+        }
+        fila = await _insertar("veterinario", datos)
+        if fila:
+            print(f"Veterinario '{nombre}' creado con ID: {fila['id_veterinario']}")
+            return fila['id_veterinario']
+        return None
+    except BaseNoDisponible:
+        raise
+    except Exception as e:
+        print(f"Error creando veterinario: {e}")
+        return None
+
+def iterar_veterinarios(tamano_pagina=TAMANO_PAGINA, perfil="detalle"):
+    """Recorrer todos los veterinarios página a página"""
+    return _paginar("veterinario", proyeccion("veterinario", perfil), tamano_pagina=tamano_pagina)
+
+async def obtener_veterinarios(perfil="detalle"):
+    """Obtener todos los veterinarios"""
+    return await _listar(lambda: iterar_veterinarios(perfil=perfil), "Error obteniendo veterinarios")
+
+# ========== OPERACIONES PARA CONSULTAS ==========
+async def crear_consulta(motivo, diagnostico, tratamiento, observaciones, id_mascota, id_veterinario=None):
+    """Crear nueva consulta médica"""
+    try:
+        datos = {
+            "motivo": motivo,
+            "diagnostico": diagnostico,
+            "tratamiento": tratamiento,
+            "observaciones": observaciones,
+            "id_mascota": id_mascota,
+            "id_veterinario": id_veterinario
+        }
+        fila = await _insertar("consulta", datos)
+        if fila:
+            print(f"✅ Consulta creada con ID: {fila['id_consulta']}")
+            return fila['id_consulta']
+        return None
+    except BaseNoDisponible:
+        raise
+    except Exception as e:
+        print(f"Error creando consulta: {e}")
+        return None
+
+def iterar_consultas_por_mascota(id_mascota, tamano_pagina=TAMANO_PAGINA, perfil="reporte"):
+    """Recorrer el historial de una mascota, de la consulta más reciente a la más antigua"""
+    id_mascota = diario.resolver_id("mascota", id_mascota)
+    return _paginar_consultas(proyeccion("consulta", perfil), lambda c: c.eq("id_mascota", id_mascota), tamano_pagina)
+
+async def obtener_consultas_por_mascota(id_mascota, perfil="reporte"):
+    """Obtener historial de consultas de una mascota"""
+    return await _listar(lambda: iterar_consultas_por_mascota(id_mascota, perfil=perfil), "Error obteniendo consultas")
+
+def iterar_todas_consultas(tamano_pagina=TAMANO_PAGINA, perfil="detalle"):
+    """Recorrer todas las consultas con información relacionada, página a página"""
+    return _paginar_consultas(proyeccion("consulta", perfil), tamano_pagina=tamano_pagina)
+
+async def obtener_todas_consultas(perfil="detalle"):
+    """Obtener todas las consultas con información relacionada"""
+    return await _listar(lambda: iterar_todas_consultas(perfil=perfil), "Error obteniendo consultas")
+
+# ========== CARGA MASIVA ==========
+async def _insertar_lote(tabla, numero, desde, lote):
+    """Enviar un lote ya validado; devuelve (ids, error o None)"""
+    try:
+        filas = (await _ejecutar((await _tabla(tabla)).insert(lote))).data
+        return [fila[CLAVES_PRIMARIAS[tabla]] for fila in filas], None
+    except Exception as e:
+        # Como en insertar_lote: el lote fallido (también por base caída) queda en los errores
+        print(f"❌ Error insertando lote {numero} en {tabla}: {e}")
+        return [None] * len(lote), {"lote": numero, "desde": desde, "cantidad": len(lote), "error": str(e)}
+
+async def _crear_lote(tabla, registros, tamano_lote):
+    """Validar registros y enviar sus lotes de forma concurrente"""
+    columnas = COLUMNAS[tabla]
+    obligatorias = OBLIGATORIAS[tabla]
+    resultado = {"ids": [], "errores": []}
+    tareas, posiciones_por_lote = [], []
+    total = 0
+
+    for numero, lote in enumerate(en_lotes(registros, tamano_lote)):
+        validos, posiciones = [], []
+        for i, registro in enumerate(lote):
+            faltantes = [c for c in obligatorias if registro.get(c) in (None, "")]
+            if faltantes:
+                resultado["errores"].append({
+                    "registro": total + i,
+                    "error": f"Faltan campos obligatorios: {', '.join(faltantes)}"
+                })
+                continue
+            validos.append({c: registro.get(c) for c in columnas})
+            posiciones.append(total + i)
+        # Un lote sin filas válidas no se envía (sus IDs quedan en None)
+        if validos:
+            tareas.append(_insertar_lote(tabla, numero, total, validos))
+            posiciones_por_lote.append(posiciones)
+        total += len(lote)
+
+    ids = [None] * total
+    for posiciones, (ids_lote, error) in zip(posiciones_por_lote, await asyncio.gather(*tareas)):
+        for posicion, id_fila in zip(posiciones, ids_lote):
+            ids[posicion] = id_fila
+        if error:
+            resultado["errores"].append(error)
+    resultado["ids"] = ids
+
+    if any(id_fila is not None for id_fila in ids):
+        cache_lecturas.invalidar(tabla, solo_altas=True)
+    insertados = sum(1 for id_fila in ids if id_fila is not None)
+    print(f"✅ {insertados}/{total} registros insertados en {tabla} ({len(resultado['errores'])} errores)")
+    return resultado
+
+async def crear_duenos_lote(registros, tamano_lote=TAMANO_LOTE):
+    """Crear dueños en lotes a partir de diccionarios con los campos de crear_dueno"""
+    return await _crear_lote("dueno", registros, tamano_lote)
+
+async def crear_mascotas_lote(registros, tamano_lote=TAMANO_LOTE):
+    """Crear mascotas en lotes a partir de diccionarios con los campos de crear_mascota"""
+    return await _crear_lote("mascota", registros, tamano_lote)
+
+async def crear_veterinarios_lote(registros, tamano_lote=TAMANO_LOTE):
+    """Crear veterinarios en lotes a partir de diccionarios con los campos de crear_veterinario"""
+    return await _crear_lote("veterinario", registros, tamano_lote)
+
+async def crear_consultas_lote(registros, tamano_lote=TAMANO_LOTE):
+    """Crear consultas en lotes a partir de diccionarios con los campos de crear_consulta"""
+    return await _crear_lote("consulta", registros, tamano_lote)
+
+# ========== REPORTES ESPECIALES ==========
+async def _consulta_historial():
+    """Mascota con su dueño y sus consultas (con veterinario), de la más reciente a la más antigua"""
+    return ((await _tabla("mascota")).select(proyeccion("mascota", "reporte"))
+            .order("fecha_consulta", desc=True, foreign_table="consulta")
+            .order("id_consulta", desc=True, foreign_table="consulta"))
+
+async def reporte_historial_completo(id_mascota):
+    """Generar reporte completo del historial clínico (una sola petición)"""
+    try:
+        id_mascota = diario.resolver_id("mascota", id_mascota)
+        filas = (await _ejecutar((await _consulta_historial()).eq("id_mascota", id_mascota))).data
+        if not filas:
+            print("Mascota no encontrada")
+            return None
+        return _armar_reporte(filas[0])
+
+    except BaseNoDisponible:
+        raise
+    except Exception as e:
+        print(f"Error generando reporte: {e}")
+        return None
+
+async def reportes_historial(ids_mascota, tamano_lote=TAMANO_LOTE_REPORTES):
+    """Reportes de varias mascotas; los lotes de tamano_lote IDs se piden a la vez"""
+    ids = list(dict.fromkeys(ids_mascota))
+    try:
+        resueltos = _resolver_ids("mascota", ids)
+        consultas = [(await _consulta_historial()).in_("id_mascota", lote)
+                     for lote in en_lotes(list(dict.fromkeys(resueltos.values())), tamano_lote)]
+        respuestas = await asyncio.gather(*(_ejecutar(c) for c in consultas))
+        encontrados = {fila['id_mascota']: _armar_reporte(fila) for r in respuestas for fila in r.data}
+        return {i: encontrados[resueltos[i]] for i in ids if resueltos.get(i) in encontrados}
+    except BaseNoDisponible:
+        raise
+    except Exception as e:
+        print(f"Error generando reportes: {e}")
+        return {}
+
+# ========== CONTEOS EN EL SERVIDOR ==========
+async def contar_registros(tabla, filtros=None):
+    """Contar registros de una tabla sin descargar filas"""
+    try:
+        consulta = (await _tabla(tabla)).select(CLAVES_PRIMARIAS.get(tabla, "id"), count="exact")
+        if filtros:
+            for campo, valor in filtros.items():
+                consulta = consulta.eq(campo, valor)
+        resultado = await _ejecutar(consulta.limit(0))
+        return resultado.count or 0
+    except BaseNoDisponible:
+        raise
+    except Exception as e:
+        print(f"Error contando {tabla}: {e}")
+        return None
+
+async def contar_mascotas_por_especie():
+    """Cantidad de mascotas por especie"""
+    try:
+        resultado = await _ejecutar((await _tabla("mascota")).select("especie, count()"))
+        return {fila['especie'] or "Sin especie": fila['count'] for fila in resultado.data}
+    except BaseNoDisponible:
+        raise
+    except Exception:
+        pass
+    try:
+        conteo = Counter()
+        async for fila in _paginar("mascota", "id_mascota, especie"):
+            conteo[fila['especie'] or "Sin especie"] += 1
+        return dict(conteo)
+    except BaseNoDisponible:
+        raise
+    except Exception as e:
+        print(f"Error contando mascotas por especie: {e}")
+        return {}
+
+async def contar_consultas_por_veterinario():
+    """Cantidad de consultas atendidas por cada veterinario"""
+    try:
+        consulta = (await _tabla("veterinario")).select("id_veterinario, nombre, consulta(count)").order("id_veterinario")
+        resultado = await _ejecutar(consulta)
+        return [
+            {
+                "id_veterinario": v['id_veterinario'],
+                "nombre": v['nombre'],
+                "total_consultas": v['consulta'][0]['count'] if v['consulta'] else 0
+            }
+            for v in resultado.data
+        ]
+    except BaseNoDisponible:
+        raise
+    except Exception as e:
+        print(f"Error contando consultas por veterinario: {e}")
+        return []
+
+async def estadisticas_veterinaria(agrupados=False):
+    """Estadísticas generales de la veterinaria"""
+    tablas = {
+        "total_dueños": "dueno",
+        "total_mascotas": "mascota",
+        "total_veterinarios": "veterinario",
+        "total_consultas": "consulta"
+    }
+    try:
+        tareas = {clave: contar_registros(tabla) for clave, tabla in tablas.items()}
+        if agrupados:
+            tareas["mascotas_por_especie"] = contar_mascotas_por_especie()
+            tareas["consultas_por_veterinario"] = contar_consultas_por_veterinario()
+        valores = await asyncio.gather(*tareas.values())
+        estadisticas = dict(zip(tareas.keys(), valores))
+
+        if any(estadisticas[clave] is None for clave in tablas):
+            return {}
+        return estadisticas
+
+    except BaseNoDisponible:
+        raise
+    except Exception as e:
+        print(f"Error obteniendo estadísticas: {e}")
+        return {}
+
+if __name__ == "__main__":
+    async def _probar():
+        print("🔍 Probando cliente asíncrono...")
+        stats = await estadisticas_veterinaria()
+        print(f"📊 Estadísticas: {stats}")
+
+    asyncio.run(_probar())
@@ -0,0 +1,93 @@
+"""Pool de conexiones HTTP compartido por todos los clientes de Supabase del proceso.
+
+create_client arma su propia sesión httpx con los valores por defecto de la
+librería. instalar(cliente) la reemplaza por una que usa un único transporte
+del proceso: todos los ConexionBD, test_conexion.py y los hilos que los usen
+reutilizan las mismas conexiones keep-alive en vez de abrir las suyas. El
+transporte de httpx es seguro para usar desde varios hilos.
+
+Variables de .env:
+    HTTP_MAX_CONEXIONES=20      conexiones abiertas como máximo (las demás peticiones esperan)
+    HTTP_MAX_KEEPALIVE=20       conexiones ociosas que se conservan abiertas
+    HTTP_KEEPALIVE_S=30         segundos que una conexión ociosa sigue abierta
+    HTTP2=1                     usar HTTP/2 si está instalado h2 (pip install httpx[http2])
+    HTTP_TIMEOUT_CONEXION=5     segundos para abrir una conexión
+    HTTP_TIMEOUT_LECTURA=30     segundos de espera por la respuesta
+    HTTP_TIMEOUT_POOL=10        segundos esperando una conexión libre del pool
+"""
+import os
+import atexit
+import threading
+import importlib.util
+import httpx
+from postgrest.utils import SyncClient, AsyncClient
+from dotenv import load_dotenv
+
+load_dotenv()
+
+MAX_CONEXIONES = int(os.getenv("HTTP_MAX_CONEXIONES", "20"))
+MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", str(MAX_CONEXIONES)))
+KEEPALIVE_S = float(os.getenv("HTTP_KEEPALIVE_S", "30"))
+TIMEOUT_CONEXION = float(os.getenv("HTTP_TIMEOUT_CONEXION", "5"))
+TIMEOUT_LECTURA = float(os.getenv("HTTP_TIMEOUT_LECTURA", "30"))
+TIMEOUT_POOL = float(os.getenv("HTTP_TIMEOUT_POOL", "10"))
+# HTTP/2 multiplexa las peticiones de todos los hilos en una conexión, pero necesita h2
+HTTP2 = os.getenv("HTTP2", "1") == "1" and importlib.util.find_spec("h2") is not None
+
+_transporte = None
+_bloqueo = threading.Lock()
+
+def configuracion():
+    """Valores con los que se crea el pool"""
+    return {
+        "max_conexiones": MAX_CONEXIONES,
+        "max_keepalive": MAX_KEEPALIVE,
+        "keepalive_s": KEEPALIVE_S,
+        "http2": HTTP2,
+        "timeout_conexion": TIMEOUT_CONEXION,
+        "timeout_lectura": TIMEOUT_LECTURA,
+        "timeout_pool": TIMEOUT_POOL
+    }
+
+def _limites():
+    return httpx.Limits(max_connections=MAX_CONEXIONES, max_keepalive_connections=MAX_KEEPALIVE,
+                        keepalive_expiry=KEEPALIVE_S)
+
+def _timeout():
+    return httpx.Timeout(TIMEOUT_LECTURA, connect=TIMEOUT_CONEXION, pool=TIMEOUT_POOL)
+
+def transporte():
+    """Transporte compartido del proceso, creado en el primer uso"""
+    global _transporte
+    if _transporte is None:
+        with _bloqueo:
+            if _transporte is None:
+                _transporte = httpx.HTTPTransport(limits=_limites(), http2=HTTP2)
+                atexit.register(cerrar)
+    return _transporte
+
+def cerrar():
+    """Cerrar las conexiones del pool compartido"""
+    global _transporte
+    with _bloqueo:
+        if _transporte is not None:
+            _transporte.close()
+            _transporte = None
+
+def instalar(cliente):
+    """Hacer que un cliente de create_client use el pool compartido; devuelve el mismo cliente.
+
+    Los clientes asíncronos reciben un transporte propio con los mismos
+    límites: un transporte asíncrono queda atado a su bucle de eventos."""
+    postgrest = cliente.postgrest
+    anterior = postgrest.session
+    if isinstance(anterior, httpx.AsyncClient):
+        postgrest.session = AsyncClient(
+            base_url=anterior.base_url, headers=anterior.headers, timeout=_timeout(),
+            transport=httpx.AsyncHTTPTransport(limits=_limites(), http2=HTTP2))
+        # La sesión original todavía no abrió conexiones: no hay nada que cerrar
+        return cliente
+    postgrest.session = SyncClient(base_url=anterior.base_url, headers=anterior.headers,
+                                   timeout=_timeout(), transport=transporte())
+    anterior.close()
+    return cliente
@@ -0,0 +1,94 @@
+"""Lecturas en segundo plano mientras se completa un formulario del menú.
+
+Antes la aplicación esperaba ociosa a que se escribieran el motivo, el
+diagnóstico, etc., y recién después pedía la lista de mascotas o de
+veterinarios para elegir. Ahora, al elegir una opción del menú, main lanza
+en un hilo aparte las lecturas que ese flujo va a necesitar y el flujo las
+toma con tomar():
+
+- si ya llegaron, se usan sin esperar;
+- si siguen en vuelo, se espera esa misma petición (no se repite);
+- si fallaron o no se precargaron, se hace la lectura en el momento.
+
+Lo precargado vale solo para la opción en curso: main lo descarta al
+terminarla, y cualquier escritura (invalidación del caché) también.
+
+Con PRECARGA=0 en .env no se lanza nada y tomar() lee en el momento.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from cache import cache_lecturas
+
+load_dotenv()
+
+ACTIVA = os.getenv("PRECARGA", "1") == "1"
+HILOS = int(os.getenv("PRECARGA_HILOS", "3"))
+
+class Precarga:
+    """Lecturas lanzadas por adelantado, identificadas por (función, argumentos)"""
+
+    def __init__(self, hilos=HILOS, activa=ACTIVA):
+        self.activa = activa
+        self.hilos = hilos
+        self._ejecutor = None
+        self._pendientes = {}
+        self._bloqueo = threading.Lock()
+        # listas: ya habían llegado; esperadas: seguían en vuelo; directas: sin precarga o con error
+        self.estadisticas = {"lanzadas": 0, "listas": 0, "esperadas": 0, "directas": 0, "descartadas": 0}
+
+    def lanzar(self, funcion, *args):
+        """Empezar funcion(*args) en segundo plano (si no está ya lanzada)"""
+        if not self.activa:
+            return
+        clave = (funcion, args)
+        with self._bloqueo:
+            if clave in self._pendientes:
+                return
+            if self._ejecutor is None:
+                self._ejecutor = ThreadPoolExecutor(max_workers=self.hilos, thread_name_prefix="precarga")
+            self._pendientes[clave] = self._ejecutor.submit(funcion, *args)
+            self.estadisticas["lanzadas"] += 1
+
+    def tomar(self, funcion, *args):
+        """Resultado de funcion(*args): el precargado si lo hay, si no se llama en el momento"""
+        with self._bloqueo:
+            futuro = self._pendientes.pop((funcion, args), None)
+            if futuro is not None:
+                self.estadisticas["listas" if futuro.done() else "esperadas"] += 1
+        if futuro is not None:
+            try:
+                return futuro.result()
+            except Exception:
+                # El error se repite (y se informa) en el hilo del flujo
+                pass
+        with self._bloqueo:
+            self.estadisticas["directas"] += 1
+        return funcion(*args)
+
+    def ver(self, funcion, *args):
+        """Resultado precargado si ya llegó, sin esperar ni consumirlo (None si no está)"""
+        with self._bloqueo:
+            futuro = self._pendientes.get((funcion, args))
+        if futuro is None or not futuro.done() or futuro.exception() is not None:
+            return None
+        return futuro.result()
+
+    def descartar(self, *_):
+        """Olvidar todo lo precargado (lo que no empezó se cancela)"""
+        with self._bloqueo:
+            pendientes, self._pendientes = self._pendientes, {}
+            self.estadisticas["descartadas"] += len(pendientes)
+        for futuro in pendientes.values():
+            futuro.cancel()
+
+    def cerrar(self):
+        self.descartar()
+        if self._ejecutor is not None:
+            self._ejecutor.shutdown(wait=False, cancel_futures=True)
+            self._ejecutor = None
+
+segundo_plano = Precarga()
+# Una escritura deja viejo lo precargado
+cache_lecturas.suscribir(segundo_plano.descartar)
@@ -0,0 +1,130 @@
+"""Prueba de carga de la coalescencia de lecturas contra el PostgREST falso.
+
+Uso:
+    python prueba_carga.py
+    python prueba_carga.py --hilos 32 --llamadas 2000 --latencia 20 --calientes 10
+
+Varios hilos (y después varias tareas asyncio) piden a la vez lecturas
+repetidas: obtener_veterinarios() y obtener_consultas_por_mascota(id) sobre
+un conjunto chico de mascotas "calientes", sin caché. Cada escenario corre
+con y sin coalescencia y muestra peticiones HTTP que llegaron al servidor,
+lecturas compartidas, latencias p50/p95 y llamadas por segundo. También
+comprueba que las respuestas coinciden con las de una lectura secuencial.
+"""
+import os
+import time
+import random
+import asyncio
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+from servidor_postgrest import ServidorPostgrest, sembrar, CLAVE_FALSA
+from benchmark import percentil
+
+def _llamadas(cantidad, calientes, semilla=7):
+    """Lista de (nombre, argumento): un tercio listados de veterinarios, el resto historiales"""
+    azar = random.Random(semilla)
+    return [("veterinarios", None) if azar.random() < 1 / 3 else ("consultas", azar.randint(1, calientes))
+            for _ in range(cantidad)]
+
+def correr_hilos(servidor, ops, vuelo, nombre, llamadas, hilos, esperado):
+    """Hacer las llamadas desde hilos y resumir peticiones, compartidas y latencias"""
+    servidor.estadisticas.reiniciar()
+    vuelo.reiniciar()
+    funciones = {"veterinarios": lambda _: ops.obtener_veterinarios(),
+                 "consultas": ops.obtener_consultas_por_mascota}
+
+    def llamar(llamada):
+        inicio = time.perf_counter()
+        resultado = funciones[llamada[0]](llamada[1])
+        return (time.perf_counter() - inicio) * 1000, resultado == esperado[llamada]
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=hilos) as ejecutor:
+        resultados = list(ejecutor.map(llamar, llamadas))
+    return _resumir(nombre, servidor, vuelo, resultados, time.perf_counter() - inicio)
+
+async def correr_async(servidor, ops_async, vuelo, nombre, llamadas, tareas, esperado):
+    """Lo mismo con asyncio.gather, de a tareas llamadas simultáneas"""
+    servidor.estadisticas.reiniciar()
+    vuelo.reiniciar()
+    funciones = {"veterinarios": lambda _: ops_async.obtener_veterinarios(),
+                 "consultas": ops_async.obtener_consultas_por_mascota}
+
+    async def llamar(llamada):
+        inicio = time.perf_counter()
+        resultado = await funciones[llamada[0]](llamada[1])
+        return (time.perf_counter() - inicio) * 1000, resultado == esperado[llamada]
+
+    inicio = time.perf_counter()
+    resultados = []
+    for i in range(0, len(llamadas), tareas):
+        resultados.extend(await asyncio.gather(*(llamar(c) for c in llamadas[i:i + tareas])))
+    return _resumir(nombre, servidor, vuelo, resultados, time.perf_counter() - inicio)
+
+def _resumir(nombre, servidor, vuelo, resultados, segundos):
+    tiempos = [ms for ms, _ in resultados]
+    contadores = vuelo.resumen()
+    return {
+        "escenario": nombre,
+        "llamadas": len(resultados),
+        "peticiones_http": servidor.estadisticas.resumen()["peticiones"],
+        "coalescidas": contadores["coalescidas"],
+        "p50_ms": percentil(tiempos, 50),
+        "p95_ms": percentil(tiempos, 95),
+        "por_segundo": len(resultados) / segundos,
+        "correctas": sum(ok for _, ok in resultados)
+    }
+
+def imprimir(filas):
+    print(f"\n{'escenario':26} {'llamadas':>9} {'http':>7} {'compart.':>9} {'p50':>8} {'p95':>8} {'llam/s':>8} {'ok':>6}")
+    print("-" * 88)
+    for f in filas:
+        print(f"{f['escenario']:26} {f['llamadas']:9} {f['peticiones_http']:7} {f['coalescidas']:9} "
+              f"{f['p50_ms']:8.1f} {f['p95_ms']:8.1f} {f['por_segundo']:8.0f} {f['correctas']:6}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Peticiones al servidor con y sin coalescencia de lecturas")
+    parser.add_argument("--hilos", type=int, default=16, help="hilos (y tareas asyncio) simultáneos")
+    parser.add_argument("--llamadas", type=int, default=800)
+    parser.add_argument("--latencia", type=float, default=20.0, help="ms de cada petición")
+    parser.add_argument("--calientes", type=int, default=5, help="mascotas distintas consultadas")
+    args = parser.parse_args()
+
+    servidor = ServidorPostgrest(latencia_ms=args.latencia).iniciar()
+    sembrar(servidor.cliente, 500)
+    os.environ.update({"SUPABASE_URL": servidor.url, "SUPABASE_KEY": CLAVE_FALSA, "BD_BACKEND": "supabase",
+                       "ASYNC_MAX_CONCURRENCIA": str(args.hilos)})
+    for tabla in ("DUENO", "MASCOTA", "VETERINARIO", "CONSULTA"):
+        os.environ[f"CACHE_TTL_{tabla}"] = "0"
+    import operaciones as ops
+    import operaciones_async as ops_async
+    from coalescencia import lecturas_en_vuelo
+
+    llamadas = _llamadas(args.llamadas, args.calientes)
+    # Respuestas de referencia, pedidas una por una
+    esperado = {("veterinarios", None): ops.obtener_veterinarios()}
+    for id_mascota in range(1, args.calientes + 1):
+        esperado[("consultas", id_mascota)] = ops.obtener_consultas_por_mascota(id_mascota)
+
+    filas = []
+    for activo in (False, True):
+        lecturas_en_vuelo.activo = activo
+        sufijo = "con coalescencia" if activo else "sin coalescencia"
+        filas.append(correr_hilos(servidor, ops, lecturas_en_vuelo, f"hilos {sufijo}",
+                                  llamadas, args.hilos, esperado))
+    for activo in (False, True):
+        lecturas_en_vuelo.activo = activo
+        sufijo = "con coalescencia" if activo else "sin coalescencia"
+        filas.append(asyncio.run(correr_async(servidor, ops_async, lecturas_en_vuelo, f"asyncio {sufijo}",
+                                              llamadas, args.hilos, esperado)))
+
+    imprimir(filas)
+    for tipo in ("hilos", "asyncio"):
+        sin, con = (f for f in filas if f["escenario"].startswith(tipo))
+        reduccion = 100 * (1 - con["peticiones_http"] / sin["peticiones_http"])
+        print(f"{tipo}: {sin['peticiones_http']} -> {con['peticiones_http']} peticiones al servidor (-{reduccion:.0f}%)")
+    servidor.detener()
+
+if __name__ == "__main__":
+    main()
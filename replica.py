@@ -0,0 +1,370 @@
+"""Réplica local en memoria de dueno, mascota, veterinario y consulta.
+
+Con REPLICA=1 en .env (o replica.activar()), las funciones de lectura de
+operaciones responden desde aquí en vez de descargar la tabla en cada
+llamada. La primera lectura de una tabla la carga completa; después, cuando
+pasaron REPLICA_INTERVALO_S segundos desde la última sincronización, solo se
+piden las filas nuevas: las de ID mayor que la marca guardada (o, con
+REPLICA_COLUMNA_CAMBIO, las de fecha de modificación mayor o igual a la
+marca). Las tablas del esquema no tienen fecha de modificación, así que por
+defecto la marca es el ID.
+
+Las escrituras de este proceso llegan por cache_lecturas.invalidar: una fila
+con clave primaria se vuelve a pedir en la siguiente lectura, una alta
+masiva adelanta la sincronización y una escritura sin claves (db.actualizar,
+db.eliminar, la unidad de trabajo) recarga la tabla entera. Lo que cambian o
+borran otros clientes sin pasar la marca se ve al recargar cada
+REPLICA_RECARGA_S segundos.
+
+Si el servidor no responde al sincronizar, se sirven los datos que hay
+mientras no tengan más de REPLICA_MAX_DESFASE_S segundos; pasado ese límite
+la lectura lanza BaseNoDisponible.
+
+Variables de .env:
+    REPLICA=1                   activar la réplica
+    REPLICA_INTERVALO_S=30      antigüedad con la que se piden las filas nuevas
+    REPLICA_MAX_DESFASE_S=300   antigüedad máxima de lo que se muestra sin conexión
+    REPLICA_RECARGA_S=3600      cada cuánto se recarga cada tabla completa
+    REPLICA_COLUMNA_CAMBIO=     columna de fecha de modificación (vacía: se usa el ID)
+"""
+import os
+import time
+import threading
+from functools import lru_cache
+from dotenv import load_dotenv
+
+from supabase_client import db, CLAVES_PRIMARIAS, CLAVES_FORANEAS
+from cache import cache_lecturas, DEPENDIENTES_EN_CASCADA
+from resiliencia import es_transitorio, BaseNoDisponible
+import modelos
+
+load_dotenv()
+
+ACTIVA = os.getenv("REPLICA") == "1"
+INTERVALO_S = float(os.getenv("REPLICA_INTERVALO_S", "30"))
+MAX_DESFASE_S = float(os.getenv("REPLICA_MAX_DESFASE_S", "300"))
+RECARGA_S = float(os.getenv("REPLICA_RECARGA_S", "3600"))
+COLUMNA_CAMBIO = os.getenv("REPLICA_COLUMNA_CAMBIO") or None
+
+# Filas por petición; debe ser menor o igual al max-rows del servidor
+TAMANO_PAGINA = 500
+
+@lru_cache(maxsize=None)
+def parsear(campos):
+    """Proyección de PostgREST como tupla de (nombre, subproyección o None)"""
+    partes, profundidad, actual = [], 0, ""
+    for caracter in campos:
+        if caracter == "," and profundidad == 0:
+            partes.append(actual.strip())
+            actual = ""
+            continue
+        profundidad += (caracter == "(") - (caracter == ")")
+        actual += caracter
+    partes.append(actual.strip())
+
+    resultado = []
+    for parte in partes:
+        if "(" in parte:
+            nombre, resto = parte.split("(", 1)
+            resultado.append((nombre.strip(), parsear(resto[:-1])))
+        else:
+            resultado.append((parte, None))
+    return tuple(resultado)
+
+def _tablas_de(tabla, campos):
+    """Tabla principal y tablas embebidas en la proyección"""
+    tablas = {tabla}
+    for nombre, sub in campos:
+        if sub is not None:
+            tablas |= _tablas_de(nombre, sub)
+    return tablas
+
+def _ordenar(tabla, filas):
+    """Consultas de la más reciente a la más antigua; el resto por ID"""
+    if tabla == "consulta":
+        return sorted(filas, key=lambda f: (f["fecha_consulta"], f["id_consulta"]), reverse=True)
+    clave = CLAVES_PRIMARIAS[tabla]
+    return sorted(filas, key=lambda f: f[clave])
+
+class _TablaReplicada:
+    """Filas de una tabla por clave primaria, con índices por clave foránea"""
+
+    def __init__(self, tabla):
+        self.tabla = tabla
+        self.clave = CLAVES_PRIMARIAS[tabla]
+        self.filas = {}
+        # columna foránea -> valor -> IDs, para las mascotas de un dueño o las consultas de una mascota
+        self.por_foranea = {columna: {} for columna in CLAVES_FORANEAS.get(tabla, {})}
+        self.marca = None
+        self.sucias = set()
+        self.recargar = False
+        self.adelantar = False
+        self.cargada_en = None
+        self.sincronizada_en = None
+
+    def poner(self, fila):
+        id_valor = fila[self.clave]
+        self.quitar(id_valor)
+        self.filas[id_valor] = fila
+        for columna, indice in self.por_foranea.items():
+            indice.setdefault(fila.get(columna), set()).add(id_valor)
+
+    def quitar(self, id_valor):
+        anterior = self.filas.pop(id_valor, None)
+        if anterior is None:
+            return
+        for columna, indice in self.por_foranea.items():
+            ids = indice.get(anterior.get(columna))
+            if ids:
+                ids.discard(id_valor)
+
+    def hijos(self, columna, valor):
+        return self.por_foranea[columna].get(valor, ())
+
+    def al_dia(self, ahora, intervalo_s, recarga_s):
+        return (self.sincronizada_en is not None and not (self.recargar or self.adelantar or self.sucias)
+                and ahora - self.sincronizada_en < intervalo_s and ahora - self.cargada_en < recarga_s)
+
+class Replica:
+    """Copia local de las cuatro tablas, sincronizada por marca de agua"""
+
+    def __init__(self, obtener_cliente=lambda: db.client, intervalo_s=INTERVALO_S,
+                 max_desfase_s=MAX_DESFASE_S, recarga_s=RECARGA_S, columna_cambio=COLUMNA_CAMBIO,
+                 tamano_pagina=TAMANO_PAGINA):
+        self._obtener_cliente = obtener_cliente
+        self.intervalo_s = intervalo_s
+        self.max_desfase_s = max_desfase_s
+        self.recarga_s = recarga_s
+        self.columna_cambio = columna_cambio
+        self.tamano_pagina = tamano_pagina
+        self.tablas = {tabla: _TablaReplicada(tabla) for tabla in CLAVES_PRIMARIAS}
+        # Las lecturas y al_escribir comparten el estado; la sincronización va de a una
+        self._bloqueo = threading.RLock()
+        self._sincronizando = threading.Lock()
+        self.estadisticas = {"cargas_completas": 0, "deltas": 0, "filas_delta": 0,
+                             "peticiones": 0, "lecturas": 0, "lecturas_sin_conexion": 0}
+
+    # ---------- escrituras de este proceso ----------
+    def al_escribir(self, tabla, claves=None, cascada=False, solo_altas=False):
+        """Anotar una escritura (suscrito a cache_lecturas.invalidar)"""
+        estado = self.tablas.get(tabla)
+        if estado is None:
+            return
+        with self._bloqueo:
+            if cascada:
+                for nombre in [tabla] + DEPENDIENTES_EN_CASCADA.get(tabla, []):
+                    self.tablas[nombre].recargar = True
+            elif solo_altas:
+                estado.adelantar = True
+            elif claves and claves.get(estado.clave) is not None:
+                estado.sucias.add(claves[estado.clave])
+            else:
+                estado.recargar = True
+
+    # ---------- sincronización ----------
+    def _pedir(self, consulta):
+        self.estadisticas["peticiones"] += 1
+        return consulta.execute().data
+
+    def _recorrer(self, tabla, filtrar=None):
+        """Filas de la tabla en orden de clave primaria, página a página"""
+        clave = CLAVES_PRIMARIAS[tabla]
+        cliente = self._obtener_cliente()
+        ultimo = None
+        while True:
+            consulta = cliente.table(tabla).select("*")
+            if filtrar:
+                consulta = filtrar(consulta)
+            if ultimo is not None:
+                consulta = consulta.gt(clave, ultimo)
+            filas = self._pedir(consulta.order(clave).limit(self.tamano_pagina))
+            yield from filas
+            if len(filas) < self.tamano_pagina:
+                return
+            ultimo = filas[-1][clave]
+
+    def _recorrer_cambios(self, tabla, desde):
+        """Filas con columna_cambio >= desde, por desplazamiento (hay empates en la marca)"""
+        clave = CLAVES_PRIMARIAS[tabla]
+        cliente = self._obtener_cliente()
+        inicio = 0
+        while True:
+            filas = self._pedir(cliente.table(tabla).select("*").gte(self.columna_cambio, desde)
+                                .order(self.columna_cambio).order(clave)
+                                .limit(self.tamano_pagina).offset(inicio))
+            yield from filas
+            if len(filas) < self.tamano_pagina:
+                return
+            inicio += len(filas)
+
+    def _marca_de(self, estado, filas):
+        columna = self.columna_cambio or estado.clave
+        valores = [fila[columna] for fila in filas if fila.get(columna) is not None]
+        return max(valores, default=None)
+
+    def _cargar(self, estado):
+        """Reemplazar la tabla completa; mientras tanto las lecturas ven la anterior"""
+        inicio = time.perf_counter()
+        # Lo que se escriba durante la carga queda anotado y se vuelve a pedir después
+        with self._bloqueo:
+            estado.sucias.clear()
+            estado.recargar = estado.adelantar = False
+        nueva = _TablaReplicada(estado.tabla)
+        try:
+            filas = modelos.convertir(estado.tabla, list(self._recorrer(estado.tabla)))
+        except Exception:
+            estado.recargar = True
+            raise
+        for fila in filas:
+            nueva.poner(fila)
+        with self._bloqueo:
+            estado.filas, estado.por_foranea = nueva.filas, nueva.por_foranea
+            estado.marca = self._marca_de(estado, filas)
+            estado.cargada_en = estado.sincronizada_en = time.monotonic()
+        self.estadisticas["cargas_completas"] += 1
+        print(f"🗂️ Réplica de {estado.tabla}: {len(filas)} filas en {(time.perf_counter() - inicio) * 1000:.0f} ms")
+
+    def _actualizar(self, estado):
+        """Pedir solo las filas escritas desde aquí y las que pasaron la marca"""
+        with self._bloqueo:
+            sucias, estado.sucias = estado.sucias, set()
+            estado.adelantar = False
+        try:
+            releidas = {}
+            ids = sorted(sucias)
+            for i in range(0, len(ids), self.tamano_pagina):
+                lote = ids[i:i + self.tamano_pagina]
+                for fila in self._recorrer(estado.tabla, lambda c: c.in_(estado.clave, lote)):
+                    releidas[fila[estado.clave]] = modelos.registro(estado.tabla, fila)
+            if self.columna_cambio and estado.marca is not None:
+                nuevas = list(self._recorrer_cambios(estado.tabla, estado.marca))
+            else:
+                marca = estado.marca
+                nuevas = list(self._recorrer(estado.tabla, (lambda c: c.gt(estado.clave, marca)) if marca is not None else None))
+            nuevas = modelos.convertir(estado.tabla, nuevas)
+        except Exception:
+            with self._bloqueo:
+                estado.sucias |= sucias
+            raise
+
+        with self._bloqueo:
+            for id_valor in sucias:
+                if id_valor in releidas:
+                    estado.poner(releidas[id_valor])
+                else:
+                    # Ya no está en el servidor: se borró
+                    estado.quitar(id_valor)
+            for fila in nuevas:
+                estado.poner(fila)
+            marca = self._marca_de(estado, nuevas)
+            if marca is not None and (estado.marca is None or marca > estado.marca):
+                estado.marca = marca
+            estado.sincronizada_en = time.monotonic()
+        self.estadisticas["deltas"] += 1
+        self.estadisticas["filas_delta"] += len(releidas) + len(nuevas)
+
+    def sincronizar(self, tablas=None, forzar=False):
+        """Poner al día las tablas indicadas (todas por defecto) si les toca"""
+        with self._sincronizando:
+            ahora = time.monotonic()
+            for nombre in tablas or self.tablas:
+                estado = self.tablas[nombre]
+                if not forzar and estado.al_dia(ahora, self.intervalo_s, self.recarga_s):
+                    continue
+                if estado.cargada_en is None or estado.recargar or ahora - estado.cargada_en >= self.recarga_s:
+                    self._cargar(estado)
+                else:
+                    self._actualizar(estado)
+
+    def desfase_s(self, tabla):
+        """Segundos desde la última sincronización de la tabla (None si nunca se cargó)"""
+        sincronizada_en = self.tablas[tabla].sincronizada_en
+        return None if sincronizada_en is None else time.monotonic() - sincronizada_en
+
+    def _asegurar(self, tablas):
+        """Sincronizar antes de leer; sin conexión, servir lo que hay dentro del desfase máximo"""
+        try:
+            self.sincronizar(tablas)
+        except Exception as e:
+            if not isinstance(e, BaseNoDisponible) and not es_transitorio(e):
+                raise
+            desfases = [self.desfase_s(tabla) for tabla in tablas]
+            if None in desfases or max(desfases) > self.max_desfase_s:
+                raise BaseNoDisponible(f"La réplica local no está al día y el servidor no responde: {e}") from e
+            self.estadisticas["lecturas_sin_conexion"] += 1
+            print(f"⚠️ Sin conexión: se muestran datos de hace {max(desfases):.0f}s")
+
+    # ---------- lecturas ----------
+    def _proyectar(self, tabla, fila, campos):
+        """Armar la fila como la devolvería PostgREST con esa proyección"""
+        resultado = {}
+        for nombre, sub in campos:
+            if sub is None:
+                if nombre == "*":
+                    resultado.update(fila)
+                else:
+                    resultado[nombre] = fila.get(nombre)
+            elif f"id_{nombre}" in CLAVES_FORANEAS.get(tabla, {}):
+                padre = self.tablas[nombre].filas.get(fila.get(f"id_{nombre}"))
+                resultado[nombre] = self._proyectar(nombre, padre, sub) if padre else None
+            else:
+                hijos = self.tablas[nombre]
+                ids = hijos.hijos(CLAVES_PRIMARIAS[tabla], fila[CLAVES_PRIMARIAS[tabla]])
+                filas = _ordenar(nombre, [hijos.filas[i] for i in ids])
+                resultado[nombre] = [self._proyectar(nombre, hija, sub) for hija in filas]
+        return modelos.registro(tabla, resultado)
+
+    def consultar(self, tabla, campos="*", igual=None, contiene=None):
+        """Filas de tabla con la proyección campos, en el orden de los listados de operaciones.
+
+        igual=(columna, valor) filtra por igualdad y contiene=texto por nombre
+        (sin distinguir mayúsculas, como ilike '%texto%'). Las consultas van de
+        la más reciente a la más antigua; las demás tablas, por ID."""
+        arbol = parsear(campos)
+        self._asegurar(sorted(_tablas_de(tabla, arbol)))
+        self.estadisticas["lecturas"] += 1
+
+        with self._bloqueo:
+            estado = self.tablas[tabla]
+            if igual is None:
+                ids = list(estado.filas)
+            elif igual[0] == estado.clave:
+                ids = [igual[1]] if igual[1] in estado.filas else []
+            elif igual[0] in estado.por_foranea:
+                ids = list(estado.hijos(*igual))
+            else:
+                ids = [i for i, fila in estado.filas.items() if fila.get(igual[0]) == igual[1]]
+            filas = [estado.filas[i] for i in ids]
+            if contiene:
+                texto = contiene.casefold()
+                filas = [f for f in filas if texto in (f.get("nombre") or "").casefold()]
+            return [self._proyectar(tabla, fila, arbol) for fila in _ordenar(tabla, filas)]
+
+    def resumen(self):
+        """Contadores, filas y antigüedad de cada tabla"""
+        return {
+            **self.estadisticas,
+            "tablas": {nombre: {"filas": len(estado.filas), "marca": estado.marca,
+                                "desfase_s": self.desfase_s(nombre)}
+                       for nombre, estado in self.tablas.items()}
+        }
+
+_replica = None
+_bloqueo_global = threading.Lock()
+
+def activar(**opciones):
+    """Crear la réplica y suscribirla a las escrituras (las tablas se cargan en su primera lectura)"""
+    global _replica
+    with _bloqueo_global:
+        if _replica is None:
+            _replica = Replica(**opciones)
+            cache_lecturas.suscribir(_replica.al_escribir)
+            print(f"🗂️ Réplica local activa (sincroniza cada {_replica.intervalo_s:.0f}s, "
+                  f"desfase máximo sin conexión {_replica.max_desfase_s:.0f}s)")
+    return _replica
+
+def obtener():
+    """La réplica si está activa (REPLICA=1 la crea en el primer uso), si no None"""
+    if _replica is None and ACTIVA:
+        return activar()
+    return _replica
@@ -0,0 +1,345 @@
+"""Plazos, reintentos, lecturas duplicadas (hedging) y cortacircuitos para las peticiones.
+
+ClienteInstrumentado pasa cada execute() por politica.ejecutar(), así se
+aplica a todas las peticiones de operaciones y de supabase_client;
+operaciones_async usa politica.ejecutar_async() (lo mismo sin hedging):
+
+- Plazo: ninguna petición espera más de PLAZO_S segundos. Con
+  `with plazo(2):` el plazo cubre todas las peticiones del bloque (por
+  ejemplo un listado de varias páginas). Vencido, se lanza PlazoVencido.
+- Reintentos: las lecturas (select) que fallan por un error transitorio
+  (red, timeout, 5xx, statement timeout) se reintentan hasta REINTENTOS
+  veces con espera exponencial y jitter completo. Las escrituras no se
+  reintentan: podrían haberse aplicado.
+- Hedging (HEDGE=1): si una lectura tarda más que el p95 de las últimas
+  de su tabla, se lanza una segunda igual y se usa la que responda antes.
+- Cortacircuitos: tras CIRCUITO_FALLOS llamadas seguidas fallidas por
+  errores transitorios (agotados sus reintentos) las peticiones fallan al instante con CircuitoAbierto durante
+  CIRCUITO_ESPERA_S segundos; después pasa una sola de prueba y, si
+  responde, el circuito se cierra.
+
+Agotados los intentos se lanza BaseNoDisponible (PlazoVencido y
+CircuitoAbierto también lo son): operaciones la deja pasar en vez de
+devolver [] o None, así "sin datos" y "base caída" no se confunden.
+
+Variables de .env:
+    RESILIENCIA=0               desactivar todo (execute directo)
+    PLAZO_S=10                  plazo por petición
+    REINTENTOS=3                reintentos de una lectura
+    REINTENTO_BASE_MS=100       primera espera; se duplica en cada reintento
+    REINTENTO_MAX_MS=2000       espera máxima entre reintentos
+    HEDGE=0                     lecturas duplicadas
+    HEDGE_MIN_MUESTRAS=20       latencias necesarias antes de duplicar
+    CIRCUITO_FALLOS=5           llamadas fallidas seguidas que abren el circuito
+    CIRCUITO_ESPERA_S=30        segundos hasta dejar pasar una petición de prueba
+"""
+import os
+import time
+import queue
+import asyncio
+import random
+import threading
+from collections import deque
+from concurrent.futures import Future, wait, FIRST_COMPLETED
+from contextlib import contextmanager
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+class BaseNoDisponible(ConnectionError):
+    """La base de datos no respondió: no confundir con una consulta sin resultados"""
+
+class PlazoVencido(BaseNoDisponible):
+    """Se agotó el plazo de la llamada"""
+
+class CircuitoAbierto(BaseNoDisponible):
+    """Demasiados errores seguidos: no se envían peticiones por un tiempo"""
+
+# SQLSTATE de PostgreSQL que indican un problema pasajero del servidor
+# (57014 statement timeout, 08 conexión, 53 recursos, 40001/40P01 concurrencia)
+_SQLSTATE_TRANSITORIOS = ("57014", "57P01", "40001", "40P01")
+_CLASES_TRANSITORIAS = ("08", "53")
+# Errores de PostgREST cuando no llega a la base (503, y 504 al agotar el pool)
+_POSTGREST_TRANSITORIOS = ("PGRST000", "PGRST001", "PGRST002", "PGRST003")
+
+def es_transitorio(error):
+    """True si el error puede desaparecer al reintentar"""
+    if isinstance(error, (httpx.TransportError, PlazoVencido)):
+        return True
+    codigo = str(getattr(error, "code", "") or "")
+    if codigo.isdigit() and len(codigo) == 3:
+        return codigo.startswith("5") or codigo == "429"
+    if codigo.startswith("PGRST"):
+        return codigo in _POSTGREST_TRANSITORIOS
+    return codigo in _SQLSTATE_TRANSITORIOS or codigo[:2] in _CLASES_TRANSITORIAS
+
+class Circuito:
+    """Cortacircuitos: cerrado -> abierto tras N fallos -> semiabierto tras la espera"""
+
+    def __init__(self, umbral_fallos, espera_s):
+        self.umbral_fallos = umbral_fallos
+        self.espera_s = espera_s
+        self._bloqueo = threading.Lock()
+        self.estado = "cerrado"
+        self._fallos = 0
+        self._abierto_desde = 0.0
+        self._prueba_en_curso = False
+
+    def permitir(self):
+        """True si la petición puede salir (en semiabierto, solo una de prueba)"""
+        with self._bloqueo:
+            if self.estado == "cerrado":
+                return True
+            if self.estado == "abierto" and time.monotonic() - self._abierto_desde >= self.espera_s:
+                self.estado = "semiabierto"
+            if self.estado == "semiabierto" and not self._prueba_en_curso:
+                self._prueba_en_curso = True
+                return True
+            return False
+
+    def exito(self):
+        with self._bloqueo:
+            if self.estado != "cerrado":
+                print("🔌 Circuito cerrado: la base de datos responde de nuevo")
+            self.estado = "cerrado"
+            self._fallos = 0
+            self._prueba_en_curso = False
+
+    def fallo(self):
+        """Registrar una llamada fallida; devuelve True si el circuito se abrió"""
+        with self._bloqueo:
+            self._fallos += 1
+            self._prueba_en_curso = False
+            if self.estado == "semiabierto" or (self.estado == "cerrado" and self._fallos >= self.umbral_fallos):
+                self.estado = "abierto"
+                self._abierto_desde = time.monotonic()
+                print(f"⛔ Circuito abierto tras {self._fallos} llamadas fallidas seguidas: "
+                      f"se reintenta en {self.espera_s:.0f}s")
+                return True
+            return False
+
+    def restante_s(self):
+        return max(0.0, self.espera_s - (time.monotonic() - self._abierto_desde))
+
+_contexto = threading.local()
+
+@contextmanager
+def plazo(segundos):
+    """Limitar a segundos todas las peticiones hechas en el bloque (desde este hilo)"""
+    anterior = getattr(_contexto, "limite", None)
+    limite = time.monotonic() + segundos
+    # Un plazo interior nunca extiende uno exterior
+    _contexto.limite = min(limite, anterior) if anterior is not None else limite
+    try:
+        yield
+    finally:
+        _contexto.limite = anterior
+
+class _Trabajadores:
+    """Hilos daemon reutilizables para los intentos de lectura.
+
+    Daemon para que una petición colgada no retenga la salida del programa;
+    reutilizados porque crear un hilo por petición cuesta más que la
+    petición a una base local."""
+
+    def __init__(self):
+        self._cola = queue.SimpleQueue()
+        self._bloqueo = threading.Lock()
+        self._libres = 0
+
+    def lanzar(self, funcion):
+        futuro = Future()
+        futuro.inicio = time.monotonic()
+        with self._bloqueo:
+            if self._libres:
+                self._libres -= 1
+            else:
+                threading.Thread(target=self._trabajar, daemon=True).start()
+        self._cola.put((funcion, futuro))
+        return futuro
+
+    def _trabajar(self):
+        while True:
+            funcion, futuro = self._cola.get()
+            try:
+                futuro.set_result(funcion())
+            except BaseException as e:
+                futuro.set_exception(e)
+            with self._bloqueo:
+                self._libres += 1
+
+_trabajadores = _Trabajadores()
+
+class PoliticaResiliencia:
+    """Configuración y contadores de plazos, reintentos, hedging y cortacircuitos"""
+
+    def __init__(self):
+        self.activa = os.getenv("RESILIENCIA", "1") == "1"
+        self.plazo_s = float(os.getenv("PLAZO_S", "10"))
+        self.reintentos = int(os.getenv("REINTENTOS", "3"))
+        self.base_ms = float(os.getenv("REINTENTO_BASE_MS", "100"))
+        self.max_ms = float(os.getenv("REINTENTO_MAX_MS", "2000"))
+        self.hedge = os.getenv("HEDGE", "0") == "1"
+        self.hedge_min_muestras = int(os.getenv("HEDGE_MIN_MUESTRAS", "20"))
+        self.circuito = Circuito(int(os.getenv("CIRCUITO_FALLOS", "5")),
+                                 float(os.getenv("CIRCUITO_ESPERA_S", "30")))
+        self._bloqueo = threading.Lock()
+        self._latencias = {}
+        self.reiniciar()
+
+    def configurar(self, **valores):
+        """Cambiar parámetros en caliente (circuito_fallos y circuito_espera_s rehacen el circuito)"""
+        fallos = valores.pop("circuito_fallos", self.circuito.umbral_fallos)
+        espera = valores.pop("circuito_espera_s", self.circuito.espera_s)
+        for nombre, valor in valores.items():
+            if not hasattr(self, nombre):
+                raise ValueError(f"Parámetro de resiliencia desconocido: {nombre}")
+            setattr(self, nombre, valor)
+        if (fallos, espera) != (self.circuito.umbral_fallos, self.circuito.espera_s):
+            self.circuito = Circuito(fallos, espera)
+
+    def reiniciar(self):
+        """Poner a cero los contadores y cerrar el circuito (las latencias de hedging se conservan)"""
+        self.circuito = Circuito(self.circuito.umbral_fallos, self.circuito.espera_s)
+        with self._bloqueo:
+            self.contadores = {"peticiones": 0, "reintentos": 0, "hedges": 0, "hedges_ganados": 0,
+                               "plazos_vencidos": 0, "rechazos_circuito": 0, "fallidas": 0}
+
+    def resumen(self):
+        with self._bloqueo:
+            return {**self.contadores, "circuito": self.circuito.estado}
+
+    def _contar(self, nombre):
+        with self._bloqueo:
+            self.contadores[nombre] += 1
+
+    def p95_ms(self, clave):
+        """p95 de las últimas latencias de una tabla/operación (None si hay pocas)"""
+        muestras = self._latencias.get(clave)
+        if not muestras or len(muestras) < self.hedge_min_muestras:
+            return None
+        ordenadas = sorted(muestras)
+        return ordenadas[int(len(ordenadas) * 0.95)]
+
+    def _registrar_latencia(self, clave, ms):
+        with self._bloqueo:
+            self._latencias.setdefault(clave, deque(maxlen=200)).append(ms)
+
+    def ejecutar(self, funcion, tabla, operacion):
+        """Ejecutar funcion (un execute()) con plazo, reintentos, hedging y cortacircuitos"""
+        if not self.activa:
+            return funcion()
+        self._contar("peticiones")
+        limite = getattr(_contexto, "limite", None)
+        limite = min(limite, time.monotonic() + self.plazo_s) if limite is not None else time.monotonic() + self.plazo_s
+        lectura = operacion == "select"
+        intentos = 1 + (self.reintentos if lectura else 0)
+
+        circuito = self.circuito
+        if not circuito.permitir():
+            self._contar("rechazos_circuito")
+            raise CircuitoAbierto(f"Base de datos no disponible (circuito abierto, "
+                                  f"{circuito.restante_s():.0f}s para reintentar)")
+        # El circuito cuenta llamadas fallidas, no intentos: errores sueltos que
+        # un reintento resuelve no lo abren
+        prueba = circuito.estado != "cerrado"
+        for intento in range(intentos):
+            try:
+                if lectura:
+                    resultado = self._leer(funcion, (tabla, operacion), limite)
+                else:
+                    # Una escritura abandonada podría aplicarse igual: se espera su respuesta
+                    # (acotada por HTTP_TIMEOUT_LECTURA de pool_http)
+                    if time.monotonic() >= limite:
+                        raise PlazoVencido(f"Plazo vencido antes de enviar {operacion} en {tabla}")
+                    resultado = funcion()
+            except Exception as e:
+                time.sleep(self._tras_fallo(e, circuito, prueba, intento, intentos, limite, tabla, operacion))
+                continue
+            circuito.exito()
+            return resultado
+
+    async def ejecutar_async(self, funcion, tabla, operacion):
+        """Versión asyncio de ejecutar (await funcion()): plazo, reintentos y cortacircuitos, sin hedging"""
+        if not self.activa:
+            return await funcion()
+        self._contar("peticiones")
+        limite = time.monotonic() + self.plazo_s
+        lectura = operacion == "select"
+        intentos = 1 + (self.reintentos if lectura else 0)
+
+        circuito = self.circuito
+        if not circuito.permitir():
+            self._contar("rechazos_circuito")
+            raise CircuitoAbierto(f"Base de datos no disponible (circuito abierto, "
+                                  f"{circuito.restante_s():.0f}s para reintentar)")
+        prueba = circuito.estado != "cerrado"
+        for intento in range(intentos):
+            try:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    raise PlazoVencido(f"Plazo vencido antes de enviar {operacion} en {tabla}")
+                if lectura:
+                    try:
+                        resultado = await asyncio.wait_for(funcion(), restante)
+                    except asyncio.TimeoutError:
+                        raise PlazoVencido(f"Sin respuesta de {tabla} dentro del plazo") from None
+                else:
+                    # Una escritura abandonada podría aplicarse igual: se espera su respuesta
+                    resultado = await funcion()
+            except Exception as e:
+                await asyncio.sleep(self._tras_fallo(e, circuito, prueba, intento, intentos, limite, tabla, operacion))
+                continue
+            circuito.exito()
+            return resultado
+
+    def _tras_fallo(self, error, circuito, prueba, intento, intentos, limite, tabla, operacion):
+        """Segundos a esperar antes del próximo intento, o lanzar el error que corresponda"""
+        if not es_transitorio(error):
+            # El servidor respondió (por ejemplo un 400): está disponible
+            circuito.exito()
+            raise error
+        if isinstance(error, PlazoVencido):
+            circuito.fallo()
+            self._contar("plazos_vencidos")
+            raise error
+        espera = random.uniform(0, min(self.max_ms, self.base_ms * 2 ** intento)) / 1000
+        if prueba or intento + 1 == intentos or time.monotonic() + espera >= limite:
+            circuito.fallo()
+            self._contar("fallidas")
+            raise BaseNoDisponible(f"{operacion} en {tabla} falló tras {intento + 1} intentos: {error}") from error
+        self._contar("reintentos")
+        return espera
+
+    def _leer(self, funcion, clave, limite):
+        """Un intento de lectura, duplicado si supera el p95 de su tabla"""
+        restante = limite - time.monotonic()
+        if restante <= 0:
+            raise PlazoVencido(f"Plazo vencido antes de leer {clave[0]}")
+        original = _trabajadores.lanzar(funcion)
+        en_vuelo = [original]
+        umbral = self.p95_ms(clave) if self.hedge else None
+        if umbral is not None and umbral / 1000 < restante:
+            hechos, _ = wait(en_vuelo, timeout=umbral / 1000)
+            if not hechos:
+                self._contar("hedges")
+                en_vuelo.append(_trabajadores.lanzar(funcion))
+
+        primer_error = None
+        while en_vuelo:
+            hechos, _ = wait(en_vuelo, timeout=max(0.0, limite - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not hechos:
+                raise PlazoVencido(f"Sin respuesta de {clave[0]} dentro del plazo")
+            for futuro in hechos:
+                en_vuelo.remove(futuro)
+                if futuro.exception() is None:
+                    self._registrar_latencia(clave, (time.monotonic() - futuro.inicio) * 1000)
+                    # Ganó el hedge si su respuesta es la que se usa (aunque el original haya fallado antes)
+                    if futuro is not original:
+                        self._contar("hedges_ganados")
+                    return futuro.result()
+                primer_error = primer_error or futuro.exception()
+        raise primer_error
+
+politica = PoliticaResiliencia()
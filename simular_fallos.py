@@ -0,0 +1,127 @@
+"""Ejercicio de la política de resiliencia contra el PostgREST falso con fallos inyectados.
+
+Uso:
+    python simular_fallos.py
+    python simular_fallos.py --llamadas 400 --latencia 5 --lenta 500
+
+Cada escenario hace --llamadas reportes de historial (una petición cada uno,
+sin caché) y muestra latencias p50/p95/p99/máxima, cuántas llamadas
+respondieron, cuántas terminaron en BaseNoDisponible y los contadores de
+resiliencia (reintentos, lecturas duplicadas, rechazos del circuito):
+
+    base                    sin fallos
+    cola lenta              3% de respuestas con --lenta ms extra (más allá del p95)
+    cola lenta + hedging    lo mismo, duplicando las lecturas que pasan el p95
+    errores 20%             20% de errores de conexión de PostgREST (PGRST000-003), con reintentos
+    errores 20% sin reint.  lo mismo sin reintentos
+    caída                   todo responde PGRST00x: el circuito se abre y se falla al instante
+    plazo                   el servidor tarda 1 s y el plazo es de 0,3 s
+"""
+import os
+import time
+import random
+import argparse
+
+from servidor_postgrest import ServidorPostgrest, sembrar, CLAVE_FALSA
+from benchmark import percentil
+
+def correr(servidor, politica, nombre, funcion, llamadas):
+    """Hacer llamadas a funcion y resumir latencias, resultados y contadores"""
+    servidor.estadisticas.reiniciar()
+    politica.reiniciar()
+    tiempos, respondidas, no_disponible = [], 0, 0
+    errores = {}
+    for _ in range(llamadas):
+        inicio = time.perf_counter()
+        try:
+            funcion()
+            respondidas += 1
+        except Exception as e:
+            no_disponible += 1
+            errores[type(e).__name__] = errores.get(type(e).__name__, 0) + 1
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    contadores = politica.resumen()
+    return {
+        "escenario": nombre,
+        "p50_ms": percentil(tiempos, 50),
+        "p95_ms": percentil(tiempos, 95),
+        "p99_ms": percentil(tiempos, 99),
+        "max_ms": max(tiempos),
+        "respondidas": respondidas,
+        "no_disponible": no_disponible,
+        "errores": errores,
+        "peticiones_http": servidor.estadisticas.resumen()["peticiones"],
+        "reintentos": contadores["reintentos"],
+        "hedges": contadores["hedges"],
+        "hedges_ganados": contadores["hedges_ganados"],
+        "rechazos_circuito": contadores["rechazos_circuito"]
+    }
+
+def imprimir(filas):
+    print(f"\n{'escenario':24} {'p50':>8} {'p95':>8} {'p99':>8} {'máx':>8} {'ok':>5} {'caídas':>7} "
+          f"{'http':>6} {'reint':>6} {'hedge':>6} {'ganó':>5} {'circ':>5}")
+    print("-" * 108)
+    for f in filas:
+        print(f"{f['escenario']:24} {f['p50_ms']:8.1f} {f['p95_ms']:8.1f} {f['p99_ms']:8.1f} {f['max_ms']:8.1f} "
+              f"{f['respondidas']:5} {f['no_disponible']:7} {f['peticiones_http']:6} {f['reintentos']:6} "
+              f"{f['hedges']:6} {f['hedges_ganados']:5} {f['rechazos_circuito']:5}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Plazos, reintentos, hedging y cortacircuitos con fallos inyectados")
+    parser.add_argument("--llamadas", type=int, default=200)
+    parser.add_argument("--latencia", type=float, default=5.0, help="ms de cada petición")
+    parser.add_argument("--lenta", type=float, default=300.0, help="ms extra de las respuestas lentas")
+    args = parser.parse_args()
+
+    servidor = ServidorPostgrest(latencia_ms=args.latencia).iniciar()
+    sembrar(servidor.cliente, 1000)
+    os.environ.update({"SUPABASE_URL": servidor.url, "SUPABASE_KEY": CLAVE_FALSA, "BD_BACKEND": "supabase"})
+    for tabla in ("DUENO", "MASCOTA", "VETERINARIO", "CONSULTA"):
+        os.environ[f"CACHE_TTL_{tabla}"] = "0"
+    import operaciones as ops
+    from resiliencia import politica
+
+    azar = random.Random(7)
+    reporte = lambda: ops.reporte_historial_completo(azar.randint(1, 1000))
+    politica.configurar(circuito_fallos=5, circuito_espera_s=1.0)
+    filas = []
+
+    filas.append(correr(servidor, politica, "base", reporte, args.llamadas))
+
+    servidor.configurar_fallos(tasa_lenta=0.03, lenta_ms=args.lenta)
+    filas.append(correr(servidor, politica, "cola lenta", reporte, args.llamadas))
+    politica.configurar(hedge=True)
+    filas.append(correr(servidor, politica, "cola lenta + hedging", reporte, args.llamadas))
+    politica.configurar(hedge=False)
+
+    servidor.configurar_fallos(tasa_error=0.2)
+    filas.append(correr(servidor, politica, "errores 20%", reporte, args.llamadas))
+    reintentos = politica.reintentos
+    politica.configurar(reintentos=0)
+    filas.append(correr(servidor, politica, "errores 20% sin reint.", reporte, args.llamadas))
+    politica.configurar(reintentos=reintentos)
+
+    servidor.configurar_fallos(tasa_error=1.0)
+    filas.append(correr(servidor, politica, "caída", reporte, args.llamadas))
+    servidor.configurar_fallos()
+    # Pasada la espera, una petición de prueba (semiabierto) cierra el circuito
+    time.sleep(politica.circuito.espera_s)
+    try:
+        reporte()
+        recuperacion = "responde"
+    except Exception as e:
+        recuperacion = f"sigue sin responder ({e})"
+    estado_tras_caida = politica.circuito.estado
+
+    servidor.configurar_latencia(1000)
+    plazo = politica.plazo_s
+    politica.configurar(plazo_s=0.3)
+    filas.append(correr(servidor, politica, "plazo", reporte, min(args.llamadas, 5)))
+    politica.configurar(plazo_s=plazo)
+
+    imprimir(filas)
+    print(f"\nTras la caída (pasada la espera del circuito): {recuperacion}, circuito {estado_tras_caida}")
+    servidor.detener()
+
+if __name__ == "__main__":
+    main()
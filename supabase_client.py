@@ -1,26 +1,148 @@
 import os
+import threading
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor, wait
 from supabase import create_client, Client
 from dotenv import load_dotenv
+from cache import cache_lecturas
+import indice_busqueda
+from backend_sqlite import ClienteSQLite
+from instrumentacion import ClienteInstrumentado
+import pool_http
+import modelos
+from traductor_sql import ejecutar_sql, ErrorTraduccion
+from unidad_trabajo import UnidadTrabajo
 
 load_dotenv()
 
+# Clave primaria de cada tabla del sistema
+CLAVES_PRIMARIAS = {
+    "dueno": "id_dueno",
+    "mascota": "id_mascota",
+    "veterinario": "id_veterinario",
+    "consulta": "id_consulta"
+}
+
+# Columnas sin las cuales un registro no se envía (NOT NULL sin valor por defecto)
+OBLIGATORIAS = {
+    "dueno": ("nombre",),
+    "mascota": ("nombre", "id_dueno"),
+    "veterinario": ("nombre",),
+    "consulta": ("motivo", "id_mascota")
+}
+
+# Columnas que apuntan a otra tabla
+CLAVES_FORANEAS = {
+    "mascota": {"id_dueno": "dueno"},
+    "consulta": {"id_mascota": "mascota", "id_veterinario": "veterinario"}
+}
+
+# Perfiles de proyección: columnas que pide cada vista. Todos incluyen la
+# clave primaria (y consulta también fecha_consulta) para la paginación keyset.
+PERFILES = {
+    "dueno": {
+        "selector": "id_dueno, nombre",
+        "lista": "id_dueno, nombre, telefono, email",
+        "detalle": "*",
+        "reporte": "*"
+    },
+    "mascota": {
+        "selector": "id_mascota, nombre, dueno(nombre)",
+        "lista": "id_mascota, nombre, especie, id_dueno, dueno(nombre)",
+        "detalle": "*, dueno(nombre, telefono)",
+        "reporte": "*, dueno(*), consulta(*, veterinario(nombre, especialidad))"
+    },
+    "veterinario": {
+        "selector": "id_veterinario, nombre",
+        "lista": "id_veterinario, nombre, especialidad, telefono",
+        "detalle": "*",
+        "reporte": "*"
+    },
+    "consulta": {
+        "selector": "id_consulta, fecha_consulta, motivo",
+        "lista": "id_consulta, fecha_consulta, mascota(nombre), veterinario(nombre)",
+        "detalle": "*, mascota(nombre, especie), veterinario(nombre)",
+        "reporte": "*, veterinario(nombre, especialidad)"
+    }
+}
+
+def proyeccion(tabla, perfil):
+    """Columnas del perfil de una tabla"""
+    try:
+        return PERFILES[tabla][perfil]
+    except KeyError:
+        raise ValueError(f"Perfil '{perfil}' no definido para la tabla {tabla}")
+
+# Filas por inserción multi-fila
+TAMANO_LOTE = 500
+
+# Segundos que espera cada prueba de tabla antes de darla por caída
+TIMEOUT_PRUEBA = float(os.getenv("TIMEOUT_PRUEBA", "5"))
+
+def en_lotes(registros, tamano_lote):
+    """Agrupar un iterable en listas de hasta tamano_lote elementos"""
+    iterador = iter(registros)
+    while True:
+        lote = list(islice(iterador, tamano_lote))
+        if not lote:
+            return
+        yield lote
+
 class ConexionBD:
+    """Conexión a la base de datos, segura para compartir entre hilos.
+
+    El cliente se crea una sola vez aunque varios hilos lo pidan a la vez, y
+    todas las peticiones salen por el pool HTTP compartido (ver pool_http)."""
+
     def __init__(self):
+        # BD_BACKEND=sqlite usa una base local (SQLITE_RUTA) en lugar de Supabase
+        self.backend = os.getenv("BD_BACKEND", "supabase").lower()
+        self.ruta_sqlite = os.getenv("SQLITE_RUTA", "veterinaria.db")
         self.url = os.getenv("SUPABASE_URL")
         self.key = os.getenv("SUPABASE_KEY")
-        self.client: Client = None
-        self.conectar()
+        # El cliente se crea en el primer uso de self.client
+        self._client: Client = None
+        self._intentado = False
+        self._bloqueo = threading.RLock()
+        # INSERT/UPDATE/DELETE heredados se acumulan y se envían agrupados
+        self.unidad_trabajo = UnidadTrabajo(lambda: self.client, CLAVES_PRIMARIAS, OBLIGATORIAS, TAMANO_LOTE)
+    
+    @property
+    def client(self):
+        """Cliente de Supabase, creado la primera vez que se necesita"""
+        if not self._intentado:
+            with self._bloqueo:
+                if not self._intentado:
+                    self.conectar()
+                    self._intentado = True
+        return self._client
+    
+    @client.setter
+    def client(self, valor):
+        self._client = valor
+        self._intentado = True
     
     def conectar(self):
-        """Establecer conexión con Supabase"""
+        """Establecer conexión con Supabase (o con la base SQLite local)"""
+        with self._bloqueo:
+            self._conectar()
+    
+    def _conectar(self):
         try:
+            if self.backend == "sqlite":
+                print(f"🔗 Abriendo base local SQLite ({self.ruta_sqlite})...")
+                self.client = ClienteInstrumentado(ClienteSQLite(self.ruta_sqlite))
+                print("✅ Base local lista")
+                return
+            
             if not self.url or not self.key:
                 raise ValueError("❌ Faltan variables de entorno en .env")
             
             print("🔗 Conectando a Supabase...")
             
             
-            self.client = create_client(self.url, self.key)
+            # Todas las peticiones pasan por la capa de métricas y por el pool compartido
+            self.client = ClienteInstrumentado(pool_http.instalar(create_client(self.url, self.key)))
             print("✅ Cliente Supabase creado exitosamente")
             
         except Exception as e:
@@ -29,62 +151,102 @@ class ConexionBD:
     
     def cerrar_conexion(self):
         """Cerrar conexión (en Supabase no es necesario, pero mantenemos la interfaz)"""
+        self.confirmar()
         print("🔒 Conexión finalizada")
     
     def ejecutar_consulta(self, consulta, parametros=None):
-        """Ejecutar consulta SELECT - Mantenemos compatibilidad con tu código original"""
+        """Ejecutar consulta SELECT heredada (Oracle), traducida a PostgREST (ver traductor_sql)"""
         if not self.client:
             print("❌ No hay conexión a la base de datos.")
             return []
         
         try:
-            # Para compatibilidad con tu código Oracle original
-            # En Supabase las consultas son diferentes
-            if "SELECT" in consulta.upper():
-                # Extraer tabla de la consulta SELECT básica
-                if "FROM" in consulta.upper():
-                    parts = consulta.upper().split("FROM")
-                    if len(parts) > 1:
-                        tabla = parts[1].strip().split()[0].lower()
-                        return self.client.table(tabla).select("*").execute().data
+            # Las escrituras pendientes se envían antes para que la consulta las vea
+            self.unidad_trabajo.confirmar()
+            return ejecutar_sql(self.client, consulta, parametros)
+        except ErrorTraduccion as e:
+            print(f"❌ Consulta no soportada: {e}")
             return []
         except Exception as e:
             print(f"❌ Error al ejecutar la consulta: {e}")
             return []
     
     def ejecutar_instruccion(self, consulta, parametros=None):
-        """Ejecutar INSERT, UPDATE, DELETE - Mantenemos compatibilidad"""
+        """Guardar un INSERT, UPDATE o DELETE heredado para enviarlo agrupado (ver unidad_trabajo).
+
+        Devuelve una InstruccionPendiente cuyas filas afectadas se completan
+        al confirmar(), o None si la instrucción no se puede traducir."""
         if not self.client:
             print("❌ No hay conexión a la base de datos.")
-            return
+            return None
         
         try:
-            print("✅ Instrucción ejecutada correctamente (modo compatibilidad)")
+            return self.unidad_trabajo.agregar(consulta, parametros)
+        except ErrorTraduccion as e:
+            print(f"❌ Instrucción no soportada: {e}")
+            return None
         except Exception as e:
             print(f"❌ Error al ejecutar la instrucción: {e}")
+            return None
     
-    def probar_tablas(self):
-        """Probar acceso a las tablas"""
+    def confirmar(self):
+        """Enviar las instrucciones pendientes; devuelve filas, peticiones y ms del envío"""
+        return self.unidad_trabajo.confirmar()
+    
+    def descartar(self):
+        """Descartar las instrucciones todavía no enviadas.
+
+        No es un rollback: lo que ya se envió solo (por tiempo, por cantidad
+        o antes de un ejecutar_consulta) queda escrito."""
+        cantidad = self.unidad_trabajo.descartar()
+        if cantidad:
+            print(f"↩️ {cantidad} instrucciones descartadas")
+        return cantidad
+    
+    # Nombre de la conexión Oracle original. rollback no tiene equivalente:
+    # las escrituras pueden haberse enviado ya (ver descartar)
+    commit = confirmar
+    
+    def _probar_tabla(self, tabla):
+        """Consulta mínima sobre una tabla (solo la clave primaria de una fila)"""
+        response = self.client.table(tabla).select(CLAVES_PRIMARIAS.get(tabla, "*")).limit(1).execute()
+        return {
+            "conectada": True,
+            "registros": len(response.data),
+            "data": response.data
+        }
+    
+    def probar_tablas(self, tablas=None, timeout=TIMEOUT_PRUEBA):
+        """Probar acceso a las tablas (todas en paralelo, con tiempo límite por prueba)"""
         if not self.client:
             print("❌ No hay conexión disponible")
             return False
         
-        tablas = ["dueno", "mascota", "veterinario", "consulta"]
+        tablas = tablas or ["dueno", "mascota", "veterinario", "consulta"]
         resultados = {}
         
         print("\n🔍 Probando acceso a tablas...")
         print("-" * 40)
         
-        for tabla in tablas:
-            try:
-                # Intentar consulta simple
-                response = self.client.table(tabla).select("*").limit(1).execute()
+        ejecutor = ThreadPoolExecutor(max_workers=len(tablas))
+        futuros = {tabla: ejecutor.submit(self._probar_tabla, tabla) for tabla in tablas}
+        wait(futuros.values(), timeout=timeout)
+        # Las pruebas colgadas no retienen el arranque
+        ejecutor.shutdown(wait=False)
+        
+        for tabla, futuro in futuros.items():
+            if not futuro.done():
                 resultados[tabla] = {
-                    "conectada": True,
-                    "registros": len(response.data),
-                    "data": response.data
+                    "conectada": False,
+                    "error": f"Sin respuesta en {timeout}s",
+                    "data": []
                 }
-                print(f"   ✅ {tabla}: CONECTADA ({len(response.data)} registros)")
+                print(f"   ❌ {tabla}: SIN RESPUESTA ({timeout}s)")
+                continue
+            
+            try:
+                resultados[tabla] = futuro.result()
+                print(f"   ✅ {tabla}: CONECTADA ({resultados[tabla]['registros']} registros)")
                 
             except Exception as e:
                 resultados[tabla] = {
@@ -111,16 +273,54 @@ class ConexionBD:
             return None
         try:
             resultado = self.client.table(tabla).insert(datos).execute()
+            for fila in resultado.data or []:
+                cache_lecturas.invalidar(tabla, fila)
+            indice_busqueda.desactualizar(tabla)
             return resultado.data
         except Exception as e:
             print(f"❌ Error insertando en {tabla}: {e}")
             return None
     
-    def seleccionar(self, tabla, campos="*", filtros=None, orden=None, limite=None):
-        """Seleccionar datos de una tabla"""
+    def insertar_lote(self, tabla, registros, tamano_lote=TAMANO_LOTE):
+        """Insertar registros en lotes multi-fila.
+
+        Devuelve {"ids": [...], "errores": [...]}: los IDs generados en el orden
+        de entrada (None para las filas de un lote fallido) y un error por lote.
+        """
+        resultado = {"ids": [], "errores": []}
+        campo_id = CLAVES_PRIMARIAS.get(tabla, "id")
+        inicio = 0
+        
+        for numero, lote in enumerate(en_lotes(registros, tamano_lote)):
+            try:
+                if not self.client:
+                    raise ConnectionError("No hay conexión a la base de datos")
+                # PostgREST devuelve las filas insertadas en el orden enviado
+                filas = self.client.table(tabla).insert(lote).execute().data
+                resultado["ids"].extend(fila[campo_id] for fila in filas)
+            except Exception as e:
+                print(f"❌ Error insertando lote {numero} en {tabla}: {e}")
+                resultado["ids"].extend([None] * len(lote))
+                resultado["errores"].append({
+                    "lote": numero,
+                    "desde": inicio,
+                    "cantidad": len(lote),
+                    "error": str(e)
+                })
+            inicio += len(lote)
+        
+        if any(id_fila is not None for id_fila in resultado["ids"]):
+            cache_lecturas.invalidar(tabla, solo_altas=True)
+            indice_busqueda.desactualizar(tabla)
+        return resultado
+    
+    def seleccionar(self, tabla, campos="*", filtros=None, orden=None, limite=None, perfil=None):
+        """Seleccionar datos de una tabla (perfil reemplaza a campos, ver PERFILES)"""
         if not self.client:
             return []
         try:
+            if perfil:
+                campos = proyeccion(tabla, perfil)
             consulta = self.client.table(tabla).select(campos)
             
             if filtros:
@@ -134,7 +334,7 @@ class ConexionBD:
                 consulta = consulta.limit(limite)
             
             resultado = consulta.execute()
-            return resultado.data
+            return modelos.convertir(tabla, resultado.data)
         except Exception as e:
             print(f"❌ Error seleccionando de {tabla}: {e}")
             return []
@@ -145,12 +345,15 @@ class ConexionBD:
             return None
         try:
             # Determinar el campo ID según la tabla
-            campo_id = "id_dueno" if tabla == "dueno" else \
-                      "id_mascota" if tabla == "mascota" else \
-                      "id_veterinario" if tabla == "veterinario" else \
-                      "id_consulta" if tabla == "consulta" else "id"
+            campo_id = CLAVES_PRIMARIAS.get(tabla, "id")
+            # Un ID temporal del diario se traduce al del servidor (diario importa este módulo)
+            import diario
+            id_valor = diario.resolver_id(tabla, id_valor)
             
             resultado = self.client.table(tabla).update(nuevos_datos).eq(campo_id, id_valor).execute()
+            # Los campos modificados pueden mover la fila de grupo: se descarta toda la tabla
+            cache_lecturas.invalidar(tabla)
+            indice_busqueda.desactualizar(tabla)
             return resultado.data
         except Exception as e:
             print(f"❌ Error actualizando {tabla}: {e}")
@@ -162,29 +365,44 @@ class ConexionBD:
             return None
         try:
             # Determinar el campo ID según la tabla
-            campo_id = "id_dueno" if tabla == "dueno" else \
-                      "id_mascota" if tabla == "mascota" else \
-                      "id_veterinario" if tabla == "veterinario" else \
-                      "id_consulta" if tabla == "consulta" else "id"
+            campo_id = CLAVES_PRIMARIAS.get(tabla, "id")
+            # Un ID temporal del diario se traduce al del servidor (diario importa este módulo)
+            import diario
+            id_valor = diario.resolver_id(tabla, id_valor)
             
             resultado = self.client.table(tabla).delete().eq(campo_id, id_valor).execute()
+            cache_lecturas.invalidar(tabla, cascada=True)
+            indice_busqueda.desactualizar(tabla)
             return resultado.data
         except Exception as e:
             print(f"❌ Error eliminando de {tabla}: {e}")
             return None
 
-# Crear instancia global
-try:
-    conexion = ConexionBD()
-    supabase = conexion.client
-    db = conexion  # Para compatibilidad con tu código original
-except Exception as e:
-    print(f"❌ Error inicializando conexión: {e}")
-    supabase = None
-    db = None
-
-def test_conexion():
-    """Función para probar la conexión - compatible con tu main.py"""
+class _ClienteDiferido:
+    """Ocupa el lugar del cliente de Supabase y lo crea al usarlo por primera vez"""
+    
+    def __init__(self, conexion):
+        self._conexion = conexion
+    
+    def __getattr__(self, nombre):
+        cliente = self._conexion.client
+        if cliente is None:
+            raise ConnectionError("No hay conexión a la base de datos")
+        return getattr(cliente, nombre)
+    
+    def __bool__(self):
+        return self._conexion.client is not None
+
+# Instancia global: importar el módulo ya no abre la conexión
+conexion = ConexionBD()
+supabase = _ClienteDiferido(conexion)
+db = conexion  # Para compatibilidad con tu código original
+
+def test_conexion(rapido=False):
+    """Función para probar la conexión - compatible con tu main.py.
+    
+    En modo rápido solo se prueba una tabla (una petición).
+    """
     if not supabase:
         print("❌ No se pudo inicializar Supabase")
         return False
@@ -193,13 +411,13 @@ def test_conexion():
     print("🔍 VERIFICACIÓN DE CONEXIÓN A SUPABASE")
     print("="*50)
     
-    resultados = conexion.probar_tablas()
+    resultados = conexion.probar_tablas(["dueno"] if rapido else None)
     
     # Verificar si al menos una tabla funciona
     tablas_conectadas = sum(1 for r in resultados.values() if r.get("conectada"))
     
     if tablas_conectadas > 0:
-        print(f"\n🎉 ¡CONEXIÓN EXITOSA! {tablas_conectadas}/4 tablas accesibles")
+        print(f"\n🎉 ¡CONEXIÓN EXITOSA! {tablas_conectadas}/{len(resultados)} tablas accesibles")
         
         # Mostrar resumen de datos
         print("\n📊 RESUMEN DE DATOS:")
@@ -1,6 +1,7 @@
 import os
 from supabase import create_client
 from dotenv import load_dotenv
+import pool_http
 
 load_dotenv()
 
@@ -13,8 +14,8 @@ def test_simple():
         print(f"URL: {url}")
         print(f"KEY: {key[:20]}...")  # Mostrar solo parte de la key por seguridad
         
-        # Crear cliente
-        client = create_client(url, key)
+        # Crear cliente (con el mismo pool de conexiones que la aplicación)
+        client = pool_http.instalar(create_client(url, key))
         
         # Probar consulta simple
         response = client.table("dueno").select("*").limit(1).execute()
@@ -0,0 +1,43 @@
+"""Pruebas de operaciones_async contra el PostgREST falso.
+
+    python -m pytest -q test_operaciones_async.py
+"""
+import os
+import gc
+import asyncio
+import unittest
+
+from servidor_postgrest import ServidorPostgrest, sembrar, CLAVE_FALSA
+import operaciones_async as ops
+
+class PruebasConexionPorBucle(unittest.TestCase):
+
+    def setUp(self):
+        self.servidor = ServidorPostgrest().iniciar()
+        sembrar(self.servidor.cliente, 5)
+        self.entorno = {nombre: os.environ.get(nombre) for nombre in ("SUPABASE_URL", "SUPABASE_KEY")}
+        os.environ.update({"SUPABASE_URL": self.servidor.url, "SUPABASE_KEY": CLAVE_FALSA})
+
+    def tearDown(self):
+        for nombre, valor in self.entorno.items():
+            if valor is None:
+                os.environ.pop(nombre, None)
+            else:
+                os.environ[nombre] = valor
+        self.servidor.detener()
+
+    def test_cada_asyncio_run_libera_su_conexion(self):
+        async def usar():
+            # Varias tareas a la vez comparten una sola conexión del bucle
+            clientes = await asyncio.gather(*(ops.obtener_cliente() for _ in range(5)))
+            self.assertEqual(len({id(c) for c in clientes}), 1)
+            self.assertEqual(len(ops._conexiones), 1)
+            return (await ops._ejecutar((await ops._tabla("dueno")).select("id_dueno"))).data
+
+        for _ in range(5):
+            self.assertEqual(len(asyncio.run(usar())), 5)
+        gc.collect()
+        self.assertEqual(len(ops._conexiones), 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+"""Pruebas de la sincronización de la réplica local contra el PostgREST falso.
+
+Usan el cliente real de Supabase (y su postgrest-py) contra
+servidor_postgrest, así se prueba cómo la librería arma los rangos.
+
+    python -m pytest -q test_replica.py
+"""
+import unittest
+
+from supabase import create_client
+
+from servidor_postgrest import ServidorPostgrest, sembrar, CLAVE_FALSA
+from replica import Replica
+
+class PruebasSincronizacion(unittest.TestCase):
+
+    def setUp(self):
+        self.servidor = ServidorPostgrest().iniciar()
+        sembrar(self.servidor.cliente, 10)
+        self.cliente = create_client(self.servidor.url, CLAVE_FALSA)
+
+    def tearDown(self):
+        self.servidor.detener()
+
+    def _insertar_consultas(self, cantidad, fecha):
+        self.servidor.cliente.table("consulta").insert(
+            [{"motivo": "control", "id_mascota": 1, "fecha_consulta": fecha} for _ in range(cantidad)]).execute()
+
+    def _total(self, tabla):
+        return len(self.servidor.cliente.table(tabla).select("*").execute().data)
+
+    def test_cambios_de_mas_de_una_pagina_por_columna_de_cambio(self):
+        replica = Replica(lambda: self.cliente, columna_cambio="fecha_consulta", tamano_pagina=100)
+        replica.sincronizar(["consulta"])
+        # 250 filas con la misma marca: tres páginas y empates en la columna de cambio
+        self._insertar_consultas(250, "2999-01-01T00:00:00+00:00")
+        replica.sincronizar(["consulta"], forzar=True)
+        self.assertEqual(replica.estadisticas["deltas"], 1)
+        self.assertEqual(len(replica.tablas["consulta"].filas), self._total("consulta"))
+
+    def test_altas_de_mas_de_una_pagina_por_id(self):
+        replica = Replica(lambda: self.cliente, tamano_pagina=100)
+        replica.sincronizar(["consulta"])
+        self._insertar_consultas(250, "2024-01-01T00:00:00+00:00")
+        replica.sincronizar(["consulta"], forzar=True)
+        self.assertEqual(len(replica.tablas["consulta"].filas), self._total("consulta"))
+
+if __name__ == "__main__":
+    unittest.main()
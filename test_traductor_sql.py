@@ -0,0 +1,204 @@
+"""Pruebas del traductor de SQL heredado y de la unidad de trabajo.
+
+No necesitan Supabase: las peticiones se arman con el cliente de postgrest
+sin enviarlas y las instrucciones se envían al backend SQLite en memoria.
+
+    python -m pytest -q test_traductor_sql.py
+    python -m unittest test_traductor_sql
+"""
+import unittest
+
+from postgrest import SyncPostgrestClient
+
+from traductor_sql import (compilar, compilar_instruccion, vincular, construir, ErrorTraduccion)
+from unidad_trabajo import UnidadTrabajo
+from backend_sqlite import ClienteSQLite
+from supabase_client import CLAVES_PRIMARIAS, OBLIGATORIAS
+
+def _parametros(sql, parametros=None):
+    """Parámetros de la URL que arma el traductor, como lista de (nombre, valor)"""
+    cliente = SyncPostgrestClient("http://localhost")
+    return construir(cliente, compilar(sql), parametros).params.multi_items()
+
+class PruebasAnalisis(unittest.TestCase):
+
+    def test_columnas_alias_y_prefijo_de_tabla(self):
+        plantilla = compilar("SELECT d.nombre AS dueno, d.TELEFONO FROM dueno d WHERE d.id_dueno = 1")
+        self.assertEqual(plantilla.tabla, "dueno")
+        self.assertEqual(plantilla.columnas, "dueno:nombre, telefono")
+        self.assertEqual(plantilla.condiciones, (("id_dueno", "eq", (("literal", 1),)),))
+
+    def test_comillas_en_textos_e_identificadores(self):
+        plantilla = compilar("""SELECT "Nombre" FROM dueno WHERE nombre = 'O''Brien'""")
+        self.assertEqual(plantilla.columnas, "Nombre")
+        self.assertEqual(plantilla.condiciones, (("nombre", "eq", (("literal", "O'Brien"),)),))
+
+    def test_parametros_posicionales_y_con_nombre(self):
+        posicional = compilar("SELECT * FROM mascota WHERE id_dueno = :1 AND especie = :2")
+        self.assertEqual(posicional.parametros, ("1", "2"))
+        self.assertEqual(vincular(posicional, [7, "Gato"]), {"1": 7, "2": "Gato"})
+        self.assertEqual(vincular(posicional, {1: 7, 2: "Gato"}), {"1": 7, "2": "Gato"})
+
+        nombrado = compilar("SELECT * FROM mascota WHERE id_dueno = :dueno AND id_mascota >= :dueno")
+        # Un nombre repetido es un solo parámetro
+        self.assertEqual(nombrado.parametros, ("dueno",))
+        self.assertEqual(vincular(nombrado, {"dueno": 3}), {"dueno": 3})
+
+    def test_in_between_y_null(self):
+        self.assertEqual(_parametros("SELECT * FROM mascota WHERE id_mascota IN (1, 2, 3)"),
+                         [("select", "*"), ("id_mascota", "in.(1,2,3)")])
+        self.assertEqual(_parametros("SELECT * FROM mascota WHERE id_mascota NOT IN (:ids)", {"ids": [4, 5]}),
+                         [("select", "*"), ("id_mascota", "not.in.(4,5)")])
+        self.assertEqual(_parametros("SELECT * FROM consulta WHERE id_mascota BETWEEN :1 AND :2", [1, 9]),
+                         [("select", "*"), ("id_mascota", "gte.1"), ("id_mascota", "lte.9")])
+        self.assertEqual(_parametros("SELECT * FROM mascota WHERE raza IS NULL AND especie IS NOT NULL"),
+                         [("select", "*"), ("raza", "is.null"), ("especie", "not.is.null")])
+        # "= NULL" se traduce a IS NULL, también con un parámetro nulo
+        self.assertEqual(_parametros("SELECT * FROM mascota WHERE raza = :1", [None]),
+                         [("select", "*"), ("raza", "is.null")])
+
+    def test_orden_offset_y_fetch(self):
+        self.assertEqual(
+            _parametros("SELECT nombre FROM dueno ORDER BY nombre DESC, id_dueno "
+                        "OFFSET 20 ROWS FETCH NEXT 10 ROWS ONLY"),
+            [("select", "nombre"), ("order", "nombre.desc"), ("order", "id_dueno"),
+             ("limit", "10"), ("offset", "20")])
+        self.assertEqual(_parametros("SELECT * FROM dueno LIMIT :1 OFFSET :2", [5, 15]),
+                         [("select", "*"), ("limit", "5"), ("offset", "15")])
+
+    def test_conteo(self):
+        plantilla = compilar("SELECT COUNT(*) AS total FROM consulta WHERE id_veterinario = 2")
+        self.assertEqual(plantilla.conteo, "total")
+        self.assertIn(("limit", "0"), _parametros("SELECT COUNT(*) FROM consulta"))
+
+    def test_instrucciones(self):
+        insercion = compilar_instruccion("INSERT INTO dueno (nombre, telefono) VALUES ('Ana', :1), ('Beto', NULL)")
+        self.assertEqual(insercion.columnas, ("nombre", "telefono"))
+        self.assertEqual(insercion.filas, ((("literal", "Ana"), ("parametro", "1")),
+                                           (("literal", "Beto"), ("literal", None))))
+        actualizacion = compilar_instruccion("UPDATE dueno d SET d.email = :1 WHERE d.id_dueno = :2")
+        self.assertEqual(actualizacion.asignaciones, (("email", ("parametro", "1")),))
+        borrado = compilar_instruccion("DELETE FROM mascota WHERE id_mascota IN (1, 2)")
+        self.assertEqual(borrado.operacion, "delete")
+
+    def test_mensajes_de_error(self):
+        casos = {
+            "SELECT * FROM dueno WHERE id_dueno = 1 OR id_dueno = 2": "OR no está soportado",
+            "SELECT * FROM dueno, mascota": "Las uniones no se traducen",
+            "SELECT m.nombre FROM mascota x": "Columna no soportada: m.nombre",
+            "SELECT nombre, COUNT(*) FROM dueno": "COUNT(*) no se puede combinar",
+            "SELECT * FROM dueno ORDER BY nombre DESC NULLS LAST": "DESC NULLS LAST no está soportado",
+            "SELECT * FROM dueno WHERE nombre NOT = 'x'": "NOT solo se admite con LIKE o IN",
+            "SELECT * FROM dueno GROUP BY nombre": "Parte de la consulta no soportada: 'GROUP'",
+            "SELECT * FROM dueno WHERE": "La consulta termina antes de tiempo",
+            "SELECT * FROM dueno WHERE nombre = 'x' @": "Texto no reconocido",
+            "UPDATE dueno SET nombre = 'x'": "Se esperaba WHERE",
+            "INSERT INTO dueno VALUES ('x')": "INSERT necesita la lista de columnas",
+            "INSERT INTO dueno (nombre, email) VALUES ('x')": "Se esperaban 2 valores y llegaron 1",
+        }
+        for sql, mensaje in casos.items():
+            with self.subTest(sql=sql):
+                with self.assertRaises(ErrorTraduccion) as error:
+                    compilar_instruccion(sql) if not sql.startswith("SELECT") else compilar(sql)
+                self.assertIn(mensaje, str(error.exception))
+
+    def test_errores_de_parametros(self):
+        plantilla = compilar("SELECT * FROM dueno WHERE id_dueno = :1 AND nombre = :nombre")
+        with self.assertRaisesRegex(ErrorTraduccion, "Faltan los parámetros: :1, :nombre"):
+            vincular(plantilla, None)
+        with self.assertRaisesRegex(ErrorTraduccion, "Se esperaban 2 parámetros y llegaron 1"):
+            vincular(plantilla, [1])
+        with self.assertRaisesRegex(ErrorTraduccion, "Falta el parámetro :nombre"):
+            vincular(plantilla, {1: 1})
+
+class _ClienteContado:
+    """Cliente SQLite que anota (tabla, operación) de cada petición enviada"""
+
+    def __init__(self):
+        self.cliente = ClienteSQLite(":memory:")
+        self.peticiones = []
+
+    def table(self, tabla):
+        consulta = self.cliente.table(tabla)
+        ejecutar = consulta.execute
+
+        def execute():
+            self.peticiones.append((tabla, consulta._operacion))
+            return ejecutar()
+        consulta.execute = execute
+        return consulta
+
+class PruebasUnidadTrabajo(unittest.TestCase):
+
+    def setUp(self):
+        self.cliente = _ClienteContado()
+        self.unidad = UnidadTrabajo(lambda: self.cliente, CLAVES_PRIMARIAS, OBLIGATORIAS,
+                                    tamano_lote=500, max_pendientes=500, max_espera=0)
+
+    def _filas(self, tabla, orden):
+        return self.cliente.cliente.table(tabla).select("*").order(orden).execute().data
+
+    def test_inserts_de_una_tabla_van_en_una_peticion(self):
+        pendientes = [self.unidad.agregar("INSERT INTO dueno (nombre) VALUES (:1)", [f"d{i}"]) for i in range(50)]
+        resumen = self.unidad.confirmar()
+        self.assertEqual((resumen["instrucciones"], resumen["peticiones"]), (50, 1))
+        self.assertTrue(all(p.filas == 1 for p in pendientes))
+
+    def test_updates_con_el_mismo_set_usan_in(self):
+        for i in range(5):
+            self.unidad.agregar("INSERT INTO dueno (nombre) VALUES (:1)", [f"d{i}"])
+        self.unidad.confirmar()
+        self.cliente.peticiones.clear()
+        for i in range(1, 6):
+            self.unidad.agregar("UPDATE dueno SET email = 'x@y' WHERE id_dueno = :1", [i])
+        self.assertEqual(self.unidad.confirmar()["peticiones"], 1)
+        self.assertEqual({f["email"] for f in self._filas("dueno", "id_dueno")}, {"x@y"})
+
+    def test_updates_con_set_distintos_no_recrean_filas_borradas(self):
+        for i in range(3):
+            self.unidad.agregar("INSERT INTO dueno (nombre) VALUES (:1)", [f"d{i}"])
+        self.unidad.confirmar()
+        pendientes = [self.unidad.agregar("UPDATE dueno SET email = :1 WHERE id_dueno = :2", [f"d{i}@x", i])
+                      for i in (1, 2, 3)]
+        # Otro cliente borra una de las filas antes del envío
+        self.cliente.cliente.table("dueno").delete().eq("id_dueno", 2).execute()
+        self.unidad.confirmar()
+        self.assertEqual([p.filas for p in pendientes], [1, 0, 1])
+        self.assertEqual([(f["id_dueno"], f["email"]) for f in self._filas("dueno", "id_dueno")],
+                         [(1, "d1@x"), (3, "d3@x")])
+
+    def test_delete_no_se_adelanta_a_un_insert_de_la_misma_tabla(self):
+        self.unidad.agregar("INSERT INTO dueno (nombre) VALUES ('a')")
+        self.unidad.agregar("DELETE FROM dueno WHERE nombre = 'a'")
+        self.unidad.agregar("INSERT INTO dueno (nombre) VALUES ('a')")
+        self.unidad.confirmar()
+        # Como al ejecutarlas en orden: queda solo la segunda inserción
+        self.assertEqual(len(self._filas("dueno", "id_dueno")), 1)
+
+    def test_el_orden_entre_tablas_relacionadas_se_respeta(self):
+        self.unidad.agregar("INSERT INTO dueno (id_dueno, nombre) VALUES (1, 'a')")
+        self.unidad.agregar("INSERT INTO mascota (nombre, id_dueno) VALUES ('m1', 1)")
+        self.unidad.agregar("INSERT INTO dueno (id_dueno, nombre) VALUES (2, 'b')")
+        self.unidad.agregar("INSERT INTO mascota (nombre, id_dueno) VALUES ('m2', 2)")
+        self.unidad.confirmar()
+        # El dueño 2 nunca viaja antes que la mascota 1 ni la mascota 2 antes que su dueño
+        self.assertEqual(self.cliente.peticiones, [("dueno", "insert"), ("mascota", "insert"),
+                                                   ("dueno", "insert"), ("mascota", "insert")])
+        self.assertEqual([f["id_dueno"] for f in self._filas("mascota", "id_mascota")], [1, 2])
+
+    def test_tablas_sin_relacion_siguen_agrupadas(self):
+        for i in range(3):
+            self.unidad.agregar("INSERT INTO dueno (nombre) VALUES (:1)", [f"d{i}"])
+            self.unidad.agregar("INSERT INTO veterinario (nombre) VALUES (:1)", [f"v{i}"])
+        self.assertEqual(self.unidad.confirmar()["peticiones"], 2)
+
+    def test_descartar_solo_olvida_lo_no_enviado(self):
+        self.unidad.agregar("INSERT INTO dueno (nombre) VALUES ('enviado')")
+        self.unidad.confirmar()
+        pendiente = self.unidad.agregar("INSERT INTO dueno (nombre) VALUES ('descartado')")
+        self.assertEqual(self.unidad.descartar(), 1)
+        self.assertEqual(pendiente.error, "descartada")
+        self.assertEqual([f["nombre"] for f in self._filas("dueno", "id_dueno")], ["enviado"])
+
+if __name__ == "__main__":
+    unittest.main()
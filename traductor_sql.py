@@ -0,0 +1,411 @@
+"""Traducción de las consultas SQL heredadas (Oracle) a peticiones PostgREST.
+
+Subconjunto soportado:
+
+    SELECT { * | COUNT(*) [AS alias] | columna [AS alias], ... }
+    FROM tabla [alias]
+    [WHERE condicion [AND condicion ...]]
+    [ORDER BY columna [ASC | DESC] [NULLS FIRST | NULLS LAST], ...]
+    [OFFSET n ROWS] [FETCH { FIRST | NEXT } n ROWS ONLY]      (o LIMIT n [OFFSET m])
+
+    condicion: columna { = | <> | != | < | <= | > | >= } valor
+             | columna [NOT] LIKE valor
+             | columna IS [NOT] NULL
+             | columna [NOT] IN (valor, ...)
+             | columna BETWEEN valor AND valor
+    valor:     número, 'texto', NULL o parámetro :1 / :nombre
+
+Todo se resuelve en el servidor: columnas, filtros, orden y límites. Los
+parámetros se reciben como lista (en el orden en que aparecen, como en
+cx_Oracle) o como diccionario por nombre; un parámetro con una lista sirve
+para IN (:ids). "= NULL" se traduce a IS NULL.
+
+Las instrucciones INSERT INTO tabla (columnas) VALUES (...)[, (...)],
+UPDATE tabla SET columna = valor, ... WHERE ... y DELETE FROM tabla WHERE ...
+se analizan con compilar_instruccion (ver unidad_trabajo.py, que las agrupa).
+
+Cada texto SQL se compila una sola vez (lru_cache): las llamadas repetidas
+solo vinculan los parámetros y arman la petición.
+"""
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+class ErrorTraduccion(ValueError):
+    """Consulta fuera del subconjunto soportado"""
+
+_TOKEN = re.compile(r"""\s*(?:
+      (?P<texto>'(?:[^']|'')*')
+    | (?P<parametro>:\w+)
+    | (?P<numero>\d+(?:\.\d+)?)
+    | (?P<identificador>(?:"[^"]+"|[A-Za-z_][\w$#]*)(?:\.(?:"[^"]+"|[A-Za-z_][\w$#]*|\*))*)
+    | (?P<operador><=|>=|<>|!=|=|<|>)
+    | (?P<simbolo>[(),*;-])
+    )""", re.VERBOSE)
+
+PALABRAS_RESERVADAS = {
+    "SELECT", "FROM", "WHERE", "AND", "OR", "NOT", "ORDER", "BY", "ASC", "DESC",
+    "NULLS", "FIRST", "LAST", "FETCH", "NEXT", "ROWS", "ROW", "ONLY", "OFFSET",
+    "LIMIT", "LIKE", "IS", "NULL", "IN", "BETWEEN", "AS", "JOIN", "GROUP", "HAVING", "UNION",
+    "INSERT", "INTO", "VALUES", "UPDATE", "SET", "DELETE"
+}
+
+OPERADORES = {"=": "eq", "<>": "neq", "!=": "neq", "<": "lt", "<=": "lte", ">": "gt", ">=": "gte"}
+
+Plantilla = namedtuple("Plantilla", "tabla columnas conteo condiciones ordenes limite desplazamiento parametros")
+Instruccion = namedtuple("Instruccion", "operacion tabla columnas filas asignaciones condiciones parametros")
+
+def _tokenizar(sql):
+    tokens, posicion = [], 0
+    sql = sql.strip()
+    while posicion < len(sql):
+        coincidencia = _TOKEN.match(sql, posicion)
+        if not coincidencia or coincidencia.end() == posicion:
+            raise ErrorTraduccion(f"Texto no reconocido cerca de: {sql[posicion:posicion + 20]!r}")
+        tipo = coincidencia.lastgroup
+        tokens.append((tipo, coincidencia.group(tipo)))
+        posicion = coincidencia.end()
+        while posicion < len(sql) and sql[posicion].isspace():
+            posicion += 1
+    return tokens
+
+class _Lector:
+    """Recorre los tokens de una consulta"""
+
+    def __init__(self, sql):
+        self.tokens = _tokenizar(sql)
+        self.posicion = 0
+        self.parametros = []
+
+    def ver(self):
+        return self.tokens[self.posicion] if self.posicion < len(self.tokens) else (None, None)
+
+    def tomar(self):
+        token = self.ver()
+        if token[0] is None:
+            raise ErrorTraduccion("La consulta termina antes de tiempo")
+        self.posicion += 1
+        return token
+
+    def es_palabra(self, *palabras):
+        tipo, valor = self.ver()
+        return tipo == "identificador" and valor.upper() in palabras
+
+    def aceptar_palabra(self, *palabras):
+        if self.es_palabra(*palabras):
+            return self.tomar()[1].upper()
+        return None
+
+    def esperar_palabra(self, *palabras):
+        palabra = self.aceptar_palabra(*palabras)
+        if palabra is None:
+            raise ErrorTraduccion(f"Se esperaba {' o '.join(palabras)} y llegó {self.ver()[1]!r}")
+        return palabra
+
+    def aceptar_simbolo(self, simbolo):
+        if self.ver() == ("simbolo", simbolo):
+            self.tomar()
+            return True
+        return False
+
+    def esperar_simbolo(self, simbolo):
+        if not self.aceptar_simbolo(simbolo):
+            raise ErrorTraduccion(f"Se esperaba '{simbolo}' y llegó {self.ver()[1]!r}")
+
+    def identificador(self):
+        tipo, valor = self.tomar()
+        if tipo != "identificador" or valor.upper() in PALABRAS_RESERVADAS:
+            raise ErrorTraduccion(f"Se esperaba un nombre y llegó {valor!r}")
+        return valor
+
+    def valor(self):
+        """("literal", valor) o ("parametro", nombre)"""
+        negativo = self.aceptar_simbolo("-")
+        tipo, texto = self.tomar()
+        if tipo == "numero":
+            numero = float(texto) if "." in texto else int(texto)
+            return ("literal", -numero if negativo else numero)
+        if negativo:
+            raise ErrorTraduccion(f"Número no válido: -{texto}")
+        if tipo == "texto":
+            return ("literal", texto[1:-1].replace("''", "'"))
+        if tipo == "parametro":
+            nombre = texto[1:]
+            if nombre not in self.parametros:
+                self.parametros.append(nombre)
+            return ("parametro", nombre)
+        if tipo == "identificador" and texto.upper() == "NULL":
+            return ("literal", None)
+        raise ErrorTraduccion(f"Se esperaba un valor y llegó {texto!r}")
+
+def _columna(nombre, alias_tabla):
+    """Quitar el prefijo de tabla y pasar a minúsculas los nombres sin comillas"""
+    partes = nombre.split(".")
+    if len(partes) == 2 and partes[0].strip('"').lower() in alias_tabla:
+        partes = partes[1:]
+    if len(partes) != 1:
+        raise ErrorTraduccion(f"Columna no soportada: {nombre} (las uniones no se traducen)")
+    columna = partes[0]
+    return columna[1:-1] if columna.startswith('"') else columna.lower()
+
+def _leer_condiciones(lector, alias_tabla):
+    """Condiciones unidas por AND después de WHERE"""
+    condiciones = []
+    while True:
+        columna = _columna(lector.identificador(), alias_tabla)
+        negado = bool(lector.aceptar_palabra("NOT"))
+        if negado and not lector.es_palabra("LIKE", "IN"):
+            raise ErrorTraduccion(f"NOT solo se admite con LIKE o IN ({columna})")
+        if lector.aceptar_palabra("LIKE"):
+            condiciones.append((columna, "not_like" if negado else "like", (lector.valor(),)))
+        elif lector.aceptar_palabra("IN"):
+            lector.esperar_simbolo("(")
+            valores = [lector.valor()]
+            while lector.aceptar_simbolo(","):
+                valores.append(lector.valor())
+            lector.esperar_simbolo(")")
+            condiciones.append((columna, "not_in" if negado else "in", tuple(valores)))
+        elif lector.aceptar_palabra("BETWEEN"):
+            desde = lector.valor()
+            lector.esperar_palabra("AND")
+            condiciones.append((columna, "between", (desde, lector.valor())))
+        elif lector.aceptar_palabra("IS"):
+            no_nulo = bool(lector.aceptar_palabra("NOT"))
+            lector.esperar_palabra("NULL")
+            condiciones.append((columna, "not_null" if no_nulo else "is_null", ()))
+        else:
+            tipo, operador = lector.tomar()
+            if tipo != "operador":
+                raise ErrorTraduccion(f"Condición no soportada sobre {columna}: {operador!r}")
+            condiciones.append((columna, OPERADORES[operador], (lector.valor(),)))
+        if lector.es_palabra("OR"):
+            raise ErrorTraduccion("OR no está soportado: usar IN o varias consultas")
+        if not lector.aceptar_palabra("AND"):
+            return tuple(condiciones)
+
+def _alias_tabla(lector, tabla):
+    """Nombres con los que se puede prefijar una columna: la tabla y su alias opcional"""
+    alias_tabla = {tabla}
+    tipo, valor = lector.ver()
+    if tipo == "identificador" and valor.upper() not in PALABRAS_RESERVADAS:
+        alias_tabla.add(lector.identificador().strip('"').lower())
+    return alias_tabla
+
+def _terminar(lector):
+    lector.aceptar_simbolo(";")
+    if lector.ver()[0] is not None:
+        raise ErrorTraduccion(f"Parte de la consulta no soportada: {lector.ver()[1]!r}")
+
+@lru_cache(maxsize=256)
+def compilar(sql):
+    """Analizar una consulta y devolver su Plantilla (se guarda por texto SQL)"""
+    lector = _Lector(sql)
+    lector.esperar_palabra("SELECT")
+
+    # La lista de columnas se guarda en crudo hasta conocer el alias de la tabla
+    columnas_crudas = []
+    while True:
+        if lector.aceptar_simbolo("*"):
+            columnas_crudas.append(("*", None))
+        elif lector.es_palabra("COUNT"):
+            lector.tomar()
+            lector.esperar_simbolo("(")
+            lector.esperar_simbolo("*")
+            lector.esperar_simbolo(")")
+            alias = lector.identificador() if lector.aceptar_palabra("AS") else "count"
+            columnas_crudas.append(("COUNT(*)", alias))
+        else:
+            nombre = lector.identificador()
+            alias = lector.identificador() if lector.aceptar_palabra("AS") else None
+            columnas_crudas.append((nombre, alias))
+        if not lector.aceptar_simbolo(","):
+            break
+
+    lector.esperar_palabra("FROM")
+    tabla_cruda = lector.identificador()
+    tabla = _columna(tabla_cruda, set())
+    alias_tabla = _alias_tabla(lector, tabla)
+    if lector.aceptar_simbolo(","):
+        raise ErrorTraduccion("Las uniones no se traducen: usar las funciones de operaciones")
+
+    conteo = None
+    proyeccion = []
+    for nombre, alias in columnas_crudas:
+        if nombre == "COUNT(*)":
+            conteo = alias
+        elif nombre == "*" or nombre.endswith(".*"):
+            proyeccion.append("*")
+        else:
+            columna = _columna(nombre, alias_tabla)
+            proyeccion.append(f"{alias.strip(chr(34)).lower()}:{columna}" if alias else columna)
+    if conteo and proyeccion:
+        raise ErrorTraduccion("COUNT(*) no se puede combinar con otras columnas (no hay GROUP BY)")
+
+    condiciones = _leer_condiciones(lector, alias_tabla) if lector.aceptar_palabra("WHERE") else ()
+
+    ordenes = []
+    if lector.aceptar_palabra("ORDER"):
+        lector.esperar_palabra("BY")
+        while True:
+            columna = _columna(lector.identificador(), alias_tabla)
+            desc = lector.aceptar_palabra("ASC", "DESC") == "DESC"
+            # Igual que en Oracle y PostgreSQL: nulos al final en ASC y al inicio en DESC
+            nulos_primero = desc
+            if lector.aceptar_palabra("NULLS"):
+                nulos_primero = lector.esperar_palabra("FIRST", "LAST") == "FIRST"
+            if desc and not nulos_primero:
+                raise ErrorTraduccion("DESC NULLS LAST no está soportado")
+            ordenes.append((columna, desc, nulos_primero and not desc))
+            if not lector.aceptar_simbolo(","):
+                break
+
+    limite = desplazamiento = None
+    while True:
+        if lector.aceptar_palabra("OFFSET"):
+            desplazamiento = lector.valor()
+            lector.aceptar_palabra("ROWS", "ROW")
+        elif lector.aceptar_palabra("FETCH"):
+            lector.esperar_palabra("FIRST", "NEXT")
+            limite = lector.valor()
+            lector.esperar_palabra("ROWS", "ROW")
+            lector.esperar_palabra("ONLY")
+        elif lector.aceptar_palabra("LIMIT"):
+            limite = lector.valor()
+        else:
+            break
+
+    _terminar(lector)
+    return Plantilla(tabla, ", ".join(proyeccion), conteo, tuple(condiciones), tuple(ordenes),
+                     limite, desplazamiento, tuple(lector.parametros))
+
+@lru_cache(maxsize=256)
+def compilar_instruccion(sql):
+    """Analizar un INSERT, UPDATE o DELETE y devolver su Instruccion (se guarda por texto SQL)"""
+    lector = _Lector(sql)
+    operacion = lector.esperar_palabra("INSERT", "UPDATE", "DELETE")
+    columnas, filas, asignaciones, condiciones = (), (), (), ()
+
+    if operacion == "INSERT":
+        lector.esperar_palabra("INTO")
+        tabla = _columna(lector.identificador(), set())
+        if not lector.aceptar_simbolo("("):
+            raise ErrorTraduccion("INSERT necesita la lista de columnas")
+        nombres = [_columna(lector.identificador(), {tabla})]
+        while lector.aceptar_simbolo(","):
+            nombres.append(_columna(lector.identificador(), {tabla}))
+        lector.esperar_simbolo(")")
+        columnas = tuple(nombres)
+        lector.esperar_palabra("VALUES")
+        lista = []
+        while True:
+            lector.esperar_simbolo("(")
+            valores = [lector.valor()]
+            while lector.aceptar_simbolo(","):
+                valores.append(lector.valor())
+            lector.esperar_simbolo(")")
+            if len(valores) != len(columnas):
+                raise ErrorTraduccion(f"Se esperaban {len(columnas)} valores y llegaron {len(valores)}")
+            lista.append(tuple(valores))
+            if not lector.aceptar_simbolo(","):
+                break
+        filas = tuple(lista)
+    else:
+        if operacion == "DELETE":
+            lector.aceptar_palabra("FROM")
+        tabla = _columna(lector.identificador(), set())
+        alias_tabla = _alias_tabla(lector, tabla)
+        if operacion == "UPDATE":
+            lector.esperar_palabra("SET")
+            lista = []
+            while True:
+                columna = _columna(lector.identificador(), alias_tabla)
+                tipo, operador = lector.tomar()
+                if operador != "=":
+                    raise ErrorTraduccion(f"Se esperaba '=' en SET {columna}")
+                lista.append((columna, lector.valor()))
+                if not lector.aceptar_simbolo(","):
+                    break
+            asignaciones = tuple(lista)
+        # PostgREST no permite modificar una tabla entera sin filtros
+        lector.esperar_palabra("WHERE")
+        condiciones = _leer_condiciones(lector, alias_tabla)
+
+    _terminar(lector)
+    return Instruccion(operacion.lower(), tabla, columnas, filas, asignaciones, condiciones,
+                       tuple(lector.parametros))
+
+def vincular(plantilla, parametros):
+    """Diccionario nombre -> valor de los parámetros de la plantilla"""
+    if not plantilla.parametros:
+        return {}
+    if parametros is None:
+        raise ErrorTraduccion(f"Faltan los parámetros: {', '.join(':' + p for p in plantilla.parametros)}")
+    if isinstance(parametros, dict):
+        valores = {}
+        for nombre in plantilla.parametros:
+            if nombre in parametros:
+                valores[nombre] = parametros[nombre]
+            elif nombre.isdigit() and int(nombre) in parametros:
+                valores[nombre] = parametros[int(nombre)]
+            else:
+                raise ErrorTraduccion(f"Falta el parámetro :{nombre}")
+        return valores
+    parametros = list(parametros)
+    if len(parametros) != len(plantilla.parametros):
+        raise ErrorTraduccion(f"Se esperaban {len(plantilla.parametros)} parámetros y llegaron {len(parametros)}")
+    return dict(zip(plantilla.parametros, parametros))
+
+def resolver(valor, valores):
+    tipo, dato = valor
+    return valores[dato] if tipo == "parametro" else dato
+
+def aplicar_filtro(consulta, columna, operador, argumentos):
+    if operador in ("eq", "neq") and argumentos[0] is None:
+        return consulta.is_(columna, "null") if operador == "eq" else consulta.not_.is_(columna, "null")
+    if operador == "is_null":
+        return consulta.is_(columna, "null")
+    if operador == "not_null":
+        return consulta.not_.is_(columna, "null")
+    if operador == "like":
+        return consulta.like(columna, argumentos[0])
+    if operador == "not_like":
+        return consulta.not_.like(columna, argumentos[0])
+    if operador in ("in", "not_in"):
+        # IN (:ids) con una lista como parámetro
+        if len(argumentos) == 1 and isinstance(argumentos[0], (list, tuple, set)):
+            argumentos = list(argumentos[0])
+        return consulta.in_(columna, argumentos) if operador == "in" else consulta.not_.in_(columna, argumentos)
+    if operador == "between":
+        return consulta.gte(columna, argumentos[0]).lte(columna, argumentos[1])
+    return getattr(consulta, operador)(columna, argumentos[0])
+
+def construir(cliente, plantilla, parametros=None):
+    """Armar la petición PostgREST de una plantilla con sus parámetros"""
+    valores = vincular(plantilla, parametros)
+    tabla = cliente.table(plantilla.tabla)
+    if plantilla.conteo:
+        consulta = tabla.select("*", count="exact")
+    else:
+        consulta = tabla.select(plantilla.columnas)
+
+    for columna, operador, argumentos in plantilla.condiciones:
+        consulta = aplicar_filtro(consulta, columna, operador, [resolver(a, valores) for a in argumentos])
+    for columna, desc, nulos_primero in plantilla.ordenes:
+        consulta = consulta.order(columna, desc=desc, nullsfirst=nulos_primero)
+
+    if plantilla.conteo:
+        # Solo el total: count=exact con limit 0 no trae filas
+        return consulta.limit(0)
+    if plantilla.limite is not None:
+        consulta = consulta.limit(int(resolver(plantilla.limite, valores)))
+    if plantilla.desplazamiento is not None:
+        consulta = consulta.offset(int(resolver(plantilla.desplazamiento, valores)))
+    return consulta
+
+def ejecutar_sql(cliente, sql, parametros=None):
+    """Traducir y ejecutar una consulta; devuelve la lista de filas"""
+    plantilla = compilar(sql)
+    resultado = construir(cliente, plantilla, parametros).execute()
+    if plantilla.conteo:
+        return [{plantilla.conteo.strip('"').lower(): resultado.count or 0}]
+    return resultado.data
@@ -0,0 +1,322 @@
+"""Unidad de trabajo para las instrucciones INSERT/UPDATE/DELETE heredadas.
+
+ConexionBD.ejecutar_instruccion no envía cada instrucción por separado: la
+analiza (traductor_sql.compilar_instruccion), la guarda y devuelve una
+InstruccionPendiente. Las pendientes se envían agrupadas al llamar a
+db.confirmar(), al juntar UOW_MAX_PENDIENTES instrucciones (500 por defecto)
+o cuando la más antigua lleva UOW_MAX_ESPERA segundos esperando (1 por
+defecto):
+
+    INSERT en la misma tabla y columnas    -> inserciones multi-fila
+    UPDATE ... WHERE col = v, mismo SET     -> un update con in.(v1, v2, ...)
+    UPDATE ... WHERE col = v, SET distintos -> un update por cada SET distinto
+                                               (nunca un upsert: re-crearía una
+                                               fila que otro cliente borró)
+    DELETE ... WHERE col = v / IN (...)     -> un delete con in.(...)
+    cualquier otra                          -> una petición propia
+
+Los grupos se envían en el orden en que apareció su primera instrucción;
+una instrucción de otra operación sobre una tabla con pendientes envía
+antes lo pendiente, así nunca se adelanta un DELETE a un INSERT de la misma
+tabla. Tampoco se adelanta a otra tabla relacionada: si sumarla a su grupo
+la enviaría antes que un grupo posterior de una tabla unida por clave
+foránea (INSERT mascota, INSERT dueno, INSERT mascota de ese dueño), primero
+se envía lo pendiente. Al enviarse, cada InstruccionPendiente recibe sus
+filas afectadas.
+
+No hay transacción: descartar() solo olvida lo que todavía no se envió. Lo
+ya enviado (por UOW_MAX_ESPERA, UOW_MAX_PENDIENTES o porque
+ConexionBD.ejecutar_consulta envía lo pendiente antes de leer) no se deshace.
+"""
+import os
+import time
+import threading
+from dotenv import load_dotenv
+
+from traductor_sql import compilar_instruccion, vincular, resolver, aplicar_filtro
+from cache import cache_lecturas
+import indice_busqueda
+
+load_dotenv()
+
+MAX_PENDIENTES = int(os.getenv("UOW_MAX_PENDIENTES", "500"))
+MAX_ESPERA = float(os.getenv("UOW_MAX_ESPERA", "1"))
+
+# Tablas cuyas escrituras dependen entre sí (claves foráneas, directas o por
+# borrado en cascada): entre ellas se respeta el orden de las instrucciones
+RELACIONADAS = {
+    "dueno": {"mascota", "consulta"},
+    "mascota": {"dueno", "consulta"},
+    "veterinario": {"consulta"},
+    "consulta": {"dueno", "mascota", "veterinario"}
+}
+
+class InstruccionPendiente:
+    """Instrucción guardada; filas y error se completan al enviarla"""
+
+    def __init__(self, sql, tabla, operacion):
+        self.sql = sql
+        self.tabla = tabla
+        self.operacion = operacion
+        self.filas = None
+        self.error = None
+        self._enviada = threading.Event()
+
+    @property
+    def enviada(self):
+        return self._enviada.is_set()
+
+    def esperar(self, timeout=None):
+        """Esperar al envío y devolver las filas afectadas"""
+        self._enviada.wait(timeout)
+        return self.filas
+
+    def _terminar(self, filas=None, error=None):
+        self.filas = filas
+        self.error = error
+        self._enviada.set()
+
+    def __repr__(self):
+        estado = f"{self.filas} filas" if self.enviada and self.error is None else (
+            f"error: {self.error}" if self.enviada else "pendiente")
+        return f"<{self.operacion.upper()} {self.tabla}: {estado}>"
+
+class UnidadTrabajo:
+    """Acumula instrucciones de escritura y las envía agrupadas"""
+
+    def __init__(self, obtener_cliente, claves_primarias, obligatorias,
+                 tamano_lote=500, max_pendientes=MAX_PENDIENTES, max_espera=MAX_ESPERA):
+        self._obtener_cliente = obtener_cliente
+        self.claves_primarias = claves_primarias
+        self.obligatorias = obligatorias
+        self.tamano_lote = tamano_lote
+        self.max_pendientes = max_pendientes
+        self.max_espera = max_espera
+        self._bloqueo = threading.RLock()
+        self._grupos = {}
+        self._operacion_por_tabla = {}
+        self._cantidad = 0
+        self._temporizador = None
+        self.estadisticas = {"envios": 0, "instrucciones": 0, "peticiones": 0, "filas": 0,
+                             "total_ms": 0.0, "max_ms": 0.0}
+
+    @property
+    def pendientes(self):
+        return self._cantidad
+
+    # ---------- acumulación ----------
+    def agregar(self, sql, parametros=None):
+        """Analizar y guardar una instrucción; devuelve su InstruccionPendiente"""
+        instruccion = compilar_instruccion(sql)
+        valores = vincular(instruccion, parametros)
+        pendiente = InstruccionPendiente(sql, instruccion.tabla, instruccion.operacion)
+
+        with self._bloqueo:
+            clave, dato = self._agrupar(instruccion, valores, pendiente)
+            # Las instrucciones sin agrupar no se sabe qué filas tocan: separan lo anterior de lo siguiente
+            etapa = f"suelta-{instruccion.operacion}" if clave[0] == "suelta" else instruccion.operacion
+            etapa_previa = self._operacion_por_tabla.get(instruccion.tabla)
+            if ((etapa_previa and etapa_previa != etapa) or self._adelanta(clave, instruccion.tabla)
+                    or (clave[0] == "update" and self._pisa_fila(clave, dato))):
+                self.confirmar()
+            self._grupos.setdefault(clave, []).append(dato)
+            self._operacion_por_tabla[instruccion.tabla] = etapa
+            self._cantidad += 1
+
+            if self._cantidad >= self.max_pendientes:
+                self.confirmar()
+            elif self._temporizador is None and self.max_espera > 0:
+                self._temporizador = threading.Timer(self.max_espera, self._vencer)
+                self._temporizador.daemon = True
+                self._temporizador.start()
+        return pendiente
+
+    def _agrupar(self, instruccion, valores, pendiente):
+        """Clave del grupo al que va la instrucción y el dato que aporta"""
+        tabla = instruccion.tabla
+        condiciones = [(c, op, [resolver(a, valores) for a in args]) for c, op, args in instruccion.condiciones]
+
+        if instruccion.operacion == "insert":
+            filas = [{c: resolver(v, valores) for c, v in zip(instruccion.columnas, fila)}
+                     for fila in instruccion.filas]
+            return ("insert", tabla, instruccion.columnas), (pendiente, filas)
+
+        unica = len(condiciones) == 1 and condiciones[0][1] in ("eq", "in")
+        if unica:
+            columna, operador, argumentos = condiciones[0]
+            if operador == "in" and len(argumentos) == 1 and isinstance(argumentos[0], (list, tuple, set)):
+                argumentos = list(argumentos[0])
+            objetivos = [a for a in argumentos if a is not None]
+            unica = len(objetivos) == len(argumentos) and bool(objetivos)
+
+        if instruccion.operacion == "update" and unica:
+            asignaciones = tuple((c, resolver(v, valores)) for c, v in instruccion.asignaciones)
+            columnas_set = tuple(c for c, _ in asignaciones)
+            return ("update", tabla, columnas_set, columna), (pendiente, dict(asignaciones), objetivos)
+        if instruccion.operacion == "delete" and unica:
+            return ("delete", tabla, columna), (pendiente, objetivos)
+
+        asignaciones = {c: resolver(v, valores) for c, v in instruccion.asignaciones}
+        return ("suelta", id(pendiente)), (pendiente, instruccion.operacion, tabla, asignaciones, condiciones)
+
+    def _adelanta(self, clave, tabla):
+        """True si sumar la instrucción a su grupo la enviaría antes que un grupo posterior de una tabla relacionada"""
+        if clave not in self._grupos:
+            return False
+        relacionadas = RELACIONADAS.get(tabla)
+        posterior = False
+        for otra_clave, grupo in self._grupos.items():
+            if posterior:
+                otra_tabla = grupo[0][0].tabla
+                if otra_tabla != tabla and (relacionadas is None or otra_tabla in relacionadas):
+                    return True
+            posterior = posterior or otra_clave == clave
+        return False
+
+    def _pisa_fila(self, clave, dato):
+        """True si el UPDATE cambia de otra forma una fila que ya tiene un UPDATE pendiente.
+
+        Agruparlo podría enviarlo antes que el anterior: se envía lo pendiente primero."""
+        _, asignaciones, objetivos = dato
+        objetivos = set(objetivos)
+        for otra_clave, grupo in self._grupos.items():
+            if otra_clave[0] != "update" or otra_clave[1] != clave[1]:
+                continue
+            for _, otras, otros_objetivos in grupo:
+                if (otra_clave != clave or otras != asignaciones) and objetivos & set(otros_objetivos):
+                    return True
+        return False
+
+    def _vencer(self):
+        with self._bloqueo:
+            self._temporizador = None
+            if self._cantidad:
+                self.confirmar()
+
+    # ---------- envío ----------
+    def descartar(self):
+        """Olvidar las instrucciones todavía no enviadas; devuelve cuántas había (lo enviado no se deshace)"""
+        with self._bloqueo:
+            cantidad = self._cantidad
+            for grupo in self._grupos.values():
+                for dato in grupo:
+                    dato[0]._terminar(error="descartada")
+            self._reiniciar()
+            return cantidad
+
+    def _reiniciar(self):
+        self._grupos = {}
+        self._operacion_por_tabla = {}
+        self._cantidad = 0
+        if self._temporizador is not None:
+            self._temporizador.cancel()
+            self._temporizador = None
+
+    def confirmar(self):
+        """Enviar todo lo pendiente; devuelve un resumen con filas, peticiones y ms"""
+        with self._bloqueo:
+            grupos, cantidad = self._grupos, self._cantidad
+            self._reiniciar()
+            if not cantidad:
+                return {"instrucciones": 0, "peticiones": 0, "filas": 0, "errores": 0, "ms": 0.0}
+
+            inicio = time.perf_counter()
+            peticiones = errores = 0
+            tablas = {}
+            cliente = self._obtener_cliente()
+            for clave, grupo in grupos.items():
+                tipo = clave[0]
+                try:
+                    if cliente is None:
+                        raise ConnectionError("No hay conexión a la base de datos")
+                    if tipo == "insert":
+                        peticiones += self._enviar_inserts(cliente, clave[1], grupo)
+                    elif tipo == "update":
+                        peticiones += self._enviar_updates(cliente, clave[1], clave[3], grupo)
+                    elif tipo == "delete":
+                        peticiones += self._enviar_deletes(cliente, clave[1], clave[2], grupo)
+                    else:
+                        peticiones += self._enviar_suelta(cliente, grupo[0])
+                except Exception as e:
+                    print(f"❌ Error enviando {tipo} en {grupo[0][0].tabla}: {e}")
+                    for dato in grupo:
+                        if not dato[0].enviada:
+                            dato[0]._terminar(error=str(e))
+                            errores += 1
+                tabla = grupo[0][0].tabla
+                tablas[tabla] = tablas.get(tabla) or grupo[0][0].operacion == "delete"
+
+            for tabla, cascada in tablas.items():
+                cache_lecturas.invalidar(tabla, cascada=cascada)
+                indice_busqueda.desactualizar(tabla)
+
+            ms = (time.perf_counter() - inicio) * 1000
+            filas = sum(dato[0].filas or 0 for grupo in grupos.values() for dato in grupo)
+            estadisticas = self.estadisticas
+            estadisticas["envios"] += 1
+            estadisticas["instrucciones"] += cantidad
+            estadisticas["peticiones"] += peticiones
+            estadisticas["filas"] += filas
+            estadisticas["total_ms"] += ms
+            estadisticas["max_ms"] = max(estadisticas["max_ms"], ms)
+            print(f"💾 {cantidad} instrucciones enviadas en {peticiones} peticiones "
+                  f"({filas} filas, {ms:.0f} ms)")
+            return {"instrucciones": cantidad, "peticiones": peticiones, "filas": filas,
+                    "errores": errores, "ms": round(ms, 2)}
+
+    def _lotes(self, valores):
+        for inicio in range(0, len(valores), self.tamano_lote):
+            yield valores[inicio:inicio + self.tamano_lote]
+
+    def _enviar_inserts(self, cliente, tabla, grupo):
+        filas = [fila for _, filas_instruccion in grupo for fila in filas_instruccion]
+        peticiones = 0
+        for lote in self._lotes(filas):
+            cliente.table(tabla).insert(lote).execute()
+            peticiones += 1
+        for pendiente, filas_instruccion in grupo:
+            pendiente._terminar(len(filas_instruccion))
+        return peticiones
+
+    def _enviar_updates(self, cliente, tabla, columna, grupo):
+        distintos = {}
+        for dato in grupo:
+            distintos.setdefault(tuple(sorted(dato[1].items(), key=lambda par: par[0])), []).append(dato)
+
+        # Un update (PATCH) por cada SET distinto, filtrando por todas sus filas a la vez.
+        # _pisa_fila garantiza que una fila no tiene dos SET distintos en el grupo: el orden da igual
+        peticiones = 0
+        for asignaciones, datos in distintos.items():
+            objetivos = list({o for _, _, objetivos_dato in datos for o in objetivos_dato})
+            actualizadas = []
+            for lote in self._lotes(objetivos):
+                actualizadas.extend(cliente.table(tabla).update(dict(asignaciones)).in_(columna, lote).execute().data)
+                peticiones += 1
+            for pendiente, _, objetivos_dato in datos:
+                buscados = set(objetivos_dato)
+                pendiente._terminar(sum(1 for fila in actualizadas if fila.get(columna) in buscados))
+        return peticiones
+
+    def _enviar_deletes(self, cliente, tabla, columna, grupo):
+        objetivos = list({o for _, objetivos_dato in grupo for o in objetivos_dato})
+        eliminadas = []
+        peticiones = 0
+        for lote in self._lotes(objetivos):
+            eliminadas.extend(cliente.table(tabla).delete().in_(columna, lote).execute().data)
+            peticiones += 1
+        # Cada fila se atribuye a la primera instrucción que la nombró
+        restantes = {}
+        for fila in eliminadas:
+            restantes[fila.get(columna)] = restantes.get(fila.get(columna), 0) + 1
+        for pendiente, objetivos_dato in grupo:
+            pendiente._terminar(sum(restantes.pop(o, 0) for o in set(objetivos_dato)))
+        return peticiones
+
+    def _enviar_suelta(self, cliente, dato):
+        pendiente, operacion, tabla, asignaciones, condiciones = dato
+        consulta = cliente.table(tabla)
+        consulta = consulta.update(asignaciones) if operacion == "update" else consulta.delete()
+        for columna, operador, argumentos in condiciones:
+            consulta = aplicar_filtro(consulta, columna, operador, argumentos)
+        pendiente._terminar(len(consulta.execute().data or []))
+        return 1
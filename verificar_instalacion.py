@@ -4,7 +4,7 @@ import pkg_resources
 def verificar_instalacion():
     print("🔍 Verificando instalación de paquetes...")
     
-    paquetes = ["supabase", "python-dotenv", "httpx"]
+    paquetes = ["supabase", "python-dotenv", "httpx", "numpy"]
     
     for paquete in paquetes:
         try: